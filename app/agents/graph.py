@@ -1,6 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import json
 import logging
+import time
+from collections.abc import AsyncIterator, Iterable
+from contextvars import ContextVar
 from typing import Any
 from statistics import median
 
@@ -18,7 +24,12 @@ from app.agents.memory import append_session_messages, get_session_messages
 from app.agents.prompts import PROMPTS
 from app.agents.state import AgentState
 from app.core.context import agent_ctx
+from app.core.executor import run_in_executor
+from app.core.memo import request_memo
+from app.core.metrics import metrics
+from app.core.tracing import tracer
 from app.llm.qingyun_client import QingyunChatClient
+from app.llm.response_cache import response_cache, response_cache_key
 from app.tools.inventory_tools import (
     inventory_markdown_calculator,
     inventory_query_tool,
@@ -30,6 +41,25 @@ logger = logging.getLogger("app.agents")
 _llm = QingyunChatClient()
 
 
+# 流式调用时的事件队列；为 None 表示普通（非流式）调用
+_events_ctx: ContextVar[asyncio.Queue | None] = ContextVar("agent_events", default=None)
+
+
+async def aclose_llm() -> None:
+    await _llm.aclose()
+
+
+def _emit(event: str, data: dict[str, Any]) -> None:
+    queue = _events_ctx.get()
+    if queue is not None:
+        queue.put_nowait((event, data))
+
+
+def _emit_tool_result(agent_id: str, structured_output: dict[str, Any]) -> None:
+    # 工具结果先推送给前端，LLM 回复随后逐 token 到达
+    _emit("tool", {"agent": agent_id, "structured_output": structured_output})
+
+
 def _summarize_stockout(items: list[dict[str, Any]]) -> str:
     if not items:
         return "No stockout risks detected."
@@ -254,23 +284,96 @@ def _copilot_tool_choice(text: str) -> tuple[str, dict[str, Any]]:
     return "inventory_query", {"query_type": "all"}
 
 
-def _llm_or_fallback(
-    agent_id: str, tool_summary: str, messages: list[dict[str, str]], tool_output: dict[str, Any] | None = None
-) -> str:
+def _build_llm_messages(
+    agent_id: str, tool_summary: str, messages: list[dict[str, str]], tool_context: str = ""
+) -> list[dict[str, str]]:
     system_prompt = PROMPTS.get(agent_id, "")
-    tool_context = ""
-    if tool_output:
-        import json
-
-        tool_context = json.dumps(tool_output, ensure_ascii=False)[:4000]
-    llm_messages = [
+    return [
         {"role": "system", "content": "所有回复必须使用中文，简洁清晰。"},
         {"role": "system", "content": system_prompt},
         *messages,
         {"role": "system", "content": f"Tool summary: {tool_summary}"},
         {"role": "system", "content": f"Tool output JSON (truncated): {tool_context}"},
     ]
-    return _llm.chat(llm_messages)
+
+
+def _without_versions(value: Any) -> Any:
+    # snapshot_version 是进程内计数器，与回复内容无关：不发给 LLM，也不进入缓存键，
+    # 否则多 worker / 重启后相同数据也无法命中。只处理字典层级，行列表原样保留
+    if isinstance(value, dict):
+        return {
+            key: _without_versions(item)
+            for key, item in value.items()
+            if key != "snapshot_version"
+        }
+    return value
+
+
+def _prepare_llm_call(
+    agent_id: str,
+    tool_summary: str,
+    messages: list[dict[str, str]],
+    tool_output: dict[str, Any] | None = None,
+) -> tuple[list[dict[str, str]], str]:
+    """返回 (发送给 LLM 的消息, 回复缓存键)。"""
+    tool_json = ""
+    if tool_output:
+        tool_json = json.dumps(_without_versions(tool_output), ensure_ascii=False)
+    llm_messages = _build_llm_messages(agent_id, tool_summary, messages, tool_json[:4000])
+    cache_key = response_cache_key(agent_id, messages, tool_summary, tool_json)
+    return llm_messages, cache_key
+
+
+async def _llm_or_fallback(
+    agent_id: str,
+    tool_summary: str,
+    messages: list[dict[str, str]],
+    tool_output: dict[str, Any] | None = None,
+) -> str:
+    # 工具输出的 JSON 序列化与摘要可能很大，放到工作线程；LLM 请求走异步客户端，不阻塞事件循环
+    llm_messages, cache_key = await run_in_executor(
+        _prepare_llm_call, agent_id, tool_summary, messages, tool_output
+    )
+    streaming = _events_ctx.get() is not None
+    with tracer.span("llm", agent=agent_id, model=_llm.model, stream=streaming) as llm_span:
+        cached = response_cache.get(cache_key)
+        llm_span.set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            _emit("token", {"text": cached})
+            return cached
+        if not streaming:
+            response_text = await _llm.achat(llm_messages)
+        else:
+            parts: list[str] = []
+            async for delta in _llm.astream(llm_messages):
+                parts.append(delta)
+                _emit("token", {"text": delta})
+            response_text = "".join(parts).strip()
+    response_cache.set(cache_key, response_text)
+    return response_text
+
+
+# 各 Agent 节点依赖的工具调用；同一节点内互不依赖，在工作线程池中并发执行
+AGENT_TOOL_CALLS: dict[str, tuple[tuple[str, dict[str, Any]], ...]] = {
+    "stockout_sentinel": (
+        ("inventory_query", {"query_type": "stockout_risk"}),
+        ("inventory_vendor_info", {}),
+    ),
+    "replenishment_planner": (
+        ("inventory_replenishment", {}),
+        ("inventory_vendor_info", {}),
+    ),
+    "exception_investigator": (("inventory_query", {"query_type": "all"}),),
+    "markdown_clearance_coach": (("inventory_markdown", {}),),
+}
+
+
+async def _run_tools(calls: Iterable[tuple[str, dict[str, Any]]]) -> list[dict[str, Any]]:
+    return list(
+        await asyncio.gather(
+            *(run_in_executor(_run_tool, tool_name, tool_args) for tool_name, tool_args in calls)
+        )
+    )
 
 
 def load_session(state: AgentState) -> AgentState:
@@ -279,49 +382,66 @@ def load_session(state: AgentState) -> AgentState:
     return {**state, "messages": messages}
 
 
-def stockout_agent(state: AgentState) -> AgentState:
+async def stockout_agent(state: AgentState) -> AgentState:
     token = agent_ctx.set("stockout_sentinel")
-    tool_output = inventory_query_tool(query_type="stockout_risk")
+    tool_output, vendor_info = await _run_tools(AGENT_TOOL_CALLS["stockout_sentinel"])
     vendor_ids = {item.get("VendorID") for item in tool_output.get("items", []) if item.get("VendorID")}
-    vendor_contacts = {}
-    if vendor_ids:
-        vendor_info = inventory_vendor_info_tool()
-        for vendor in vendor_info.get("vendors", []):
-            if vendor.get("VendorID") in vendor_ids:
-                vendor_contacts[vendor["VendorID"]] = vendor
+    vendor_contacts = {
+        vendor["VendorID"]: vendor
+        for vendor in vendor_info.get("vendors", [])
+        if vendor.get("VendorID") in vendor_ids
+    }
     summary, structured = _render_stockout(tool_output)
-    response_text = _llm_or_fallback("stockout_sentinel", summary, state["messages"], tool_output)
+    structured_output = {
+        **structured,
+        "summary": summary,
+        "vendors": list(vendor_contacts.values()),
+    }
+    _emit_tool_result("stockout_sentinel", structured_output)
+    response_text = await _llm_or_fallback(
+        "stockout_sentinel", summary, state["messages"], tool_output
+    )
     agent_ctx.reset(token)
     return {
         **state,
         "tool_output": {**tool_output, "vendor_contacts": vendor_contacts},
         "response_text": response_text,
         "reasoning": "Used stockout risk tool to identify urgent SKUs.",
-        "structured_output": {**structured, "summary": summary, "vendors": list(vendor_contacts.values())},
+        "structured_output": structured_output,
     }
 
 
-def replenishment_agent(state: AgentState) -> AgentState:
+async def replenishment_agent(state: AgentState) -> AgentState:
     token = agent_ctx.set("replenishment_planner")
-    tool_output = inventory_replenishment_tool()
-    vendor_info = inventory_vendor_info_tool()
+    tool_output, vendor_info = await _run_tools(AGENT_TOOL_CALLS["replenishment_planner"])
     summary, structured = _render_replenishment(tool_output)
-    response_text = _llm_or_fallback("replenishment_planner", summary, state["messages"], tool_output)
+    structured_output = {
+        **structured,
+        "summary": summary,
+        "vendors": vendor_info.get("vendors", []),
+    }
+    _emit_tool_result("replenishment_planner", structured_output)
+    response_text = await _llm_or_fallback(
+        "replenishment_planner", summary, state["messages"], tool_output
+    )
     agent_ctx.reset(token)
     return {
         **state,
         "tool_output": {**tool_output, "vendors": vendor_info.get("vendors", [])},
         "response_text": response_text,
         "reasoning": "Generated replenishment plan using low stock items.",
-        "structured_output": {**structured, "summary": summary, "vendors": vendor_info.get("vendors", [])},
+        "structured_output": structured_output,
     }
 
 
-def exception_agent(state: AgentState) -> AgentState:
+async def exception_agent(state: AgentState) -> AgentState:
     token = agent_ctx.set("exception_investigator")
-    tool_output = inventory_query_tool(query_type="all")
-    summary, structured = _render_exceptions(tool_output.get("items", []))
-    response_text = _llm_or_fallback("exception_investigator", summary, state["messages"], structured)
+    (tool_output,) = await _run_tools(AGENT_TOOL_CALLS["exception_investigator"])
+    summary, structured = await run_in_executor(_render_exceptions, tool_output.get("items", []))
+    _emit_tool_result("exception_investigator", {**structured, "summary": summary})
+    response_text = await _llm_or_fallback(
+        "exception_investigator", summary, state["messages"], structured
+    )
     agent_ctx.reset(token)
     return {
         **state,
@@ -332,11 +452,14 @@ def exception_agent(state: AgentState) -> AgentState:
     }
 
 
-def markdown_agent(state: AgentState) -> AgentState:
+async def markdown_agent(state: AgentState) -> AgentState:
     token = agent_ctx.set("markdown_clearance_coach")
-    tool_output = inventory_markdown_calculator()
+    (tool_output,) = await _run_tools(AGENT_TOOL_CALLS["markdown_clearance_coach"])
     summary, structured = _render_markdown(tool_output)
-    response_text = _llm_or_fallback("markdown_clearance_coach", summary, state["messages"], tool_output)
+    _emit_tool_result("markdown_clearance_coach", {**structured, "summary": summary})
+    response_text = await _llm_or_fallback(
+        "markdown_clearance_coach", summary, state["messages"], tool_output
+    )
     agent_ctx.reset(token)
     return {
         **state,
@@ -347,24 +470,36 @@ def markdown_agent(state: AgentState) -> AgentState:
     }
 
 
-def copilot_agent(state: AgentState) -> AgentState:
+# parameters.tools 中允许的工具名
+FORCED_TOOL_NAMES = frozenset(
+    {"inventory_query", "inventory_replenishment", "inventory_vendor_info", "inventory_markdown"}
+)
+
+
+def _run_tool(tool_name: str, tool_args: dict[str, Any]) -> dict[str, Any]:
+    if tool_name == "inventory_query":
+        return inventory_query_tool(**tool_args)
+    if tool_name == "inventory_replenishment":
+        return inventory_replenishment_tool(**tool_args)
+    if tool_name == "inventory_vendor_info":
+        return inventory_vendor_info_tool(**tool_args)
+    return inventory_markdown_calculator(**tool_args)
+
+
+async def copilot_agent(state: AgentState) -> AgentState:
     token = agent_ctx.set("inventory_copilot")
     tool_name = state.get("forced_tool")
     tool_args = state.get("forced_args") or {}
     if not tool_name:
         tool_name, tool_args = _copilot_tool_choice(state["input"])
 
-    if tool_name == "inventory_query":
-        tool_output = inventory_query_tool(**tool_args)
-    elif tool_name == "inventory_replenishment":
-        tool_output = inventory_replenishment_tool(**tool_args)
-    elif tool_name == "inventory_vendor_info":
-        tool_output = inventory_vendor_info_tool(**tool_args)
-    else:
-        tool_output = inventory_markdown_calculator(**tool_args)
+    tool_output = await run_in_executor(_run_tool, tool_name, tool_args)
 
     summary = f"Used {tool_name} for inventory copilot response."
-    response_text = _llm_or_fallback("inventory_copilot", summary, state["messages"], tool_output)
+    _emit_tool_result("inventory_copilot", {"tool": tool_name, "result": tool_output})
+    response_text = await _llm_or_fallback(
+        "inventory_copilot", summary, state["messages"], tool_output
+    )
     agent_ctx.reset(token)
     return {
         **state,
@@ -375,24 +510,36 @@ def copilot_agent(state: AgentState) -> AgentState:
     }
 
 
-def forced_tool_agent(state: AgentState) -> AgentState:
-    tool_name = state.get("forced_tool")
-    tool_args = state.get("forced_args") or {}
-    if tool_name == "inventory_query":
-        tool_output = inventory_query_tool(**tool_args)
-    elif tool_name == "inventory_replenishment":
-        tool_output = inventory_replenishment_tool(**tool_args)
-    elif tool_name == "inventory_vendor_info":
-        tool_output = inventory_vendor_info_tool(**tool_args)
-    else:
-        tool_output = inventory_markdown_calculator(**tool_args)
+async def forced_tool_agent(state: AgentState) -> AgentState:
+    forced_calls = state.get("forced_calls")
+    if not forced_calls:
+        tool_name = state.get("forced_tool")
+        tool_args = state.get("forced_args") or {}
+        (tool_output,) = await _run_tools([(tool_name, tool_args)])
+        _emit_tool_result(state["agent"], {"tool": tool_name, "result": tool_output})
+        return {
+            **state,
+            "tool_output": tool_output,
+            "response_text": "Forced tool executed.",
+            "reasoning": f"Forced tool call: {tool_name}.",
+            "structured_output": {"tool": tool_name, "result": tool_output},
+        }
 
+    # 多工具请求：所有调用并发执行，结果按请求顺序返回
+    calls = [(call["tool"], call.get("args") or {}) for call in forced_calls]
+    outputs = await _run_tools(calls)
+    results = [
+        {"tool": tool_name, "args": tool_args, "result": output}
+        for (tool_name, tool_args), output in zip(calls, outputs, strict=True)
+    ]
+    tool_names = [tool_name for tool_name, _ in calls]
+    _emit_tool_result(state["agent"], {"tools": tool_names, "results": results})
     return {
         **state,
-        "tool_output": tool_output,
-        "response_text": "Forced tool executed.",
-        "reasoning": f"Forced tool call: {tool_name}.",
-        "structured_output": {"tool": tool_name, "result": tool_output},
+        "tool_output": {"results": results},
+        "response_text": "Forced tools executed.",
+        "reasoning": f"Forced tool calls: {', '.join(tool_names)}.",
+        "structured_output": {"tools": tool_names, "results": results},
     }
 
 
@@ -408,7 +555,7 @@ def finalize(state: AgentState) -> AgentState:
 
 
 def _route(state: AgentState) -> str:
-    if state.get("forced_tool"):
+    if state.get("forced_tool") or state.get("forced_calls"):
         return "forced_tool"
     return state["agent"]
 
@@ -417,14 +564,18 @@ def build_graph():
     if not _LANGGRAPH_AVAILABLE:
         raise RuntimeError("langgraph is not installed")
     workflow = StateGraph(AgentState)
-    workflow.add_node("load_session", load_session)
-    workflow.add_node("stockout_sentinel", stockout_agent)
-    workflow.add_node("replenishment_planner", replenishment_agent)
-    workflow.add_node("exception_investigator", exception_agent)
-    workflow.add_node("markdown_clearance_coach", markdown_agent)
-    workflow.add_node("inventory_copilot", copilot_agent)
-    workflow.add_node("forced_tool_node", forced_tool_agent)
-    workflow.add_node("finalize", finalize)
+    nodes = {
+        "load_session": load_session,
+        "stockout_sentinel": stockout_agent,
+        "replenishment_planner": replenishment_agent,
+        "exception_investigator": exception_agent,
+        "markdown_clearance_coach": markdown_agent,
+        "inventory_copilot": copilot_agent,
+        "forced_tool_node": forced_tool_agent,
+        "finalize": finalize,
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, tracer.traced(f"node.{name}")(node))
 
     workflow.set_entry_point("load_session")
     workflow.add_conditional_edges(
@@ -457,7 +608,48 @@ def build_graph():
 graph = build_graph() if _LANGGRAPH_AVAILABLE else None
 
 
-def run_agent(state: AgentState) -> AgentState:
+async def arun_agent(state: AgentState) -> AgentState:
     if graph is None:
         raise RuntimeError("langgraph is not installed. Install it to use agents.")
-    return graph.invoke(state)
+    # 单次调用内相同的仓储/工具读取只执行一次（各节点与工作线程共享同一备忘表）
+    start = time.perf_counter()
+    try:
+        with request_memo() as memo, tracer.span("agent", agent=state["agent"]):
+            result = await graph.ainvoke(state)
+    finally:
+        metrics.observe_agent(state["agent"], round((time.perf_counter() - start) * 1000, 2))
+    logger.info("request_memo", extra={"memo_calls": memo.calls, "memo_saved": memo.saved})
+    return result
+
+
+async def astream_agent(state: AgentState) -> AsyncIterator[tuple[str, Any]]:
+    """流式运行 Agent，依次产出 ("tool", ...)、("token", ...)，最后是 ("done", 最终 state)。
+
+    节点通过 _events_ctx 推送事件；Agent 失败时在迭代中抛出原异常。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    context = contextvars.copy_context()
+    context.run(_events_ctx.set, queue)
+    context.run(agent_ctx.set, state["agent"])
+    task = asyncio.create_task(arun_agent(state), context=context)
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+        yield "done", task.result()
+    finally:
+        # 客户端断开时取消仍在运行的 Agent
+        if not task.done():
+            task.cancel()
+
+
+def run_agent(state: AgentState) -> AgentState:
+    # 同步入口（脚本/命令行），请求路径使用 arun_agent
+    async def run() -> AgentState:
+        try:
+            return await arun_agent(state)
+        finally:
+            # asyncio.run 返回后循环即关闭，绑定在它上面的连接池要在此之前关闭
+            await _llm.aclose_async_client()
+
+    return asyncio.run(run())
@@ -14,3 +14,4 @@ class AgentState(TypedDict):
     structured_output: dict[str, Any]
     forced_tool: str | None
     forced_args: dict[str, Any] | None
+    forced_calls: list[dict[str, Any]] | None
@@ -1,19 +1,32 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+from datetime import UTC, datetime, timezone
+import json
 import uuid
-from typing import Any
+from collections.abc import AsyncIterator, Iterable, Iterator
+from typing import Any, Literal
 
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from app.core.context import agent_ctx
 from app.core.settings import settings
-from app.agents.graph import run_agent
-from app.data.repository import load_data
+from app.agents.graph import FORCED_TOOL_NAMES, aclose_llm, arun_agent, astream_agent
+from app.core.executor import run_in_executor, shutdown_executor
+from app.core.health import health_monitor, start_health_monitor, stop_health_monitor
+from app.data.pagination import InvalidCursorError
+from app.data.repository import get_snapshot_version, is_data_loaded, load_data
 from app.core.metrics import metrics
-from app.spapi.client import SpApiClient
+from app.core.profiling import (
+    ProfilerBusy,
+    allocation_snapshot,
+    collapsed,
+    stack_sampler,
+    top_functions,
+)
+from app.core.tracing import tracer
 from app.tools.stats import stats_calculator
 
 router = APIRouter()
@@ -62,16 +75,66 @@ AGENTS = [
 ]
 
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MAX_PAGE_SIZE = 1000
+
+
+def _wants_ndjson(request: Request, stream: bool) -> bool:
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _ndjson_response(chunks: Iterable[list[dict[str, Any]]]) -> StreamingResponse:
+    def body() -> Iterator[str]:
+        # 每批拼成一次写出，行在生成时才序列化
+        for rows in chunks:
+            if rows:
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _risk_rows(items: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {
+            "sku": item["SKU"],
+            "days": item["days_until_stockout"],
+            "shortage": item["shortage_amount"],
+            "revenue_at_risk": item["revenue_at_risk"],
+            "urgency": item["urgency_level"],
+        }
+        for item in items
+    ]
+
+
 class InvokeRequest(BaseModel):
     agent: str
     input: str
     session_id: str | None = None
     parameters: dict[str, Any] | None = None
+    stream: bool = False
+
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 @router.on_event("startup")
 async def _startup() -> None:
     load_data()
+    start_health_monitor()
+    metrics.start_flusher()
+
+
+@router.on_event("shutdown")
+async def _shutdown() -> None:
+    await stop_health_monitor()
+    await aclose_llm()
+    shutdown_executor()
+    metrics.stop_flusher()
+    tracer.close()
 
 
 @router.get("/agents/list")
@@ -81,7 +144,7 @@ async def list_agents() -> dict[str, Any]:
 
 @router.get("/agents/stats")
 async def agent_stats(request: Request) -> dict[str, Any]:
-    stats = stats_calculator()
+    stats = await run_in_executor(stats_calculator)
     return {
         "success": True,
         "stats": stats,
@@ -91,27 +154,28 @@ async def agent_stats(request: Request) -> dict[str, Any]:
 
 
 @router.get("/data/risks")
-async def get_risks_data(request: Request, limit: int = 100) -> dict[str, Any]:
+async def get_risks_data(
+    request: Request,
+    limit: int | None = Query(None, ge=1),
+    max_days: float = 7.0,
+    stream: bool = False,
+):
     """直接获取风险数据，不经过 Agent 和 LLM"""
-    from app.tools.inventory_tools import inventory_query_tool
+    from app.tools.inventory_tools import inventory_query_tool, iter_inventory_query
 
-    tool_output = inventory_query_tool(query_type="stockout_risk", limit=limit)
-    items = tool_output.get("items", [])
+    if _wants_ndjson(request, stream):
+        batches = iter_inventory_query(query_type="stockout_risk", limit=limit, max_days=max_days)
+        return _ndjson_response(_risk_rows(batch.iter_records()) for batch in batches)
 
-    risks = [
-        {
-            "sku": item["SKU"],
-            "days": item["days_until_stockout"],
-            "shortage": item["shortage_amount"],
-            "revenue_at_risk": item["revenue_at_risk"],
-            "urgency": item["urgency_level"],
-        }
-        for item in items
-    ]
+    tool_output = await run_in_executor(
+        inventory_query_tool, query_type="stockout_risk", limit=limit or 100, max_days=max_days
+    )
+    risks = _risk_rows(tool_output.get("items", []))
 
     return {
         "risks": risks,
         "count": len(risks),
+        "snapshot_version": tool_output.get("snapshot_version"),
         "request_id": getattr(request.state, "request_id", ""),
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
@@ -122,52 +186,62 @@ async def get_inventory_data(
     request: Request,
     query_type: str = "all",
     category: str | None = None,
-    limit: int = 100,
-) -> dict[str, Any]:
-    """直接获取库存数据，不经过 Agent 和 LLM"""
-    from app.tools.inventory_tools import inventory_query_tool
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    order_by: Literal["sku", "days_of_cover"] | None = None,
+    stream: bool = False,
+):
+    """直接获取库存数据，不经过 Agent 和 LLM；按 next_cursor 翻页，或以 NDJSON 流式导出"""
+    from app.tools.inventory_tools import inventory_query_tool, iter_inventory_query
 
-    tool_output = inventory_query_tool(
-        query_type=query_type, category=category, limit=limit
-    )
+    if _wants_ndjson(request, stream):
+        batches = iter_inventory_query(query_type=query_type, category=category, limit=limit)
+        return _ndjson_response(batch.records() for batch in batches)
+
+    if order_by is None and cursor is None:
+        order_by = "days_of_cover" if query_type == "stockout_risk" else "sku"
+    try:
+        tool_output = await run_in_executor(
+            inventory_query_tool,
+            query_type=query_type,
+            category=category,
+            limit=min(limit or 100, MAX_PAGE_SIZE),
+            cursor=cursor,
+            order_by=order_by,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
     return {
         "items": tool_output.get("items", []),
         "count": tool_output.get("count", 0),
+        "next_cursor": tool_output.get("next_cursor"),
+        "snapshot_version": tool_output.get("snapshot_version"),
         "request_id": getattr(request.state, "request_id", ""),
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
 
-@router.post("/agents/invoke")
-async def invoke_agent(payload: InvokeRequest, request: Request) -> dict[str, Any]:
-    if payload.agent not in {agent["id"] for agent in AGENTS}:
-        raise HTTPException(status_code=404, detail="Unknown agent")
-
-    session_id = payload.session_id or str(uuid.uuid4())
+def _initial_state(payload: InvokeRequest, session_id: str) -> dict[str, Any]:
     forced_tool = (payload.parameters or {}).get("tool")
     forced_args = (payload.parameters or {}).get("args") if payload.parameters else None
+    forced_calls = (payload.parameters or {}).get("tools")
+    return {
+        "agent": payload.agent,
+        "input": payload.input,
+        "session_id": session_id,
+        "messages": [],
+        "tool_output": None,
+        "response_text": "",
+        "reasoning": "",
+        "structured_output": {},
+        "forced_tool": forced_tool,
+        "forced_args": forced_args,
+        "forced_calls": forced_calls,
+    }
 
-    token = agent_ctx.set(payload.agent)
-    try:
-        state = run_agent(
-            {
-                "agent": payload.agent,
-                "input": payload.input,
-                "session_id": session_id,
-                "messages": [],
-                "tool_output": None,
-                "response_text": "",
-                "reasoning": "",
-                "structured_output": {},
-                "forced_tool": forced_tool,
-                "forced_args": forced_args,
-            }
-        )
-    except RuntimeError as exc:
-        raise HTTPException(status_code=502, detail=str(exc)) from exc
-    agent_ctx.reset(token)
 
+def _invoke_body(state: dict[str, Any], session_id: str, request: Request) -> dict[str, Any]:
     return {
         "success": True,
         "response": {
@@ -183,18 +257,164 @@ async def invoke_agent(payload: InvokeRequest, request: Request) -> dict[str, An
     }
 
 
+def _check_agent(payload: InvokeRequest) -> None:
+    if payload.agent not in {agent["id"] for agent in AGENTS}:
+        raise HTTPException(status_code=404, detail="Unknown agent")
+    _check_forced_calls((payload.parameters or {}).get("tools"))
+
+
+def _check_forced_calls(calls: Any) -> None:
+    # 多工具请求在进入图之前校验，缺少 tool 或未知工具名返回 400 而不是 500 / 静默执行其他工具
+    if calls is None:
+        return
+    if not isinstance(calls, list):
+        raise HTTPException(status_code=400, detail="parameters.tools must be a list")
+    for index, call in enumerate(calls):
+        if not isinstance(call, dict) or "tool" not in call:
+            raise HTTPException(
+                status_code=400, detail=f"parameters.tools[{index}] must be an object with 'tool'"
+            )
+        if not isinstance(call["tool"], str) or call["tool"] not in FORCED_TOOL_NAMES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"parameters.tools[{index}]: unknown tool {call['tool']!r}",
+            )
+        if not isinstance(call.get("args") or {}, dict):
+            raise HTTPException(
+                status_code=400, detail=f"parameters.tools[{index}].args must be an object"
+            )
+
+
+@router.post("/agents/invoke")
+async def invoke_agent(payload: InvokeRequest, request: Request) -> Any:
+    if payload.stream:
+        return await invoke_agent_stream(payload, request)
+    _check_agent(payload)
+
+    session_id = payload.session_id or str(uuid.uuid4())
+    token = agent_ctx.set(payload.agent)
+    try:
+        state = await arun_agent(_initial_state(payload, session_id))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=502, detail=str(exc)) from exc
+    agent_ctx.reset(token)
+
+    return _invoke_body(state, session_id, request)
+
+
+@router.post("/agents/invoke/stream")
+async def invoke_agent_stream(payload: InvokeRequest, request: Request) -> StreamingResponse:
+    """以 SSE 返回：tool（结构化工具结果）→ token（LLM 增量文本）
+    → done（与 /agents/invoke 相同的响应体）"""
+    _check_agent(payload)
+    session_id = payload.session_id or str(uuid.uuid4())
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in astream_agent(_initial_state(payload, session_id)):
+                if event == "done":
+                    data = _invoke_body(data, session_id, request)
+                yield _sse_event(event, data)
+        except RuntimeError as exc:
+            # 响应头已发出，错误以事件形式告知客户端
+            yield _sse_event("error", {"status": 502, "detail": str(exc)})
+
+    return StreamingResponse(
+        events(),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/health")
 async def health() -> dict[str, Any]:
-    load_data()
-    spapi_status = SpApiClient().health_check()
+    # 只读取缓存的依赖状态与内存中的加载标记，不连接数据库、不请求 LWA token
+    dependencies = health_monitor.dependencies()
     return {
-        "status": "ok",
-        "data_loaded": True,
-        "spapi": spapi_status,
+        "status": "degraded" if health_monitor.degraded() else "ok",
+        "data_loaded": is_data_loaded(),
+        "spapi": dependencies["spapi"],
+        "dependencies": dependencies,
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
 
+@router.get("/health/live")
+async def health_live() -> dict[str, Any]:
+    """存活探针：进程能处理请求即返回 200，不检查任何依赖"""
+    return {"status": "ok", "timestamp": datetime.now(UTC).isoformat()}
+
+
+@router.get("/health/ready")
+async def health_ready() -> JSONResponse:
+    """就绪探针：数据已加载且必需依赖（MySQL）可用时返回 200，否则 503"""
+    data_loaded = is_data_loaded()
+    ready = data_loaded and health_monitor.ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "degraded": health_monitor.degraded(),
+            "data_loaded": data_loaded,
+            "snapshot_version": get_snapshot_version(),
+            "dependencies": health_monitor.dependencies(),
+            "timestamp": datetime.now(UTC).isoformat(),
+        },
+    )
+
+
 @router.get("/metrics", response_class=PlainTextResponse)
 async def metrics_endpoint() -> str:
     return metrics.export_prometheus()
+
+
+@router.get("/debug/traces")
+async def debug_traces(
+    limit: int = Query(20, ge=1, le=200),
+    min_ms: float = Query(0.0, ge=0),
+    request_id: str | None = None,
+) -> dict[str, Any]:
+    """最近完成的 trace（新的在前），可按耗时下限或 request_id 过滤"""
+    traces = tracer.recent(limit=limit, min_duration_ms=min_ms, request_id=request_id)
+    return {"enabled": tracer.enabled, "count": len(traces), "traces": traces}
+
+
+def _require_api_key() -> None:
+    # 采样/内存快照会影响所在 worker，未配置 API_KEY（中间件不鉴权）时拒绝
+    if not settings.api_key:
+        raise HTTPException(
+            status_code=403, detail="Profiling endpoints require API_KEY to be configured"
+        )
+
+
+@router.get("/debug/profile", dependencies=[Depends(_require_api_key)])
+async def debug_profile(
+    seconds: float = Query(5.0, gt=0, le=settings.profile_max_seconds),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    format: Literal["collapsed", "json"] = "collapsed",
+    idle: bool = False,
+):
+    """对当前 worker 采样 seconds 秒；默认返回折叠栈文本（flamegraph.pl / speedscope 可直接读取）"""
+    try:
+        # 采样线程独立于工具线程池，事件循环与工具线程都会被采到
+        result = await asyncio.to_thread(stack_sampler.sample, seconds, interval_ms / 1000, idle)
+    except ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    stacks = result.pop("stacks")
+    if format == "json":
+        return {**result, "top_functions": top_functions(stacks), "collapsed": collapsed(stacks)}
+    return PlainTextResponse(collapsed(stacks))
+
+
+@router.get("/debug/alloc", dependencies=[Depends(_require_api_key)])
+async def debug_alloc(
+    seconds: float = Query(10.0, ge=0, le=settings.profile_max_seconds),
+    limit: int = Query(20, ge=1, le=200),
+    group_by: Literal["lineno", "traceback", "filename"] = "lineno",
+    frames: int = Query(10, ge=1, le=50),
+) -> dict[str, Any]:
+    """tracemalloc 分配热点；未开启追踪时只在 seconds 窗口内开启，统计窗口内仍存活的分配"""
+    try:
+        return await asyncio.to_thread(allocation_snapshot, seconds, limit, group_by, frames)
+    except ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
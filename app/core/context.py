@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.core.memo import RequestMemo
+    from app.core.tracing import Span
 
 request_id_ctx: ContextVar[str | None] = ContextVar("request_id", default=None)
 agent_ctx: ContextVar[str | None] = ContextVar("agent", default=None)
 tool_ctx: ContextVar[str | None] = ContextVar("tool", default=None)
 trace_id_ctx: ContextVar[str | None] = ContextVar("trace_id", default=None)
+request_memo_ctx: ContextVar[RequestMemo | None] = ContextVar("request_memo", default=None)
+current_span_ctx: ContextVar[Span | None] = ContextVar("current_span", default=None)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.executor import run_in_executor
+from app.core.metrics import metrics
+from app.core.settings import settings
+from app.data.repository import ping_database
+from app.llm.qingyun_client import QingyunChatClient
+from app.spapi.client import SpApiClient
+
+logger = logging.getLogger("app.health")
+
+# 这些状态表示依赖可用或未启用，不影响 ready
+_UP_STATUSES = {"ok", "mock", "disabled"}
+
+
+@dataclass
+class DependencyCheck:
+    name: str
+    check: Callable[[], dict[str, Any]]
+    ttl_seconds: float
+    # 必需依赖失败时 /health/ready 返回 503；其余只标记为 degraded
+    required: bool = False
+    status: str = "unknown"
+    message: str = ""
+    checked_at: float = 0.0
+    latency_ms: float = 0.0
+
+    def expired(self, now: float) -> bool:
+        return now - self.checked_at >= self.ttl_seconds
+
+    def as_dict(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {"status": self.status, "latency_ms": self.latency_ms}
+        if self.checked_at:
+            payload["age_seconds"] = round(time.time() - self.checked_at, 1)
+        if self.message:
+            payload["message"] = self.message
+        return payload
+
+
+class HealthMonitor:
+    """依赖健康状态缓存：后台任务按各自 TTL 刷新，探针只读取缓存。
+
+    探针从不触发检查：首次检查完成前状态为 unknown，/health/ready 返回 503。
+    """
+
+    def __init__(self, checks: list[DependencyCheck], interval_seconds: float) -> None:
+        self.checks = {check.name: check for check in checks}
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    async def refresh(self, force: bool = False) -> None:
+        now = time.time()
+        due = [check for check in self.checks.values() if force or check.expired(now)]
+        if due:
+            # 检查可能阻塞（LWA token 请求、数据库连接），放到工作线程并发执行
+            await asyncio.gather(*(run_in_executor(self._run_check, check) for check in due))
+
+    def _run_check(self, check: DependencyCheck) -> None:
+        start = time.perf_counter()
+        try:
+            result = check.check()
+            check.status = result.get("status", "ok")
+            check.message = result.get("message", "")
+        except Exception as exc:
+            check.status = "error"
+            check.message = f"{type(exc).__name__}: {exc}"
+            logger.error("health_check_failed", extra={"error_code": type(exc).__name__})
+        check.latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        check.checked_at = time.time()
+        metrics.set_dependency_up(check.name, check.status in _UP_STATUSES)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.error("health_refresh_failed", extra={"error_code": type(exc).__name__})
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def dependencies(self) -> dict[str, dict[str, Any]]:
+        return {name: check.as_dict() for name, check in self.checks.items()}
+
+    def ready(self) -> bool:
+        return all(check.status in _UP_STATUSES for check in self.checks.values() if check.required)
+
+    def degraded(self) -> bool:
+        return any(check.status == "error" for check in self.checks.values())
+
+
+_spapi = SpApiClient()
+_llm = QingyunChatClient()
+
+health_monitor = HealthMonitor(
+    [
+        DependencyCheck("mysql", ping_database, settings.health_mysql_ttl_seconds, required=True),
+        # 复用同一个客户端实例，LWA token 在其有效期内只请求一次
+        DependencyCheck("spapi", _spapi.health_check, settings.health_spapi_ttl_seconds),
+        DependencyCheck("llm", _llm.ping, settings.health_llm_ttl_seconds),
+    ],
+    interval_seconds=settings.health_refresh_seconds,
+)
+
+
+def start_health_monitor() -> None:
+    health_monitor.start()
+
+
+async def stop_health_monitor() -> None:
+    await health_monitor.stop()
+    _llm.close()
@@ -1,48 +1,157 @@
 from __future__ import annotations
 
-import json
+import atexit
 import logging
-from datetime import datetime, timezone
-from typing import Any
+import queue
+import random
+import sys
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, TextIO
+
+import orjson
 
 from app.core.context import agent_ctx, request_id_ctx, tool_ctx, trace_id_ctx
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+_CONTEXT_FIELDS = (
+    ("request_id", request_id_ctx),
+    ("agent", agent_ctx),
+    ("tool", tool_ctx),
+    ("trace_id", trace_id_ctx),
+)
+_EXTRA_FIELDS = ("latency_ms", "status", "error_code", "memo_calls", "memo_saved")
+# 高 QPS 时可按比例采样的逐请求日志；warning 以上及 4xx/5xx 始终保留
+SAMPLED_MESSAGES = frozenset({"request_complete", "tool_complete"})
+
+
+def _dumps(payload: dict[str, Any]) -> str:
+    # orjson 比标准库 json 快数倍，输出同样不转义非 ASCII 字符
+    return orjson.dumps(payload, default=str).decode("utf-8")
 
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         payload: dict[str, Any] = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            # 使用记录创建时间：异步模式下格式化发生在后台线程
+            "timestamp": datetime.fromtimestamp(record.created, UTC).isoformat(),
             "level": record.levelname,
             "message": record.getMessage(),
             "logger": record.name,
         }
 
-        request_id = getattr(record, "request_id", None) or request_id_ctx.get()
-        agent = getattr(record, "agent", None) or agent_ctx.get()
-        tool = getattr(record, "tool", None) or tool_ctx.get()
-        trace_id = getattr(record, "trace_id", None) or trace_id_ctx.get()
-
-        if request_id:
-            payload["request_id"] = request_id
-        if agent:
-            payload["agent"] = agent
-        if tool:
-            payload["tool"] = tool
-        if trace_id:
-            payload["trace_id"] = trace_id
-
-        for key in ("latency_ms", "status", "error_code"):
+        for key, ctx in _CONTEXT_FIELDS:
+            value = getattr(record, key, None) or ctx.get()
+            if value:
+                payload[key] = value
+
+        for key in _EXTRA_FIELDS:
             value = getattr(record, key, None)
             if value is not None:
                 payload[key] = value
 
-        return json.dumps(payload, ensure_ascii=False)
+        return _dumps(payload)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.msg not in SAMPLED_MESSAGES:
+            return True
+        if record.levelno >= logging.WARNING or (getattr(record, "status", 0) or 0) >= 400:
+            return True
+        return random.random() < self.rate
+
+
+class ContextQueueHandler(QueueHandler):
+    """入队前在调用线程上捕获上下文变量；队列满时丢弃并计数，不阻塞请求。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        for key, ctx in _CONTEXT_FIELDS:
+            if getattr(record, key, None) is None:
+                setattr(record, key, ctx.get())
+        # 只合并 msg % args，JSON 格式化留给后台线程
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.observe_log_dropped()
 
 
-def configure_logging() -> None:
-    handler = logging.StreamHandler()
-    handler.setFormatter(JsonFormatter())
+class BatchStreamHandler(logging.StreamHandler):
+    """后台线程中使用：累积到 batch_size 条或队列已空时一次性写出。"""
 
+    def __init__(self, stream: TextIO, source: queue.Queue, batch_size: int) -> None:
+        super().__init__(stream)
+        self.source = source
+        self.batch_size = max(batch_size, 1)
+        self._buffer: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buffer) >= self.batch_size or self.source.empty():
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        self.acquire()
+        try:
+            self.stream.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+            self.stream.flush()
+        finally:
+            self.release()
+
+
+_listener: QueueListener | None = None
+
+
+def stop_logging() -> None:
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        # stop() 会先处理完队列中剩余的记录
+        listener.stop()
+        for handler in listener.handlers:
+            handler.flush()
+
+
+def configure_logging(stream: TextIO | None = None) -> None:
+    global _listener
+    stream = stream or sys.stderr
+    stop_logging()
     root = logging.getLogger()
-    root.handlers = [handler]
     root.setLevel(logging.INFO)
+
+    if not settings.log_async:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(SamplingFilter(settings.log_sample_rate))
+        root.handlers = [handler]
+        return
+
+    records: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    writer = BatchStreamHandler(stream, records, settings.log_batch_size)
+    writer.setFormatter(JsonFormatter())
+    queue_handler = ContextQueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(settings.log_sample_rate))
+    root.handlers = [queue_handler]
+    _listener = QueueListener(records, writer)
+    _listener.start()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import functools
+from collections.abc import Callable, Hashable, Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, TypeVar
+
+from app.core.context import request_memo_ctx
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class RequestMemo:
+    """单次调用内的结果备忘：相同函数 + 相同参数只执行一次。
+
+    并发的相同调用会等待首个调用的结果（in-flight 去重），异常不缓存。
+    结果不做拷贝，所有调用方共享同一对象：按只读使用，需要修改时由调用方自行拷贝。
+    """
+
+    def __init__(self) -> None:
+        self._results: dict[Hashable, Future] = {}
+        self._lock = Lock()
+        self.calls = 0
+        self.saved = 0
+
+    def call(self, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            self.calls += 1
+            future = self._results.get(key)
+            if future is not None:
+                self.saved += 1
+                owner = False
+            else:
+                future = self._results[key] = Future()
+                owner = True
+        if not owner:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as exc:
+            with self._lock:
+                if self._results.get(key) is future:
+                    del self._results[key]
+            future.set_exception(exc)
+            raise
+        future.set_result(result)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+
+@contextmanager
+def request_memo() -> Iterator[RequestMemo]:
+    memo = RequestMemo()
+    token = request_memo_ctx.set(memo)
+    try:
+        yield memo
+    finally:
+        request_memo_ctx.reset(token)
+        metrics.observe_request_memo(memo.calls, memo.saved)
+
+
+def invalidate_request_memo() -> None:
+    memo = request_memo_ctx.get()
+    if memo is not None:
+        memo.clear()
+
+
+def request_memoized(func: Callable[..., T]) -> Callable[..., T]:
+    """在 request_memo() 作用域内对只读的仓储/工具调用去重；作用域外直接调用。"""
+
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        memo = request_memo_ctx.get()
+        if memo is None:
+            return func(*args, **kwargs)
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return func(*args, **kwargs)
+        return memo.call(key, lambda: func(*args, **kwargs))
+
+    return wrapper
@@ -1,38 +1,170 @@
 from __future__ import annotations
 
-import statistics
+import threading
 import time
+from bisect import bisect_left
 from collections import deque
+from collections.abc import Iterable, Sequence
 from threading import Lock
 from typing import Deque
 
+from app.core.metrics_store import MultiprocessStore, SampleKey
+from app.core.settings import settings
+
+DEFAULT_LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    """累积直方图的一个序列：每个桶一个计数，自带锁（按序列分锁，互不争用）。"""
+
+    __slots__ = ("buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        # 最后一个是 +Inf 桶
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class HistogramFamily:
+    """按标签值区分的一组直方图；全局锁只在首次创建序列时使用。"""
+
+    def __init__(self, name: str, label_names: tuple[str, ...], buckets: Sequence[float]) -> None:
+        self.name = name
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], Histogram] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(label_values, Histogram(self.buckets))
+        series.observe(value)
+
+    def collect_into(self, samples: dict[SampleKey, float]) -> None:
+        with self._lock:
+            items = list(self._series.items())
+        for labels, series in items:
+            counts, total = series.snapshot()
+            for index, count in enumerate(counts):
+                samples[("h", self.name, labels, str(index))] = count
+            samples[("h", self.name, labels, "sum")] = total
+
+    def series(
+        self, samples: dict[SampleKey, float]
+    ) -> list[tuple[tuple[str, ...], list[int], float]]:
+        """从（可能已跨进程合并的）样本中还原每个序列的 (标签, 各桶计数, 总和)。"""
+        grouped: dict[tuple[str, ...], list[float]] = {}
+        for (kind, name, labels, part), value in samples.items():
+            if kind != "h" or name != self.name:
+                continue
+            row = grouped.setdefault(labels, [0.0] * (len(self.buckets) + 2))
+            row[-1 if part == "sum" else int(part)] = value
+        return [
+            (labels, [int(count) for count in row[:-1]], row[-1])
+            for labels, row in sorted(grouped.items())
+        ]
+
+    def export(self, lines: list[str], samples: dict[SampleKey, float]) -> None:
+        lines.append(f"# TYPE {self.name} histogram")
+        for label_values, counts, total in self.series(samples):
+            labels = ",".join(
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.label_names, label_values, strict=True)
+            )
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total:.2f}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+
+
+def _latency_buckets() -> tuple[float, ...]:
+    # Settings 已校验并规整为升序、去重、不含 inf 的列表
+    raw = settings.metrics_latency_buckets_ms
+    if not raw:
+        return DEFAULT_LATENCY_BUCKETS_MS
+    return tuple(float(value) for value in raw.split(","))
+
 
 class Metrics:
-    def __init__(self) -> None:
+    def __init__(
+        self, buckets: Sequence[float] | None = None, multiproc_dir: str | None = None
+    ) -> None:
         self._lock = Lock()
         self._request_count = 0
         self._error_count = 0
-        self._latencies: Deque[float] = deque(maxlen=1000)
         self._status_window: Deque[int] = deque(maxlen=200)
+        self._window_errors = 0
         self._tool_counts: dict[str, int] = {}
-        self._tool_latencies: dict[str, Deque[float]] = {}
+        buckets = tuple(buckets) if buckets else _latency_buckets()
+        self._request_latency = HistogramFamily(
+            "inventory_request_duration_ms", ("route", "method"), buckets
+        )
+        self._agent_latency = HistogramFamily("inventory_agent_duration_ms", ("agent",), buckets)
+        self._tool_latency = HistogramFamily("inventory_tool_duration_ms", ("tool",), buckets)
+        self._families = (self._request_latency, self._agent_latency, self._tool_latency)
         self._llm_requests = 0
         self._llm_failures = 0
+        self._llm_connections_new = 0
+        self._llm_connections_reused = 0
+        self._llm_cache_hits = 0
+        self._llm_cache_misses = 0
+        self._memo_calls = 0
+        self._memo_saved = 0
+        self._vendor_cache_hits = 0
+        self._vendor_cache_misses = 0
+        self._log_dropped = 0
+        self._trace_dropped = 0
+        self._snapshot_version = 0
+        self._dependency_up: dict[str, int] = {}
         self._started_at = time.time()
+        multiproc_dir = settings.metrics_multiproc_dir if multiproc_dir is None else multiproc_dir
+        self._store = MultiprocessStore(multiproc_dir) if multiproc_dir else None
+        self._flush_seconds = settings.metrics_flush_seconds
+        self._flusher: threading.Thread | None = None
+        self._stop_flush = threading.Event()
 
-    def observe_request(self, status: int, latency_ms: float) -> None:
+    def observe_request(
+        self, status: int, latency_ms: float, route: str = "unmatched", method: str = ""
+    ) -> None:
+        self._request_latency.observe(latency_ms, route, method)
         with self._lock:
             self._request_count += 1
             if status >= 500:
                 self._error_count += 1
-            self._latencies.append(latency_ms)
-            self._status_window.append(status)
+            window = self._status_window
+            # 窗口内错误数增量维护，告警判断不再逐个遍历
+            if len(window) == window.maxlen and window[0] >= 500:
+                self._window_errors -= 1
+            window.append(status)
+            if status >= 500:
+                self._window_errors += 1
+
+    def observe_agent(self, agent_id: str, latency_ms: float) -> None:
+        self._agent_latency.observe(latency_ms, agent_id)
 
     def observe_tool(self, tool_name: str, latency_ms: float) -> None:
+        self._tool_latency.observe(latency_ms, tool_name)
         with self._lock:
             self._tool_counts[tool_name] = self._tool_counts.get(tool_name, 0) + 1
-            bucket = self._tool_latencies.setdefault(tool_name, deque(maxlen=500))
-            bucket.append(latency_ms)
 
     def observe_llm(self, success: bool) -> None:
         with self._lock:
@@ -40,50 +172,212 @@ class Metrics:
             if not success:
                 self._llm_failures += 1
 
-    def export_prometheus(self) -> str:
+    def observe_llm_connection(self, reused: bool) -> None:
+        with self._lock:
+            if reused:
+                self._llm_connections_reused += 1
+            else:
+                self._llm_connections_new += 1
+
+    def observe_llm_cache(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._llm_cache_hits += 1
+            else:
+                self._llm_cache_misses += 1
+
+    def observe_request_memo(self, calls: int, saved: int) -> None:
         with self._lock:
-            uptime = time.time() - self._started_at
-            p95 = _percentile(self._latencies, 95)
-            p99 = _percentile(self._latencies, 99)
-            error_rate = _error_rate(self._status_window)
-            lines = [
-                f"inventory_uptime_seconds {uptime:.2f}",
-                f"inventory_requests_total {self._request_count}",
-                f"inventory_requests_errors_total {self._error_count}",
-                f"inventory_request_latency_p95_ms {p95:.2f}",
-                f"inventory_request_latency_p99_ms {p99:.2f}",
-                f"inventory_request_error_rate {error_rate:.4f}",
-                f"inventory_llm_requests_total {self._llm_requests}",
-                f"inventory_llm_failures_total {self._llm_failures}",
-            ]
-            for tool, count in sorted(self._tool_counts.items()):
-                tool_p95 = _percentile(self._tool_latencies.get(tool, deque()), 95)
-                lines.append(f"inventory_tool_calls_total{{tool=\"{tool}\"}} {count}")
-                lines.append(
-                    f"inventory_tool_latency_p95_ms{{tool=\"{tool}\"}} {tool_p95:.2f}"
-                )
+            self._memo_calls += calls
+            self._memo_saved += saved
+
+    def observe_vendor_cache(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._vendor_cache_hits += 1
+            else:
+                self._vendor_cache_misses += 1
+
+    def observe_log_dropped(self) -> None:
+        with self._lock:
+            self._log_dropped += 1
+
+    def observe_trace_dropped(self) -> None:
+        with self._lock:
+            self._trace_dropped += 1
+
+    def set_snapshot_version(self, version: int) -> None:
+        with self._lock:
+            self._snapshot_version = version
+
+    def set_dependency_up(self, dependency: str, up: bool) -> None:
+        with self._lock:
+            self._dependency_up[dependency] = int(up)
+
+    def collect(self) -> dict[SampleKey, float]:
+        """当前进程的全部指标，扁平为 (类型, 名称, 标签值, 部分) -> 值。"""
+        samples: dict[SampleKey, float] = {}
+        for family in self._families:
+            family.collect_into(samples)
+        with self._lock:
+            for name, attribute in _COUNTERS:
+                samples[("c", name, (), "")] = getattr(self, attribute)
+            for tool, count in self._tool_counts.items():
+                samples[("c", "inventory_tool_calls_total", (tool,), "")] = count
+            samples[("g", "inventory_uptime_seconds", (), "")] = time.time() - self._started_at
+            samples[("g", "inventory_snapshot_version", (), "")] = self._snapshot_version
+            samples[("g", "inventory_request_window_errors", (), "")] = self._window_errors
+            samples[("g", "inventory_request_window_size", (), "")] = len(self._status_window)
+            for dependency, up in self._dependency_up.items():
+                samples[("g", "inventory_dependency_up", (dependency,), "")] = up
+        return samples
+
+    def export_prometheus(self) -> str:
+        if self._store is None:
+            return self._render(self.collect())
+        # 多进程模式：先写入本进程的最新值，再合并所有 worker 的文件
+        self.flush()
+        return self._render(merge_samples(self._store.read_all()))
+
+    def flush(self) -> None:
+        if self._store is not None:
+            self._store.write(self.collect())
+
+    def start_flusher(self) -> None:
+        """多进程模式下在每个 worker 启动后台线程，定期把本进程指标写入共享目录。"""
+        if self._store is None or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        self._stop_flush.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def stop_flusher(self) -> None:
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            self._stop_flush.set()
+            flusher.join(timeout=5)
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._stop_flush.wait(self._flush_seconds):
+            self.flush()
+
+    def _render(self, samples: dict[SampleKey, float]) -> str:
+        def value(kind: str, name: str) -> float:
+            return samples.get((kind, name, (), ""), 0)
+
+        # 导出只需 O(桶数)：p95/p99 由所有路由直方图合并后按桶插值估算
+        buckets = self._request_latency.buckets
+        request_series = self._request_latency.series(samples)
+        merged = [
+            sum(column) for column in zip(*(counts for _, counts, _ in request_series), strict=True)
+        ]
+        window_size = value("g", "inventory_request_window_size")
+        errors = value("g", "inventory_request_window_errors")
+        error_rate = errors / window_size if window_size else 0.0
+        lines = [
+            f"inventory_uptime_seconds {value('g', 'inventory_uptime_seconds'):.2f}",
+            f"inventory_requests_total {int(value('c', 'inventory_requests_total'))}",
+            f"inventory_requests_errors_total {int(value('c', 'inventory_requests_errors_total'))}",
+            f"inventory_request_latency_p95_ms {_bucket_percentile(buckets, merged, 95):.2f}",
+            f"inventory_request_latency_p99_ms {_bucket_percentile(buckets, merged, 99):.2f}",
+            f"inventory_request_error_rate {error_rate:.4f}",
+        ]
+        for name, _ in _COUNTERS[2:]:
+            lines.append(f"{name} {int(value('c', name))}")
+        lines.append(f"inventory_snapshot_version {int(value('g', 'inventory_snapshot_version'))}")
+        for dependency in _labels(samples, "inventory_dependency_up"):
+            up = int(samples[("g", "inventory_dependency_up", dependency, "")])
+            lines.append(f"inventory_dependency_up{{dependency=\"{dependency[0]}\"}} {up}")
+        tool_series = {labels: counts for labels, counts, _ in self._tool_latency.series(samples)}
+        for tool in _labels(samples, "inventory_tool_calls_total"):
+            count = int(samples[("c", "inventory_tool_calls_total", tool, "")])
+            tool_p95 = _bucket_percentile(self._tool_latency.buckets, tool_series.get(tool, []), 95)
+            lines.append(f"inventory_tool_calls_total{{tool=\"{tool[0]}\"}} {count}")
+            lines.append(f"inventory_tool_latency_p95_ms{{tool=\"{tool[0]}\"}} {tool_p95:.2f}")
+        for family in self._families:
+            family.export(lines, samples)
         return "\n".join(lines) + "\n"
 
     def error_rate_exceeded(self, threshold: float, min_requests: int) -> bool:
         with self._lock:
             if len(self._status_window) < min_requests:
                 return False
-            return _error_rate(self._status_window) > threshold
+            return self._window_error_rate() > threshold
+
+    def _window_error_rate(self) -> float:
+        if not self._status_window:
+            return 0.0
+        return self._window_errors / len(self._status_window)
+
+
+# (导出名称, 属性)，按导出顺序排列
+_COUNTERS = (
+    ("inventory_requests_total", "_request_count"),
+    ("inventory_requests_errors_total", "_error_count"),
+    ("inventory_llm_requests_total", "_llm_requests"),
+    ("inventory_llm_failures_total", "_llm_failures"),
+    ("inventory_llm_connections_new_total", "_llm_connections_new"),
+    ("inventory_llm_connections_reused_total", "_llm_connections_reused"),
+    ("inventory_llm_cache_hits_total", "_llm_cache_hits"),
+    ("inventory_llm_cache_misses_total", "_llm_cache_misses"),
+    ("inventory_request_memo_calls_total", "_memo_calls"),
+    ("inventory_request_memo_saved_total", "_memo_saved"),
+    ("inventory_vendor_cache_hits_total", "_vendor_cache_hits"),
+    ("inventory_vendor_cache_misses_total", "_vendor_cache_misses"),
+    ("inventory_log_dropped_total", "_log_dropped"),
+    ("inventory_trace_dropped_total", "_trace_dropped"),
+)
+
+# 仪表合并方式（只取存活 worker）；未列出的求和。计数器与直方图总是求和，
+# 已退出 worker 的值也计入，保证跨进程合计单调递增。
+_GAUGE_MERGE = {
+    "inventory_uptime_seconds": max,
+    "inventory_snapshot_version": max,
+    # 任一 worker 认为依赖不可用即报告不可用
+    "inventory_dependency_up": min,
+}
+
+
+def merge_samples(sources: Iterable[tuple[dict[SampleKey, float], bool]]) -> dict[SampleKey, float]:
+    merged: dict[SampleKey, float] = {}
+    gauges: dict[SampleKey, list[float]] = {}
+    for samples, alive in sources:
+        for key, value in samples.items():
+            if key[0] == "g":
+                if alive:
+                    gauges.setdefault(key, []).append(value)
+            else:
+                merged[key] = merged.get(key, 0.0) + value
+    for key, values in gauges.items():
+        merged[key] = _GAUGE_MERGE.get(key[1], sum)(values)
+    return merged
+
+
+def _labels(samples: dict[SampleKey, float], name: str) -> list[tuple[str, ...]]:
+    return sorted(key[2] for key in samples if key[1] == name)
 
 
 metrics = Metrics()
 
 
-def _percentile(values: Deque[float], percentile: int) -> float:
-    if not values:
+def _bucket_percentile(buckets: Sequence[float], counts: Sequence[int], percentile: int) -> float:
+    """按 Prometheus histogram_quantile 的方式在桶内线性插值估算分位数。"""
+    total = sum(counts)
+    if not total:
         return 0.0
-    ordered = sorted(values)
-    index = int(round((percentile / 100) * (len(ordered) - 1)))
-    return float(ordered[index])
+    rank = percentile / 100 * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if index == len(buckets):
+                # 落在 +Inf 桶，只能给出最大的有限上界
+                return float(buckets[-1])
+            lower = buckets[index - 1] if index else 0.0
+            return lower + (buckets[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return float(buckets[-1])
 
 
-def _error_rate(values: Deque[int]) -> float:
-    if not values:
-        return 0.0
-    errors = sum(1 for status in values if status >= 500)
-    return errors / len(values)
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
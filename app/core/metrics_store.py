@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from threading import Lock
+
+# 多进程指标文件：每个 worker 独占一个 mmap 文件 metrics_<pid>.db，只由自己写入；
+# /metrics 读取目录下所有文件合并。文件格式：
+#   头部 8 字节：u32 已用字节数 + u32 保留
+#   条目：u32 key 长度 + key（utf-8，补齐到 8 字节对齐）+ f64 值
+# 新条目先写数据再更新头部的已用字节数，读者不会看到半写的条目；已有值原地覆盖。
+
+_HEADER = struct.Struct("<II")
+_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_INITIAL_SIZE = 64 * 1024
+
+SampleKey = tuple  # (kind, name, label_values, part)
+
+
+def encode_key(key: SampleKey) -> str:
+    kind, name, labels, part = key
+    return json.dumps([kind, name, list(labels), part], ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_key(raw: str) -> SampleKey:
+    kind, name, labels, part = json.loads(raw)
+    return kind, name, tuple(labels), part
+
+
+class MmapValues:
+    """单写者的 key -> float64 映射，底层是可增长的 mmap 文件。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = open(path, "w+b")  # noqa: SIM115 - 与 mmap 同生命周期，close() 时关闭
+        self._file.truncate(_INITIAL_SIZE)
+        self._capacity = _INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.size
+        _HEADER.pack_into(self._map, 0, self._used, 0)
+        self._offsets: dict[str, int] = {}
+        self._lock = Lock()
+
+    def write(self, samples: dict[SampleKey, float]) -> None:
+        with self._lock:
+            for key, value in samples.items():
+                raw = encode_key(key)
+                offset = self._offsets.get(raw)
+                if offset is None:
+                    offset = self._append(raw)
+                _VALUE.pack_into(self._map, offset, float(value))
+
+    def close(self) -> None:
+        with self._lock:
+            self._map.close()
+            self._file.close()
+
+    def _append(self, raw: str) -> int:
+        encoded = raw.encode("utf-8")
+        padded = len(encoded) + (-(_LENGTH.size + len(encoded)) % 8)
+        size = _LENGTH.size + padded + _VALUE.size
+        while self._used + size > self._capacity:
+            self._grow()
+        start = self._used
+        _LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + _LENGTH.size : start + _LENGTH.size + len(encoded)] = encoded
+        value_offset = start + _LENGTH.size + padded
+        _VALUE.pack_into(self._map, value_offset, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used, 0)
+        self._offsets[raw] = value_offset
+        return value_offset
+
+    def _grow(self) -> None:
+        self._capacity *= 2
+        self._map.close()
+        self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+
+def read_values(path: Path) -> dict[SampleKey, float]:
+    data = path.read_bytes()
+    if len(data) < _HEADER.size:
+        return {}
+    used, _ = _HEADER.unpack_from(data, 0)
+    samples: dict[SampleKey, float] = {}
+    position = _HEADER.size
+    while position < min(used, len(data)):
+        (length,) = _LENGTH.unpack_from(data, position)
+        key_start = position + _LENGTH.size
+        padded = length + (-(_LENGTH.size + length) % 8)
+        (value,) = _VALUE.unpack_from(data, key_start + padded)
+        samples[decode_key(data[key_start : key_start + length].decode("utf-8"))] = value
+        position = key_start + padded + _VALUE.size
+    return samples
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessStore:
+    """一个目录下所有 worker 的指标文件。"""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._values: MmapValues | None = None
+        self._pid: int | None = None
+
+    def write(self, samples: dict[SampleKey, float]) -> None:
+        pid = os.getpid()
+        if self._pid != pid:
+            # fork 之后（gunicorn --preload）子进程改写自己的文件
+            self._values = MmapValues(self.directory / f"metrics_{pid}.db")
+            self._pid = pid
+        self._values.write(samples)
+
+    def read_all(self) -> list[tuple[dict[SampleKey, float], bool]]:
+        """返回 [(samples, 进程是否存活)]；已退出 worker 的计数器仍计入合计。"""
+        results = []
+        for path in sorted(self.directory.glob("metrics_*.db")):
+            try:
+                pid = int(path.stem.split("_", 1)[1])
+                samples = read_values(path)
+            except (OSError, ValueError):
+                continue
+            results.append((samples, pid == os.getpid() or _pid_alive(pid)))
+        return results
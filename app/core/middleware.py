@@ -1,93 +1,175 @@
 from __future__ import annotations
 
+import logging
+import math
 import time
 import uuid
-from collections import deque
-from typing import Deque
 
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.context import agent_ctx, request_id_ctx, trace_id_ctx
 from app.core.metrics import metrics
+from app.core.rate_limit import RateLimiter
 from app.core.settings import settings
+from app.core.tracing import tracer
 
+logger = logging.getLogger("app")
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = request.headers.get("x-request-id") or str(uuid.uuid4())
-        request.state.request_id = request_id
+# 纯 ASGI 中间件：不经过 BaseHTTPMiddleware 的额外 task 与内存流，
+# 流式响应（SSE / NDJSON）直接透传。非 http 的 scope（lifespan 等）原样放行。
+
+
+def _request_id(scope: Scope) -> str:
+    return scope.get("state", {}).get("request_id", "")
+
+
+def _error_response(
+    scope: Scope, status_code: int, code: str, message: str, headers: dict[str, str] | None = None
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "success": False,
+            "error": {"code": code, "message": message, "request_id": _request_id(scope)},
+        },
+        headers=headers,
+    )
+
+
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_id = headers.get("x-request-id") or str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
         token = request_id_ctx.set(request_id)
-        trace_header = request.headers.get("x-trace-id") or request.headers.get("traceparent")
+        trace_header = headers.get("x-trace-id") or headers.get("traceparent")
         trace_token = trace_id_ctx.set(trace_header or request_id)
-        response: Response = await call_next(request)
-        response.headers["x-request-id"] = request_id
-        response.headers["x-trace-id"] = trace_id_ctx.get() or request_id
-        request_id_ctx.reset(token)
-        trace_id_ctx.reset(trace_token)
-        return response
-
-
-class ApiKeyMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if settings.api_key:
-            header_key = request.headers.get("x-api-key")
-            auth_header = request.headers.get("authorization") or ""
+
+        async def send_with_ids(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                response_headers["x-request-id"] = request_id
+                response_headers["x-trace-id"] = trace_id_ctx.get() or request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_ids)
+        finally:
+            request_id_ctx.reset(token)
+            trace_id_ctx.reset(trace_token)
+
+
+class ApiKeyMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and settings.api_key:
+            headers = Headers(scope=scope)
+            header_key = headers.get("x-api-key")
+            auth_header = headers.get("authorization") or ""
             bearer = auth_header.replace("Bearer", "").strip() if auth_header else ""
             if header_key != settings.api_key and bearer != settings.api_key:
-                return JSONResponse(
-                    status_code=401,
-                    content={
-                        "success": False,
-                        "error": {
-                            "code": "UNAUTHORIZED",
-                            "message": "Invalid API key",
-                            "request_id": getattr(request.state, "request_id", ""),
-                        },
-                    },
-                )
-        return await call_next(request)
+                response = _error_response(scope, 401, "UNAUTHORIZED", "Invalid API key")
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self._hits: dict[str, Deque[float]] = {}
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._limiter = RateLimiter()
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         limit = settings.rate_limit_per_minute
-        if limit > 0:
-            key = request.client.host if request.client else "global"
-            now = time.time()
-            window_start = now - 60
-            bucket = self._hits.setdefault(key, deque())
-            while bucket and bucket[0] < window_start:
-                bucket.popleft()
-            if len(bucket) >= limit:
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "success": False,
-                        "error": {
-                            "code": "RATE_LIMITED",
-                            "message": "Too many requests",
-                            "request_id": getattr(request.state, "request_id", ""),
-                        },
-                    },
+        if scope["type"] == "http" and limit > 0:
+            client = scope.get("client")
+            key = client[0] if client else "global"
+            retry_after = self._limiter.hit(key, limit)
+            if retry_after:
+                response = _error_response(
+                    scope,
+                    429,
+                    "RATE_LIMITED",
+                    "Too many requests",
+                    headers={"retry-after": str(math.ceil(retry_after))},
                 )
-            bucket.append(now)
-        return await call_next(request)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+# 探针、抓取与调试接口不记录 trace，避免冲掉环形缓冲中的业务请求
+_UNTRACED_PREFIXES = ("/health", "/metrics", "/debug")
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not tracer.enabled
+            or scope["path"].startswith(_UNTRACED_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
 
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with tracer.span(
+            f"{scope['method']} {scope['path']}", **{"http.method": scope["method"]}
+        ) as root:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    root.name = f"{scope['method']} {route.path}"
+                root.set_attribute("http.route", getattr(route, "path", None))
+                root.set_attribute("http.status_code", status_code)
+
+
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
         start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
         try:
-            response: Response = await call_next(request)
+            await self.app(scope, receive, send_with_status)
         except Exception as exc:  # pragma: no cover - handled by exception handlers
             duration = (time.perf_counter() - start) * 1000
-            request.app.logger.error(
+            logger.error(
                 "request_failed",
                 extra={
                     "latency_ms": round(duration, 2),
@@ -99,24 +181,31 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         finally:
             agent_ctx.set(None)
 
+        # 延迟按完整响应计算（流式响应包含 body 发送完成的时间）
         duration = (time.perf_counter() - start) * 1000
-        metrics.observe_request(response.status_code, round(duration, 2))
+        # 按路由模板（而非原始路径）分组，避免标签基数随参数膨胀
+        route = scope.get("route")
+        metrics.observe_request(
+            status_code,
+            round(duration, 2),
+            route=getattr(route, "path", "unmatched"),
+            method=scope["method"],
+        )
         if metrics.error_rate_exceeded(
             threshold=settings.alert_error_rate, min_requests=settings.alert_min_requests
         ):
-            request.app.logger.error(
+            logger.error(
                 "alert_error_rate_high",
                 extra={
-                    "status": response.status_code,
+                    "status": status_code,
                     "error_code": "ERROR_RATE_HIGH",
                     "latency_ms": round(duration, 2),
                 },
             )
-        request.app.logger.info(
+        logger.info(
             "request_complete",
             extra={
                 "latency_ms": round(duration, 2),
-                "status": response.status_code,
+                "status": status_code,
             },
         )
-        return response
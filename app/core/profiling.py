@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Any
+
+# 叶子帧落在这些函数上的线程视为空闲（等待锁/队列/IO），默认不计入采样
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_ROOT):
+        return os.path.relpath(filename, _ROOT)
+    # 标准库 / 第三方库只保留 site-packages 之后或文件名，折叠栈更短
+    marker = "site-packages" + os.sep
+    index = filename.rfind(marker)
+    return filename[index + len(marker) :] if index >= 0 else os.path.basename(filename)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame: FrameType) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+class StackSampler:
+    """基于 sys._current_frames 的线程采样器：在独立线程中按固定间隔抓取所有线程的调用栈，
+    输出 flamegraph.pl / speedscope 可直接读取的折叠栈（collapsed stack）格式。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, interval: float, include_idle: bool = False) -> dict[str, Any]:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running in this worker")
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> dict[str, Any]:
+        own_id = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        rounds = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            rounds += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (not include_idle and _is_idle(frame)):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return {
+            "seconds": seconds,
+            "interval_ms": interval * 1000,
+            "rounds": rounds,
+            "samples": sum(stacks.values()),
+            "stacks": stacks,
+        }
+
+
+def collapsed(stacks: Counter[str]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks: Counter[str], limit: int = 20) -> list[dict[str, Any]]:
+    """按叶子帧（self 时间）与出现在栈中的次数（total 时间）汇总。"""
+    self_counts: Counter[str] = Counter()
+    total_counts: Counter[str] = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for frame in set(frames[1:]):
+            total_counts[frame] += count
+    return [
+        {"function": function, "self": count, "total": total_counts[function]}
+        for function, count in self_counts.most_common(limit)
+    ]
+
+
+_ALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+_alloc_lock = threading.Lock()
+
+
+def allocation_snapshot(seconds: float, limit: int, group_by: str, frames: int) -> dict[str, Any]:
+    if not _alloc_lock.acquire(blocking=False):
+        raise ProfilerBusy("an allocation snapshot is already running in this worker")
+    try:
+        return _allocation_snapshot(seconds, limit, group_by, frames)
+    finally:
+        _alloc_lock.release()
+
+
+def _allocation_snapshot(seconds: float, limit: int, group_by: str, frames: int) -> dict[str, Any]:
+    """tracemalloc 快照。未开启追踪时只在 seconds 窗口内开启，结束后关闭以免常驻开销。"""
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(frames)
+        time.sleep(seconds)
+    try:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_ALLOC_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+    stats = snapshot.statistics(group_by)
+    return {
+        "window_seconds": seconds if started_here else None,
+        "traced_current_kb": round(current / 1024, 1),
+        "traced_peak_kb": round(peak / 1024, 1),
+        "group_by": group_by,
+        "top": [
+            {
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+                "traceback": [
+                    f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback
+                ],
+            }
+            for stat in stats[:limit]
+        ],
+    }
+
+
+stack_sampler = StackSampler()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+from app.core.settings import settings
+
+# GCRA（generic cell rate algorithm）：每个 key 只保存一个“理论到达时间” TAT。
+# 每分钟 limit 次 => 发放间隔 interval = 60 / limit，允许突发 limit 次。
+# 请求到达时 new_tat = max(tat, now) + interval，new_tat - now <= 60 则放行。
+# tat <= now 的 key 与从未出现过的 key 状态相同，删除不影响结果。
+# 时间统一用整数纳秒：time.time() 量级（~1.7e9）下浮点累加 interval 的误差
+# 会让许多 limit 取值的突发只放行 limit - 1 次。interval 向下取整，limit 次之和不超过窗口。
+_WINDOW_NS = 60_000_000_000
+
+logger = logging.getLogger("app.rate_limit")
+
+
+def _gcra(tat: int | None, now: int, limit: int) -> tuple[int, float]:
+    """返回 (new_tat, retry_after 秒)；retry_after 为 0 表示放行。tat/now 为纳秒。"""
+    interval = _WINDOW_NS // limit
+    new_tat = max(tat or now, now) + interval
+    overshoot = new_tat - now - _WINDOW_NS
+    if overshoot > 0:
+        return tat or now, overshoot / 1e9
+    return new_tat, 0.0
+
+
+class MemoryRateLimitBackend:
+    """进程内后端：OrderedDict 按最近访问排序，O(1) 摊还淘汰空闲 key，最多 max_keys 个。"""
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max(max_keys, 1)
+        self._tats: OrderedDict[str, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def hit(self, key: str, limit: int, now: int) -> float:
+        new_tat, retry_after = _gcra(self._tats.get(key), now, limit)
+        self._tats[key] = new_tat
+        self._tats.move_to_end(key)
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now: int) -> None:
+        tats = self._tats
+        # 队首是最久未访问的 key：已过期的无损删除；超过上限时强制淘汰
+        while tats:
+            key, tat = next(iter(tats.items()))
+            if tat > now and len(tats) <= self.max_keys:
+                break
+            del tats[key]
+
+
+class SqliteRateLimitBackend:
+    """SQLite 后端：同一台机器上的多个 uvicorn worker 通过同一个文件共享限流状态。
+
+    hit 在事件循环里同步执行：单次事务只有几十微秒，但写锁被其他 worker 占用时会等待。
+    等待上限为 BUSY_TIMEOUT_SECONDS，超时则放行本次请求（fail open），不阻塞事件循环。
+    """
+
+    PRUNE_EVERY = 1000
+    BUSY_TIMEOUT_SECONDS = 0.05
+
+    def __init__(self, path: str, max_keys: int) -> None:
+        self.max_keys = max(max_keys, 1)
+        self._conn = sqlite3.connect(
+            path, timeout=self.BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # tat 为整数纳秒（旧版 rate_limits 表存浮点秒，换表名避免混用）
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits_ns (key TEXT PRIMARY KEY, tat INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rate_limits_ns_tat ON rate_limits_ns (tat)")
+        self._hits = 0
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rate_limits_ns").fetchone()[0]
+
+    def hit(self, key: str, limit: int, now: int) -> float:
+        try:
+            return self._hit(key, limit, now)
+        except sqlite3.OperationalError as exc:
+            # database is locked：其他 worker 长时间持有写锁，放行而不是卡住所有请求
+            logger.warning("rate_limit_backend_busy", extra={"error_code": type(exc).__name__})
+            return 0.0
+
+    def _hit(self, key: str, limit: int, now: int) -> float:
+        conn = self._conn
+        # BEGIN IMMEDIATE 先拿写锁，读-改-写在多进程间保持原子
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits_ns WHERE key = ?", (key,)).fetchone()
+            new_tat, retry_after = _gcra(row[0] if row else None, now, limit)
+            if not retry_after:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits_ns (key, tat) VALUES (?, ?)", (key, new_tat)
+                )
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                self._prune(now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def _prune(self, now: int) -> None:
+        # 过期的 key 无损删除；仍超过 max_keys 时淘汰 TAT 最早（最接近空闲）的 key。
+        # 每 PRUNE_EVERY 次请求执行一次，表中最多约 max_keys + PRUNE_EVERY 行
+        conn = self._conn
+        conn.execute("DELETE FROM rate_limits_ns WHERE tat <= ?", (now,))
+        excess = len(self) - self.max_keys
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM rate_limits_ns WHERE key IN "
+                "(SELECT key FROM rate_limits_ns ORDER BY tat LIMIT ?)",
+                (excess,),
+            )
+
+
+def build_rate_limit_backend() -> MemoryRateLimitBackend | SqliteRateLimitBackend:
+    if settings.rate_limit_path:
+        return SqliteRateLimitBackend(settings.rate_limit_path, settings.rate_limit_max_keys)
+    return MemoryRateLimitBackend(settings.rate_limit_max_keys)
+
+
+class RateLimiter:
+    def __init__(
+        self, backend: MemoryRateLimitBackend | SqliteRateLimitBackend | None = None
+    ) -> None:
+        self.backend = backend if backend is not None else build_rate_limit_backend()
+
+    def hit(self, key: str, limit: int, now: float | None = None) -> float:
+        """记录一次请求；返回需要等待的秒数，0 表示放行。limit <= 0 表示不限流。"""
+        if limit <= 0:
+            return 0.0
+        now_ns = time.time_ns() if now is None else round(now * 1e9)
+        return self.backend.hit(key, limit, now_ns)
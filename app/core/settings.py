@@ -1,4 +1,6 @@
-from pydantic import AliasChoices, Field
+import math
+
+from pydantic import AliasChoices, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +8,18 @@ class Settings(BaseSettings):
     qingyun_api_url: str = "https://api.qingyuntop.top"
     qingyun_api_key: str = ""
     qingyun_model: str = "gpt-4o"
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry: float = 30.0
+    llm_http2: bool = False
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 60.0
+    llm_write_timeout: float = 10.0
+    llm_pool_timeout: float = 5.0
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: float = 300.0
+    llm_cache_max_entries: int = 512
+    llm_cache_path: str = ""
     daily_holding_cost_pct: float = 0.0007  # ~25% 年化
 
     spapi_refresh_token: str = Field(
@@ -42,15 +56,61 @@ class Settings(BaseSettings):
     api_key: str = ""
     allowed_origins: str = "http://localhost:5173"
     rate_limit_per_minute: int = 120
+    rate_limit_max_keys: int = 10000
+    rate_limit_path: str = ""
     database_url: str = Field(
         default="",
         validation_alias=AliasChoices("DATABASE_URL", "MYSQL_URL"),
     )
     db_strict: bool = True
+    # Mock 数据目录（未连接 MySQL 时读取，补货计划也写回这里），留空为仓库内的 data/
+    mock_data_dir: str = ""
+    log_async: bool = True
+    log_queue_size: int = 10000
+    log_batch_size: int = 256
+    # request_complete / tool_complete 的采样比例（1.0 为全量）
+    log_sample_rate: float = 1.0
     alert_error_rate: float = 0.2
     alert_min_requests: int = 50
+    # 延迟直方图桶上界（毫秒，逗号分隔），留空使用默认
+    metrics_latency_buckets_ms: str = ""
+    # 非空时启用多进程指标：各 worker 写入该目录下的 mmap 文件，/metrics 合并输出
+    metrics_multiproc_dir: str = ""
+    metrics_flush_seconds: float = 1.0
+    tracing_enabled: bool = True
+    trace_buffer_size: int = 200
+    # 非空时每条完成的 trace 以 OTLP JSON 追加写入该文件（一行一条）
+    trace_export_path: str = ""
+    profile_max_seconds: float = 60.0
+    stream_batch_size: int = 1000
+    tool_executor_workers: int = 8
+    vendor_cache_check_seconds: float = 5.0
+    health_refresh_seconds: float = 10.0
+    health_mysql_ttl_seconds: float = 15.0
+    health_spapi_ttl_seconds: float = 300.0
+    health_llm_ttl_seconds: float = 60.0
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
+    @field_validator("metrics_latency_buckets_ms")
+    @classmethod
+    def _check_latency_buckets(cls, value: str) -> str:
+        # 启动时给出明确的配置错误；inf 与导出时固定追加的 +Inf 桶重复，直接去掉
+        bounds = set()
+        for item in value.split(","):
+            if not item.strip():
+                continue
+            try:
+                bound = float(item)
+            except ValueError:
+                raise ValueError(f"bucket bound {item.strip()!r} is not a number") from None
+            if math.isnan(bound) or bound <= 0:
+                raise ValueError(f"bucket bound {item.strip()!r} must be a positive number")
+            if not math.isinf(bound):
+                bounds.add(bound)
+        if value.strip() and not bounds:
+            raise ValueError("needs at least one finite bucket bound")
+        return ",".join(str(bound) for bound in sorted(bounds))
+
 
 settings = Settings()
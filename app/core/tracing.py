@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from threading import Lock, Thread
+from typing import Any, TypeVar
+
+from app.core.context import current_span_ctx, request_id_ctx, trace_id_ctx
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+logger = logging.getLogger("app.tracing")
+
+MAX_PENDING_TRACES = 1000
+EXPORT_QUEUE_SIZE = 1000
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    # 本进程内的根 span（parent_id 可能来自上游 traceparent）
+    root: bool = False
+    # 所属本地根 span 的 span_id：多个请求可能带同一个上游 traceparent，
+    # 按 trace_id 归组会把它们的 span 混在一起
+    local_root_id: str = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return round((self.end_ns - self.start_ns) / 1_000_000, 3)
+
+    def as_dict(self, trace_start_ns: int) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start_ns - trace_start_ns) / 1_000_000, 3),
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            payload["error"] = self.error
+        return payload
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+def _parse_traceparent(header: str | None) -> tuple[str, str] | None:
+    # W3C traceparent: 00-<32 hex trace id>-<16 hex parent id>-<flags>
+    parts = (header or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None
+
+
+class TraceExporter:
+    """后台线程批量追加写入 OTLP JSON 文件；请求路径只入队，队列满时丢弃并计数。"""
+
+    def __init__(self, path: str, max_queue: int = EXPORT_QUEUE_SIZE) -> None:
+        self.path = path
+        self._queue: queue.Queue[list[Span] | None] = queue.Queue(maxsize=max(max_queue, 1))
+        self._thread: Thread | None = None
+        self._start_lock = Lock()
+
+    def submit(self, spans: list[Span]) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            metrics.observe_trace_dropped()
+
+    def flush(self) -> None:
+        """等待已入队的 trace 全部写出。"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # 把已排队的 trace 一次写出，减少 open/write 次数
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            traces = [spans for spans in batch if spans is not None]
+            try:
+                if traces:
+                    self._write(traces)
+            except Exception as exc:
+                logger.error("trace_export_failed", extra={"error_code": type(exc).__name__})
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _write(self, traces: list[list[Span]]) -> None:
+        lines = [
+            json.dumps(_otlp_payload(spans), ensure_ascii=False, default=str) for spans in traces
+        ]
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write("\n".join(lines) + "\n")
+
+
+class Tracer:
+    """轻量 span 记录器：span 通过 contextvars 传递父子关系（含 run_in_executor 的工作线程），
+    本地根 span 结束时整条 trace 进入最近 N 条的环形缓冲，并交给后台线程写入 OTLP JSON 文件。"""
+
+    def __init__(self, enabled: bool, buffer_size: int, export_path: str = "") -> None:
+        self.enabled = enabled
+        self.export_path = export_path
+        self._exporter = TraceExporter(export_path) if export_path else None
+        self._recent: deque[dict[str, Any]] = deque(maxlen=max(buffer_size, 1))
+        self._pending: dict[str, list[Span]] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        parent = current_span_ctx.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            # 没有父 span 时新建 trace；上游带 traceparent 则沿用其 trace id
+            upstream = _parse_traceparent(trace_id_ctx.get())
+            trace_id, parent_id = upstream if upstream else (_new_id(16), None)
+            attributes.setdefault("request_id", request_id_ctx.get())
+        span_id = _new_id(8)
+        span = Span(
+            name,
+            trace_id,
+            span_id,
+            parent_id,
+            time.time_ns(),
+            attributes=attributes,
+            root=parent is None,
+            local_root_id=parent.local_root_id if parent is not None else span_id,
+        )
+        token = current_span_ctx.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            current_span_ctx.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def traced(self, name: str | None = None) -> Callable[[F], F]:
+        """装饰器版本，支持同步与异步函数。"""
+
+        def decorator(func: F) -> F:
+            span_name = name or func.__qualname__
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper  # type: ignore[return-value]
+
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorator
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            spans = self._pending.setdefault(span.local_root_id, [])
+            spans.append(span)
+            if not span.root:
+                # 根 span 已结束后才完成的子 span（如被取消的后台任务）不会被取走，限制其数量
+                while len(self._pending) > MAX_PENDING_TRACES:
+                    del self._pending[next(iter(self._pending))]
+                return
+            del self._pending[span.local_root_id]
+            self._recent.append(_trace_dict(span, spans))
+        if self._exporter is not None:
+            self._exporter.submit(spans)
+
+    def recent(
+        self, limit: int = 20, min_duration_ms: float = 0.0, request_id: str | None = None
+    ) -> list[dict[str, Any]]:
+        with self._lock:
+            traces = list(self._recent)
+        traces.reverse()
+        if request_id:
+            traces = [trace for trace in traces if trace["request_id"] == request_id]
+        return [trace for trace in traces if trace["duration_ms"] >= min_duration_ms][:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._pending.clear()
+
+    def flush(self) -> None:
+        if self._exporter is not None:
+            self._exporter.flush()
+
+    def close(self) -> None:
+        if self._exporter is not None:
+            self._exporter.close()
+
+
+def _trace_dict(root: Span, spans: list[Span]) -> dict[str, Any]:
+    ordered = sorted(spans, key=lambda item: item.start_ns)
+    return {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "request_id": root.attributes.get("request_id"),
+        "start": datetime.fromtimestamp(root.start_ns / 1e9, UTC).isoformat(),
+        "duration_ms": root.duration_ms,
+        "spans": [span.as_dict(root.start_ns) for span in ordered],
+    }
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(spans: list[Span]) -> dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest，一行一条，可由 collector 的 file receiver 读取。"""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": "inventory-agent"}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "app.tracing"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                "parentSpanId": span.parent_id or "",
+                                "name": span.name,
+                                "kind": 1,
+                                "startTimeUnixNano": str(span.start_ns),
+                                "endTimeUnixNano": str(span.end_ns),
+                                "attributes": [
+                                    {"key": key, "value": _otlp_value(value)}
+                                    for key, value in span.attributes.items()
+                                    if value is not None
+                                ],
+                                "status": (
+                                    {"code": 2, "message": span.error}
+                                    if span.error
+                                    else {"code": 1}
+                                ),
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+tracer = Tracer(
+    enabled=settings.tracing_enabled,
+    buffer_size=settings.trace_buffer_size,
+    export_path=settings.trace_export_path,
+)
+atexit.register(tracer.close)
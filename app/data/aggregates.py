@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+
+import numpy as np
+
+from app.data.columnar import InventoryColumns
+
+# 与 stats / _urgency_level 的口径一致：按四舍五入到两位的断货天数判断
+STOCKOUT_DAYS = 7.0
+CRITICAL_DAYS = 3.0
+
+
+def _row_flags(current_stock: float, reorder_point: float, velocity: float) -> tuple[int, int, int]:
+    days = float(np.round(current_stock / velocity, 2)) if velocity > 0 else float("inf")
+    return int(days <= STOCKOUT_DAYS), int(days < CRITICAL_DAYS), int(current_stock < reorder_point)
+
+
+@dataclass(frozen=True)
+class InventoryAggregates:
+    """仪表盘统计口径的汇总值，随快照一起维护，读取为 O(1)。"""
+
+    total_skus: int = 0
+    stockout_risks: int = 0
+    critical_risks: int = 0
+    low_stock_items: int = 0
+    category_counts: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))
+
+    @classmethod
+    def from_columns(cls, columns: InventoryColumns) -> InventoryAggregates:
+        days = np.round(columns.days_of_cover, 2)
+        per_category = np.bincount(columns.category_codes, minlength=len(columns.category_labels))
+        return cls(
+            total_skus=len(columns),
+            stockout_risks=int(np.count_nonzero(days <= STOCKOUT_DAYS)),
+            critical_risks=int(np.count_nonzero(days < CRITICAL_DAYS)),
+            low_stock_items=int(np.count_nonzero(columns.current_stock < columns.reorder_point)),
+            category_counts=MappingProxyType(
+                {
+                    label: int(count)
+                    for label, count in zip(
+                        columns.category_labels, per_category.tolist(), strict=True
+                    )
+                    if count
+                }
+            ),
+        )
+
+    def with_row_change(
+        self, before: tuple[float, float, float], after: tuple[float, float, float]
+    ) -> InventoryAggregates:
+        """单行 (current_stock, reorder_point, velocity) 变化后的汇总值；类别不变。"""
+        old = _row_flags(*before)
+        new = _row_flags(*after)
+        return replace(
+            self,
+            stockout_risks=self.stockout_risks + new[0] - old[0],
+            critical_risks=self.critical_risks + new[1] - old[1],
+            low_stock_items=self.low_stock_items + new[2] - old[2],
+        )
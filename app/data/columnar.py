@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping, Sequence
+from functools import cached_property
+from typing import Any
+
+import numpy as np
+
+from app.data.pagination import ORDER_BY_SKU, Cursor
+
+_EMPTY_INDEX = np.empty(0, dtype=np.intp)
+# 依赖库存水位的缓存属性，with_levels 生成新实例时不能沿用
+_LEVEL_DERIVED = ("days_of_cover", "_cover_order", "_cover_sorted")
+_ARRAY_COLUMNS = (
+    "sku",
+    "current_stock",
+    "reorder_point",
+    "daily_sales_velocity",
+    "unit_cost",
+    "selling_price",
+    "gross_margin_pct",
+    "lead_time_days",
+    "category_codes",
+    "vendor_codes",
+)
+
+
+def _encode(values: Sequence[str]) -> tuple[np.ndarray, tuple[str, ...]]:
+    lookup: dict[str, int] = {}
+    codes = np.fromiter(
+        (lookup.setdefault(value, len(lookup)) for value in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, tuple(lookup)
+
+
+def _float_column(
+    records: Sequence[dict[str, Any]],
+    key: str,
+    default_key: str | None = None,
+    default: float = 0.0,
+) -> np.ndarray:
+    if default_key is None:
+        values = (float(record.get(key, default) or 0) for record in records)
+    else:
+        values = (
+            float(record.get(key, record.get(default_key, default)) or 0) for record in records
+        )
+    return np.fromiter(values, dtype=np.float64, count=len(records))
+
+
+def _count_column(records: Sequence[dict[str, Any]], key: str) -> np.ndarray:
+    # 库存/补货点/交期保持整数类型，输出时与原始 JSON 一致
+    values = _float_column(records, key)
+    if np.array_equal(values, np.floor(values)):
+        return values.astype(np.int64)
+    return values
+
+
+def _assign(values: np.ndarray, position: int, value: float) -> np.ndarray:
+    if values.dtype.kind == "i" and float(value) != int(value):
+        values = values.astype(np.float64)
+    values[position] = value
+    return values
+
+
+class InventoryColumns:
+    """列式库存存储：数值列为 NumPy 数组，Category/VendorID 为字典编码。
+
+    原始记录只在返回给调用方时才拷贝成 dict。实例创建后不再修改，
+    更新通过 with_levels 生成新实例；snapshot_version 标记数据来自哪个快照。
+    """
+
+    def __init__(
+        self, records: Sequence[dict[str, Any]], snapshot_version: int | None = None
+    ) -> None:
+        self.snapshot_version = snapshot_version
+        self._records = tuple(records)
+        self.sku = np.array([record["SKU"] for record in self._records], dtype=object)
+        self.current_stock = _count_column(self._records, "CurrentStock")
+        self.reorder_point = _count_column(self._records, "ReorderPoint")
+        self.daily_sales_velocity = _float_column(self._records, "DailySalesVelocity")
+        self.unit_cost = _float_column(self._records, "UnitCost")
+        self.selling_price = _float_column(self._records, "SellingPrice", "UnitCost")
+        self.gross_margin_pct = _float_column(self._records, "GrossMarginPct", default=0.35)
+        self.lead_time_days = _count_column(self._records, "LeadTimeDays")
+        self.category_codes, self.category_labels = _encode(
+            [record.get("Category", "") for record in self._records]
+        )
+        self.vendor_codes, self.vendor_labels = _encode(
+            [record.get("VendorID", "") for record in self._records]
+        )
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def take(self, indices: np.ndarray) -> InventoryColumns:
+        subset = object.__new__(InventoryColumns)
+        records = self._records
+        subset._records = tuple(records[index] for index in indices.tolist())
+        for name in _ARRAY_COLUMNS:
+            setattr(subset, name, getattr(self, name)[indices])
+        subset.category_labels = self.category_labels
+        subset.vendor_labels = self.vendor_labels
+        subset.snapshot_version = self.snapshot_version
+        return subset
+
+    @cached_property
+    def sku_positions(self) -> dict[str, int]:
+        return {value: index for index, value in enumerate(self.sku.tolist())}
+
+    def with_levels(
+        self,
+        position: int,
+        current_stock: float | None = None,
+        daily_sales_velocity: float | None = None,
+    ) -> InventoryColumns:
+        return self.with_level_changes({position: (current_stock, daily_sales_velocity)})
+
+    def with_level_changes(
+        self, changes: Mapping[int, tuple[float | None, float | None]]
+    ) -> InventoryColumns:
+        """写时复制：返回更新了若干行库存水位的新实例，未变化的列与原实例共享。
+
+        changes 为 {行号: (current_stock, daily_sales_velocity)}，None 表示该字段不变；
+        每列最多复制一次，批量更新的开销与单行相同。
+        """
+        updated = object.__new__(InventoryColumns)
+        updated.__dict__.update(
+            (name, value) for name, value in self.__dict__.items() if name not in _LEVEL_DERIVED
+        )
+        records = list(self._records)
+        current = velocity = None
+        for position, (current_stock, daily_sales_velocity) in changes.items():
+            record = dict(records[position])
+            if current_stock is not None:
+                if current is None:
+                    current = self.current_stock.copy()
+                current = _assign(current, position, current_stock)
+                record["CurrentStock"] = current_stock
+            if daily_sales_velocity is not None:
+                if velocity is None:
+                    velocity = self.daily_sales_velocity.copy()
+                velocity = _assign(velocity, position, daily_sales_velocity)
+                record["DailySalesVelocity"] = daily_sales_velocity
+            records[position] = record
+        if current is not None:
+            updated.current_stock = current
+        if velocity is not None:
+            updated.daily_sales_velocity = velocity
+        updated._records = tuple(records)
+        return updated
+
+    @cached_property
+    def days_of_cover(self) -> np.ndarray:
+        velocity = self.daily_sales_velocity
+        days = np.full(len(self), np.inf)
+        np.divide(self.current_stock, velocity, out=days, where=velocity > 0)
+        return days
+
+    @cached_property
+    def _sku_order(self) -> np.ndarray:
+        return np.argsort(self.sku, kind="stable")
+
+    @cached_property
+    def _sorted_sku(self) -> np.ndarray:
+        return self.sku[self._sku_order]
+
+    @cached_property
+    def _cover_order(self) -> np.ndarray:
+        sku_rank = np.empty(len(self), dtype=np.intp)
+        sku_rank[self._sku_order] = np.arange(len(self))
+        return np.lexsort((sku_rank, self.days_of_cover))
+
+    @cached_property
+    def _cover_sorted(self) -> tuple[np.ndarray, np.ndarray]:
+        order = self._cover_order
+        return self.days_of_cover[order], self.sku[order]
+
+    def seek(
+        self, selected: np.ndarray, order_by: str, cursor: Cursor | None, limit: int
+    ) -> np.ndarray:
+        """按 keyset 顺序返回游标之后、selected 为 True 的前 limit 行位置。"""
+        if order_by == ORDER_BY_SKU:
+            order = self._sku_order
+            start = (
+                0
+                if cursor is None
+                else int(np.searchsorted(self._sorted_sku, cursor.sku, side="right"))
+            )
+        else:
+            order = self._cover_order
+            start = 0
+            if cursor is not None:
+                days, skus = self._cover_sorted
+                low = int(np.searchsorted(days, cursor.days_of_cover, side="left"))
+                high = int(np.searchsorted(days, cursor.days_of_cover, side="right"))
+                start = low + int(np.searchsorted(skus[low:high], cursor.sku, side="right"))
+        candidates = order[start:]
+        return candidates[selected[candidates]][:limit]
+
+    @cached_property
+    def _sku_lookup(self) -> dict[str, list[int]]:
+        lookup: dict[str, list[int]] = {}
+        for index, value in enumerate(self.sku):
+            lookup.setdefault(value.lower(), []).append(index)
+        return lookup
+
+    def mask(
+        self,
+        query_type: str = "all",
+        category: str | None = None,
+        min_velocity: float | None = None,
+        max_velocity: float | None = None,
+        max_days: float | None = None,
+    ) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if query_type == "low_stock":
+            mask &= self.current_stock < self.reorder_point
+        elif query_type == "by_category" and category:
+            wanted = category.lower()
+            codes = [
+                code for code, label in enumerate(self.category_labels) if label.lower() == wanted
+            ]
+            mask &= np.isin(self.category_codes, codes)
+        elif query_type == "stockout_risk":
+            mask &= self.days_of_cover <= (7 if max_days is None else max_days)
+
+        if min_velocity is not None:
+            mask &= self.daily_sales_velocity >= float(min_velocity)
+        if max_velocity is not None:
+            mask &= self.daily_sales_velocity <= float(max_velocity)
+        return mask
+
+    def select(
+        self,
+        query_type: str = "all",
+        category: str | None = None,
+        sku: str | None = None,
+        min_velocity: float | None = None,
+        max_velocity: float | None = None,
+        max_days: float | None = None,
+    ) -> np.ndarray:
+        if query_type == "by_sku" and sku:
+            indices = np.asarray(self._sku_lookup.get(sku.lower(), ()), dtype=np.intp)
+            if indices.size == 0:
+                return _EMPTY_INDEX
+            keep = self.mask("all", None, min_velocity, max_velocity)[indices]
+            return indices[keep]
+        return np.flatnonzero(self.mask(query_type, category, min_velocity, max_velocity, max_days))
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        for record in self._records:
+            yield dict(record)
+
+    def records(self, indices: np.ndarray | None = None) -> list[dict[str, Any]]:
+        if indices is None:
+            return [dict(record) for record in self._records]
+        records = self._records
+        return [dict(records[index]) for index in indices.tolist()]
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import base64
+import json
+import math
+from dataclasses import dataclass
+
+ORDER_BY_SKU = "sku"
+ORDER_BY_DAYS_OF_COVER = "days_of_cover"
+ORDERINGS = (ORDER_BY_SKU, ORDER_BY_DAYS_OF_COVER)
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Keyset 游标：记录上一页最后一行的排序键。
+
+    days_of_cover 为 inf 表示 velocity<=0 的行（MySQL 中为 NULL），排在最后。
+    """
+
+    order_by: str
+    sku: str
+    days_of_cover: float = math.inf
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    payload: dict[str, object] = {"o": cursor.order_by, "s": cursor.sku}
+    if cursor.order_by == ORDER_BY_DAYS_OF_COVER and not math.isinf(cursor.days_of_cover):
+        payload["d"] = cursor.days_of_cover
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        order_by = payload["o"]
+        sku = payload["s"]
+        days = float(payload["d"]) if payload.get("d") is not None else math.inf
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursorError("Malformed pagination cursor") from exc
+    if order_by not in ORDERINGS or not isinstance(sku, str) or math.isnan(days):
+        raise InvalidCursorError("Malformed pagination cursor")
+    return Cursor(order_by=order_by, sku=sku, days_of_cover=days)
+
+
+def resolve_order(order_by: str | None, cursor: Cursor | None, query_type: str = "all") -> str:
+    if cursor is not None:
+        if order_by is not None and order_by != cursor.order_by:
+            raise InvalidCursorError("Cursor was issued for a different ordering")
+        return cursor.order_by
+    if order_by is None:
+        return ORDER_BY_DAYS_OF_COVER if query_type == "stockout_risk" else ORDER_BY_SKU
+    if order_by not in ORDERINGS:
+        raise InvalidCursorError(f"Unsupported ordering: {order_by}")
+    return order_by
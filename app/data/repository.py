@@ -2,25 +2,47 @@ from __future__ import annotations
 
 import json
 import logging
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import replace
 from pathlib import Path
+from threading import Lock
 from typing import Any
 
+import numpy as np
+
+from app.core.memo import invalidate_request_memo, request_memoized
+from app.core.metrics import metrics
 from app.core.settings import settings
+from app.core.tracing import tracer
+from app.data.aggregates import InventoryAggregates
+from app.data.columnar import InventoryColumns
+from app.data.pagination import Cursor, decode_cursor, encode_cursor, resolve_order
+from app.data.risk_index import StockoutRiskIndex
+from app.data.snapshot import InventorySnapshot, SnapshotStore
+from app.data.vendor_cache import VendorDimension, VendorMap
 
 logger = logging.getLogger("app.data")
 
-_DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+_DEFAULT_DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DEFAULT_PAGE_SIZE = 100
 
-_inventory_items: list[dict[str, Any]] = []
-_vendors: list[dict[str, Any]] = []
-_vendor_call_logs: list[dict[str, Any]] = []
-_replenishment_plans: list[dict[str, Any]] = []
+# Mock 数据以不可变快照发布：读者取一次 current 即得到一致视图，写入时整体替换
+_store = SnapshotStore()
+# 补货工具每次运行都会保存计划：计划不进快照版本，否则每次补货都会让 LLM/供应商/统计缓存失效
+_plans_lock = Lock()
+_replenishment_plans: tuple[dict[str, Any], ...] = ()
 
 _repo = None
+# 健康探针只读这个标记，不能为此连接数据库
+_data_loaded = False
+
+
+def _data_dir() -> Path:
+    return Path(settings.mock_data_dir) if settings.mock_data_dir else _DEFAULT_DATA_DIR
 
 
 def _load_json(filename: str) -> list[dict[str, Any]]:
-    path = _DATA_DIR / filename
+    path = _data_dir() / filename
     if not path.exists():
         return []
     return json.loads(path.read_text(encoding="utf-8"))
@@ -48,63 +70,379 @@ def _get_mysql_repo():
     return _repo
 
 
+def current_snapshot() -> InventorySnapshot:
+    return _store.current
+
+
+def get_snapshot_version() -> int:
+    return _store.current.version
+
+
+def _on_publish(snapshot: InventorySnapshot) -> None:
+    # 写入后本次调用内的备忘结果已过期
+    invalidate_request_memo()
+    metrics.set_snapshot_version(snapshot.version)
+
+
+_store.subscribe(_on_publish)
+
+
+@tracer.traced("repository.load_data")
 def load_data() -> None:
+    global _data_loaded
     repo = _get_mysql_repo()
     if repo:
-        return
-    global _inventory_items, _vendors, _vendor_call_logs, _replenishment_plans
-    _inventory_items = _load_json("mock_inventory.json")
-    _vendors = _load_json("mock_vendors.json")
-    _vendor_call_logs = _load_json("mock_vendor_call_logs.json")
-    _replenishment_plans = _load_json("mock_replenishment_plans.json")
+        _store.bump()
+        _vendor_dimension.invalidate()
+    else:
+        publish_catalog(
+            _load_json("mock_inventory.json"),
+            _load_json("mock_vendors.json"),
+            _load_json("mock_vendor_call_logs.json"),
+            _load_json("mock_replenishment_plans.json"),
+        )
+    _data_loaded = True
+
+
+def publish_catalog(
+    inventory_records: list[dict[str, Any]],
+    vendors: Sequence[dict[str, Any]],
+    vendor_call_logs: Sequence[dict[str, Any]] = (),
+    replenishment_plans: Sequence[dict[str, Any]] = (),
+) -> None:
+    """以给定记录发布一个新的 Mock 快照（load_data 与基准脚本共用）。"""
+    global _replenishment_plans
+    # 新快照在锁外构建，发布只是一次引用替换
+    inventory = InventoryColumns(inventory_records)
+    risk_index = StockoutRiskIndex.from_arrays(
+        inventory.current_stock, inventory.daily_sales_velocity
+    )
+    with _plans_lock:
+        _replenishment_plans = tuple(replenishment_plans)
+    _store.publish(
+        lambda _, version: InventorySnapshot(
+            version=version,
+            inventory=inventory,
+            risk_index=risk_index,
+            aggregates=InventoryAggregates.from_columns(inventory),
+            vendors=tuple(vendors),
+            vendors_version=version,
+            vendor_call_logs=tuple(vendor_call_logs),
+        )
+    )
+    _vendor_dimension.invalidate()
+
+
+def _select_mock(
+    snapshot: InventorySnapshot,
+    query_type: str,
+    category: str | None,
+    sku: str | None,
+    limit: int | None,
+    min_velocity: float | None,
+    max_velocity: float | None,
+    max_days: float | None,
+) -> np.ndarray:
+    columns = snapshot.inventory
+    risk_index = snapshot.risk_index
+    if query_type != "stockout_risk":
+        # Mock 数据用布尔掩码过滤
+        indices = columns.select(query_type, category, sku, min_velocity, max_velocity)
+        return indices[:limit] if limit else indices
+
+    # 断货风险走有序索引，结果按断货天数升序
+    threshold = 7.0 if max_days is None else float(max_days)
+    if min_velocity is None and max_velocity is None:
+        return np.asarray(risk_index.under(threshold, limit or None), dtype=np.intp)
+    indices = np.asarray(risk_index.under(threshold), dtype=np.intp)
+    velocity = columns.daily_sales_velocity[indices]
+    keep = np.ones(indices.size, dtype=bool)
+    if min_velocity is not None:
+        keep &= velocity >= float(min_velocity)
+    if max_velocity is not None:
+        keep &= velocity <= float(max_velocity)
+    indices = indices[keep]
+    return indices[:limit] if limit else indices
+
+
+@tracer.traced("repository.get_inventory_columns")
+@request_memoized
+def get_inventory_columns(
+    query_type: str = "all",
+    category: str | None = None,
+    sku: str | None = None,
+    limit: int | None = None,
+    min_velocity: float | None = None,
+    max_velocity: float | None = None,
+    max_days: float | None = None,
+) -> InventoryColumns:
+    snapshot = _store.current
+    repo = _get_mysql_repo()
+    if repo:
+        return InventoryColumns(
+            repo.get_inventory_items(
+                query_type, category, sku, limit, min_velocity, max_velocity, max_days
+            ),
+            snapshot_version=snapshot.version,
+        )
+    indices = _select_mock(
+        snapshot, query_type, category, sku, limit, min_velocity, max_velocity, max_days
+    )
+    return _versioned(snapshot.inventory.take(indices), snapshot)
 
 
+@tracer.traced("repository.get_inventory_items")
+@request_memoized
 def get_inventory_items(
     query_type: str = "all",
     category: str | None = None,
     sku: str | None = None,
     limit: int | None = None,
+    min_velocity: float | None = None,
+    max_velocity: float | None = None,
+    max_days: float | None = None,
 ) -> list[dict[str, Any]]:
     repo = _get_mysql_repo()
     if repo:
-        return repo.get_inventory_items(query_type, category, sku, limit)
+        return repo.get_inventory_items(
+            query_type, category, sku, limit, min_velocity, max_velocity, max_days
+        )
+    # 只为返回的行构建 dict
+    snapshot = _store.current
+    indices = _select_mock(
+        snapshot, query_type, category, sku, limit, min_velocity, max_velocity, max_days
+    )
+    return snapshot.inventory.records(indices)
 
-    # Mock 数据也需要过滤
-    items = list(_inventory_items)
 
-    if query_type == "low_stock":
-        items = [item for item in items if item["CurrentStock"] < item["ReorderPoint"]]
-    elif query_type == "by_category" and category:
-        items = [item for item in items if item["Category"].lower() == category.lower()]
-    elif query_type == "by_sku" and sku:
-        items = [item for item in items if item["SKU"].lower() == sku.lower()]
-    elif query_type == "stockout_risk":
-        items = [
-            item for item in items
-            if item.get("DailySalesVelocity", 0) > 0
-            and item["CurrentStock"] / item["DailySalesVelocity"] <= 7
-        ]
+def _versioned(columns: InventoryColumns, snapshot: InventorySnapshot) -> InventoryColumns:
+    columns.snapshot_version = snapshot.version
+    return columns
 
-    if limit:
-        items = items[:limit]
 
-    return items
+@tracer.traced("repository.get_inventory_page")
+def get_inventory_page(
+    query_type: str = "all",
+    category: str | None = None,
+    sku: str | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    order_by: str | None = None,
+    min_velocity: float | None = None,
+    max_velocity: float | None = None,
+    max_days: float | None = None,
+) -> tuple[InventoryColumns, str | None]:
+    decoded = decode_cursor(cursor) if cursor else None
+    ordering = resolve_order(order_by, decoded, query_type)
+    page_size = limit or DEFAULT_PAGE_SIZE
 
+    snapshot = _store.current
+    repo = _get_mysql_repo()
+    if repo:
+        items, next_cursor = repo.get_inventory_page(
+            query_type,
+            category,
+            sku,
+            page_size,
+            decoded,
+            ordering,
+            min_velocity,
+            max_velocity,
+            max_days,
+        )
+        columns = InventoryColumns(items, snapshot_version=snapshot.version)
+        return columns, encode_cursor(next_cursor) if next_cursor else None
 
-def get_vendors() -> list[dict[str, Any]]:
+    columns = snapshot.inventory
+    indices = _select_mock(
+        snapshot, query_type, category, sku, None, min_velocity, max_velocity, max_days
+    )
+    selected = np.zeros(len(columns), dtype=bool)
+    selected[indices] = True
+    # 多取一行判断是否还有下一页
+    picked = columns.seek(selected, ordering, decoded, page_size + 1)
+    if picked.size <= page_size:
+        return _versioned(columns.take(picked), snapshot), None
+    picked = picked[:page_size]
+    last = int(picked[-1])
+    next_cursor = Cursor(
+        order_by=ordering,
+        sku=str(columns.sku[last]),
+        days_of_cover=float(columns.days_of_cover[last]),
+    )
+    return _versioned(columns.take(picked), snapshot), encode_cursor(next_cursor)
+
+
+def iter_inventory_columns(
+    query_type: str = "all",
+    category: str | None = None,
+    sku: str | None = None,
+    limit: int | None = None,
+    min_velocity: float | None = None,
+    max_velocity: float | None = None,
+    max_days: float | None = None,
+    batch_size: int | None = None,
+) -> Iterator[InventoryColumns]:
+    batch_size = batch_size or settings.stream_batch_size
+    # 整个导出过程固定使用开始时的快照，批次之间不会看到中途的写入
+    snapshot = _store.current
+    repo = _get_mysql_repo()
+    if repo:
+        # 服务端游标（yield_per）逐批读取，内存占用与批大小相关而与表大小无关
+        for rows in repo.iter_inventory_items(
+            query_type, category, sku, limit, min_velocity, max_velocity, max_days, batch_size
+        ):
+            yield InventoryColumns(rows, snapshot_version=snapshot.version)
+        return
+
+    columns = snapshot.inventory
+    indices = _select_mock(
+        snapshot, query_type, category, sku, limit, min_velocity, max_velocity, max_days
+    )
+    for start in range(0, indices.size, batch_size):
+        yield _versioned(columns.take(indices[start:start + batch_size]), snapshot)
+
+
+@tracer.traced("repository.get_urgency_counts")
+@request_memoized
+def get_urgency_counts() -> dict[str, int]:
+    repo = _get_mysql_repo()
+    if repo:
+        return repo.get_urgency_counts()
+    snapshot = _store.current
+    counts = snapshot.risk_index.urgency_counts()
+    # velocity 为 0 的 SKU 不进索引，断货天数视为无穷大，计入 LOW
+    counts["LOW"] += len(snapshot.inventory) - len(snapshot.risk_index)
+    return counts
+
+
+def ping_database() -> dict[str, Any]:
+    """健康检查用：未配置 MySQL 时为 disabled，否则执行 SELECT 1。"""
+    if not settings.database_url:
+        return {"status": "disabled"}
+    repo = _get_mysql_repo()
+    if repo is None:
+        return {"status": "error", "message": "MySQL unavailable"}
+    repo.ping()
+    return {"status": "ok"}
+
+
+def is_data_loaded() -> bool:
+    return _data_loaded
+
+
+@tracer.traced("repository.get_inventory_stats")
+def get_inventory_stats() -> tuple[InventoryAggregates, int]:
+    """返回 (统计汇总, 快照版本)：Mock 直接读取快照上维护的汇总值，MySQL 为一次 GROUP BY。"""
+    snapshot = _store.current
+    repo = _get_mysql_repo()
+    if repo:
+        return repo.get_inventory_stats(), snapshot.version
+    return snapshot.aggregates, snapshot.version
+
+
+def _levels(columns: InventoryColumns, position: int) -> tuple[float, float, float]:
+    return (
+        float(columns.current_stock[position]),
+        float(columns.reorder_point[position]),
+        float(columns.daily_sales_velocity[position]),
+    )
+
+
+@tracer.traced("repository.update_inventory_levels")
+def update_inventory_levels(
+    sku: str,
+    current_stock: float | None = None,
+    daily_sales_velocity: float | None = None,
+) -> bool:
+    return update_inventory_levels_batch({sku: (current_stock, daily_sales_velocity)}) > 0
+
+
+@tracer.traced("repository.update_inventory_levels_batch")
+def update_inventory_levels_batch(
+    updates: Mapping[str, tuple[float | None, float | None]],
+) -> int:
+    """批量更新库存水位 {SKU: (current_stock, daily_sales_velocity)}，返回命中的 SKU 数。
+
+    Mock 模式每次发布都要复制变化的列与风险索引（O(n)），多行更新应合并为一次调用。
+    """
+    repo = _get_mysql_repo()
+    if repo:
+        updated = repo.update_inventory_levels_batch(
+            [(sku, stock, velocity) for sku, (stock, velocity) in updates.items()]
+        )
+        if updated:
+            _store.bump()
+        return updated
+
+    def build(current: InventorySnapshot, version: int) -> InventorySnapshot | None:
+        positions = current.inventory.sku_positions
+        changes = {positions[sku]: levels for sku, levels in updates.items() if sku in positions}
+        if not changes:
+            return None
+        # 写时复制：只复制变化的两列与索引，正在读旧快照的请求不受影响
+        inventory = current.inventory.with_level_changes(changes)
+        risk_index = current.risk_index.copy()
+        aggregates = current.aggregates
+        for position in changes:
+            before, after = _levels(current.inventory, position), _levels(inventory, position)
+            risk_index.update(position, after[0], after[2])
+            aggregates = aggregates.with_row_change(before, after)
+        nonlocal updated
+        updated = len(changes)
+        return replace(
+            current,
+            version=version,
+            inventory=inventory,
+            risk_index=risk_index,
+            aggregates=aggregates,
+        )
+
+    updated = 0
+    _store.publish(build)
+    return updated
+
+
+def _fetch_vendors() -> list[dict[str, Any]]:
     repo = _get_mysql_repo()
     if repo:
         return repo.get_vendors()
-    return list(_vendors)
+    return list(_store.current.vendors)
+
 
+def _fetch_vendor_version() -> Any:
+    repo = _get_mysql_repo()
+    if repo:
+        return repo.get_vendor_version()
+    return _store.current.vendors_version
 
+
+# 供应商维度很少变化：进程内缓存，按版本号（行数 + MAX(updated_at)）判断是否重新加载
+_vendor_dimension = VendorDimension(
+    _fetch_vendors, _fetch_vendor_version, settings.vendor_cache_check_seconds
+)
+
+
+@tracer.traced("repository.get_vendors")
+@request_memoized
+def get_vendors() -> list[dict[str, Any]]:
+    return _vendor_dimension.vendors()
+
+
+def get_vendor_map() -> VendorMap:
+    return _vendor_dimension.mapping()
+
+
+@tracer.traced("repository.get_vendor_call_logs")
+@request_memoized
 def get_vendor_call_logs() -> list[dict[str, Any]]:
     repo = _get_mysql_repo()
     if repo:
         return repo.get_vendor_call_logs()
-    return list(_vendor_call_logs)
+    return list(_store.current.vendor_call_logs)
 
 
+@tracer.traced("repository.get_replenishment_plans")
 def get_replenishment_plans() -> list[dict[str, Any]]:
     repo = _get_mysql_repo()
     if repo:
@@ -112,15 +450,17 @@ def get_replenishment_plans() -> list[dict[str, Any]]:
     return list(_replenishment_plans)
 
 
+@tracer.traced("repository.save_replenishment_plans")
 def save_replenishment_plans(plans: list[dict[str, Any]]) -> None:
+    global _replenishment_plans
     repo = _get_mysql_repo()
     if repo:
         repo.save_replenishment_plans(plans)
         return
-    global _replenishment_plans
-    _replenishment_plans = list(plans)
-    path = _DATA_DIR / "mock_replenishment_plans.json"
-    path.write_text(json.dumps(_replenishment_plans, indent=2), encoding="utf-8")
+    with _plans_lock:
+        _replenishment_plans = tuple(plans)
+        path = _data_dir() / "mock_replenishment_plans.json"
+        path.write_text(json.dumps(list(_replenishment_plans), indent=2), encoding="utf-8")
 
 
 def main() -> None:
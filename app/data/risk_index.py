@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterable
+
+# 紧急度上界与 _urgency_level 一致：CRITICAL <3，HIGH <=5，MEDIUM <=7
+URGENCY_BOUNDS = (
+    ("CRITICAL", 3.0, bisect_left),
+    ("HIGH", 5.0, bisect_right),
+    ("MEDIUM", 7.0, bisect_right),
+)
+
+
+def _rounded_days(entry: tuple[float, int]) -> float:
+    return round(entry[0], 2)
+
+
+class StockoutRiskIndex:
+    """按断货天数排序的有序索引，key 为库存行位置。
+
+    只收录 velocity > 0 的行；更新为 O(log n) 定位 + 有序数组插入，
+    查询 top N / 阈值内 / 紧急度分桶为 O(log n + k)。
+    """
+
+    def __init__(self, entries: Iterable[tuple[float, int]] = ()) -> None:
+        self._entries: list[tuple[float, int]] = sorted(entries)
+        self._days: dict[int, float] = {key: days for days, key in self._entries}
+
+    @classmethod
+    def from_arrays(cls, current_stock, daily_sales_velocity) -> StockoutRiskIndex:
+        entries = [
+            (stock / velocity, key)
+            for key, (stock, velocity) in enumerate(
+                zip(current_stock.tolist(), daily_sales_velocity.tolist(), strict=True)
+            )
+            if velocity > 0
+        ]
+        return cls(entries)
+
+    def copy(self) -> StockoutRiskIndex:
+        index = object.__new__(StockoutRiskIndex)
+        index._entries = list(self._entries)
+        index._days = dict(self._days)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._days
+
+    def days(self, key: int) -> float:
+        return self._days.get(key, math.inf)
+
+    def update(self, key: int, current_stock: float, daily_sales_velocity: float) -> None:
+        self.remove(key)
+        if daily_sales_velocity > 0:
+            days = current_stock / daily_sales_velocity
+            insort(self._entries, (days, key))
+            self._days[key] = days
+
+    def remove(self, key: int) -> None:
+        days = self._days.pop(key, None)
+        if days is None:
+            return
+        position = bisect_left(self._entries, (days, key))
+        del self._entries[position]
+
+    def top(self, n: int | None = None) -> list[int]:
+        entries = self._entries if n is None else self._entries[:n]
+        return [key for _, key in entries]
+
+    def under(self, max_days: float, limit: int | None = None) -> list[int]:
+        end = bisect_right(self._entries, (max_days, math.inf))
+        if limit is not None:
+            end = min(end, limit)
+        return [key for _, key in self._entries[:end]]
+
+    def count_under(self, max_days: float) -> int:
+        return bisect_right(self._entries, (max_days, math.inf))
+
+    def urgency_counts(self) -> dict[str, int]:
+        # 分桶按四舍五入后的天数计算（与对外展示的 days_until_stockout 一致）；
+        # round 单调不减，因此在有序数组上二分依然成立
+        counts: dict[str, int] = {}
+        previous = 0
+        for level, bound, search in URGENCY_BOUNDS:
+            end = search(self._entries, bound, key=_rounded_days)
+            counts[level] = end - previous
+            previous = end
+        counts["LOW"] = len(self._entries) - previous
+        return counts
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import itertools
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
+from threading import Lock
+from typing import Any
+
+from app.data.aggregates import InventoryAggregates
+from app.data.columnar import InventoryColumns
+from app.data.risk_index import StockoutRiskIndex
+
+
+@dataclass(frozen=True)
+class InventorySnapshot:
+    """不可变的数据快照；version 单调递增，可直接用作各级缓存的失效键。
+
+    MySQL 模式下数据不在内存中，快照只承载版本号。补货计划单独保存，不参与版本。
+    """
+
+    version: int
+    inventory: InventoryColumns = field(default_factory=lambda: InventoryColumns(()))
+    risk_index: StockoutRiskIndex = field(default_factory=StockoutRiskIndex)
+    aggregates: InventoryAggregates = field(default_factory=InventoryAggregates)
+    vendors: tuple[dict[str, Any], ...] = ()
+    vendors_version: int = 0
+    vendor_call_logs: tuple[dict[str, Any], ...] = ()
+
+
+class SnapshotStore:
+    """读者无锁读取当前快照；写者串行地基于当前快照构建新快照并整体替换引用。"""
+
+    def __init__(self) -> None:
+        self._versions = itertools.count(1)
+        self._write_lock = Lock()
+        self._current = InventorySnapshot(version=next(self._versions))
+        self._listeners: list[Callable[[InventorySnapshot], None]] = []
+
+    @property
+    def current(self) -> InventorySnapshot:
+        return self._current
+
+    def subscribe(self, listener: Callable[[InventorySnapshot], None]) -> None:
+        self._listeners.append(listener)
+
+    def publish(
+        self, build: Callable[[InventorySnapshot, int], InventorySnapshot | None]
+    ) -> InventorySnapshot | None:
+        """build(当前快照, 新版本号) 返回新快照；返回 None 表示无变化，此时不发布并返回 None。"""
+        with self._write_lock:
+            version = next(self._versions)
+            snapshot = build(self._current, version)
+            if snapshot is None:
+                return None
+            self._current = snapshot
+            # 持有写锁通知：并发发布时监听方（版本号 gauge、备忘失效）按版本顺序收到快照
+            for listener in self._listeners:
+                listener(snapshot)
+        return snapshot
+
+    def bump(self) -> InventorySnapshot:
+        snapshot = self.publish(lambda current, version: replace(current, version=version))
+        assert snapshot is not None
+        return snapshot
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Hashable, Iterable, Mapping, Sequence
+from threading import Lock
+from types import MappingProxyType
+from typing import Any
+
+from app.core.metrics import metrics
+
+VendorMap = Mapping[str, Mapping[str, Any]]
+
+
+def join_vendor_fields(
+    vendors: VendorMap, vendor_ids: Sequence[str], fields: Iterable[tuple[str, str, Any]]
+) -> dict[str, list[Any]]:
+    """按 vendor_ids 顺序批量取出字段：{输出列名: [值, ...]}，缺失的供应商用默认值。"""
+    rows = [vendors.get(vendor_id) or {} for vendor_id in vendor_ids]
+    return {field: [row.get(source, default) for row in rows] for field, source, default in fields}
+
+
+class VendorDimension:
+    """进程级供应商维度缓存，按 VendorID 索引。
+
+    通过 version_loader 返回的版本（MySQL 为行数 + MAX(updated_at)）判断是否需要重新加载，
+    版本检查本身每 check_interval 秒最多执行一次。版本查询与重新加载不持有读路径的锁：
+    已有快照时，其他线程在刷新期间直接使用旧快照。
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], list[dict[str, Any]]],
+        version_loader: Callable[[], Hashable],
+        check_interval: float = 5.0,
+    ) -> None:
+        self._loader = loader
+        self._version_loader = version_loader
+        self._check_interval = check_interval
+        self._lock = Lock()
+        self._refresh_lock = Lock()
+        self._generation = 0
+        self._by_id: VendorMap = MappingProxyType({})
+        self._rows: tuple[dict[str, Any], ...] = ()
+        self._version: Hashable | None = None
+        self._checked_at = 0.0
+
+    @property
+    def version(self) -> Hashable | None:
+        return self._version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+            self._generation += 1
+
+    def mapping(self) -> VendorMap:
+        """当前快照的只读视图，O(1) 按 VendorID 查找。"""
+        return self._current()
+
+    def get(self, vendor_id: str) -> Mapping[str, Any] | None:
+        return self._current().get(vendor_id)
+
+    def vendors(self) -> list[dict[str, Any]]:
+        self._current()
+        return list(self._rows)
+
+    def join(
+        self, vendor_ids: Sequence[str], fields: Iterable[tuple[str, str, Any]]
+    ) -> dict[str, list[Any]]:
+        return join_vendor_fields(self._current(), vendor_ids, fields)
+
+    def _current(self) -> VendorMap:
+        now = time.monotonic()
+        by_id, loaded = self._by_id, self._version is not None
+        if loaded and now - self._checked_at < self._check_interval:
+            metrics.observe_vendor_cache(hit=True)
+            return by_id
+        # 已有快照时不排队等待其他线程的刷新
+        if not self._refresh_lock.acquire(blocking=not loaded):
+            metrics.observe_vendor_cache(hit=True)
+            return by_id
+        try:
+            return self._refresh(now)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, now: float) -> VendorMap:
+        with self._lock:
+            generation, current = self._generation, self._version
+            if current is not None and now - self._checked_at < self._check_interval:
+                metrics.observe_vendor_cache(hit=True)
+                return self._by_id
+        version = self._version_loader()
+        if current is not None and version == current:
+            with self._lock:
+                self._checked_at = now
+            metrics.observe_vendor_cache(hit=True)
+            return self._by_id
+        rows = self._loader()
+        by_id = MappingProxyType({row["VendorID"]: row for row in rows})
+        with self._lock:
+            self._rows = tuple(rows)
+            self._by_id = by_id
+            self._checked_at = now
+            # 加载期间发生过 invalidate() 时不记录版本，下次访问重新检查
+            self._version = version if self._generation == generation else None
+        metrics.observe_vendor_cache(hit=False)
+        return by_id
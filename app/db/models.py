@@ -2,9 +2,32 @@ from __future__ import annotations
 
 from datetime import date, datetime
 
-from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy import (
+    DDL,
+    JSON,
+    Computed,
+    Date,
+    DateTime,
+    Double,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+# 生成列表达式，init_mysql 的迁移也复用这两个定义
+DAYS_OF_COVER_SQL = (
+    "CASE WHEN daily_sales_velocity > 0 THEN current_stock / daily_sales_velocity END"
+)
+STOCK_GAP_SQL = "reorder_point - current_stock"
+# create_all 不会生成 ON UPDATE 子句；MySQL 上由 DDL 补上，原生 SQL / 外部写入同样会刷新
+VENDOR_UPDATED_AT_SQL = "DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+
 
 class Base(DeclarativeBase):
     pass
@@ -20,6 +43,19 @@ class Vendor(Base):
     lead_time_days: Mapped[int] = mapped_column(Integer)
     minimum_order: Mapped[float] = mapped_column(Float)
     rating: Mapped[float] = mapped_column(Float)
+    # 供应商维度缓存据此（与行数一起）判断是否需要重新加载
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+
+event.listen(
+    Vendor.__table__,
+    "after_create",
+    DDL(f"ALTER TABLE vendors MODIFY updated_at {VENDOR_UPDATED_AT_SQL}").execute_if(
+        dialect="mysql"
+    ),
+)
 
 
 class InventoryItem(Base):
@@ -39,6 +75,18 @@ class InventoryItem(Base):
     vendor_id: Mapped[str] = mapped_column(String(32), ForeignKey("vendors.vendor_id"))
     lead_time_days: Mapped[int] = mapped_column(Integer)
     last_updated: Mapped[date | None] = mapped_column(Date, nullable=True)
+    # 持久化生成列：断货天数（velocity<=0 时为 NULL）与补货缺口，均可走二级索引
+    days_of_cover: Mapped[float | None] = mapped_column(
+        Double, Computed(DAYS_OF_COVER_SQL, persisted=True), nullable=True
+    )
+    stock_gap: Mapped[int] = mapped_column(Integer, Computed(STOCK_GAP_SQL, persisted=True))
+
+    __table_args__ = (
+        Index("ix_inventory_items_category", "category"),
+        Index("ix_inventory_items_vendor_id", "vendor_id"),
+        Index("ix_inventory_items_days_of_cover", "days_of_cover"),
+        Index("ix_inventory_items_stock_gap", "stock_gap"),
+    )
 
 
 class VendorCallLog(Base):
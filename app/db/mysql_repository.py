@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import math
+import time
+from collections.abc import Generator, Iterator, Sequence
 from contextlib import contextmanager
-from datetime import datetime
-from typing import Any, Generator
+from datetime import datetime, timedelta
+from typing import Any
 
-from sqlalchemy import create_engine, select
+from sqlalchemy import DateTime, Select, and_, case, create_engine, func, or_, select, update
 from sqlalchemy.orm import Session, sessionmaker
 
+from app.data.aggregates import CRITICAL_DAYS, STOCKOUT_DAYS, InventoryAggregates
+from app.data.pagination import ORDER_BY_SKU, Cursor
 from app.db.models import Base, InventoryItem, ReplenishmentPlan, Vendor, VendorCallLog
 
 
@@ -18,6 +23,10 @@ class MysqlRepository:
     def create_tables(self) -> None:
         Base.metadata.create_all(self.engine)
 
+    def ping(self) -> None:
+        with self.engine.connect() as conn:
+            conn.execute(select(1))
+
     @contextmanager
     def session(self) -> Generator[Session, None, None]:
         session = self.SessionLocal()
@@ -30,29 +39,51 @@ class MysqlRepository:
         finally:
             session.close()
 
+    def _inventory_query(
+        self,
+        query_type: str = "all",
+        category: str | None = None,
+        sku: str | None = None,
+        min_velocity: float | None = None,
+        max_velocity: float | None = None,
+        max_days: float | None = None,
+    ) -> Select:
+        query = select(InventoryItem)
+
+        # 按查询类型过滤
+        if query_type == "low_stock":
+            query = query.where(InventoryItem.stock_gap > 0)
+        elif query_type == "by_category" and category:
+            query = query.where(InventoryItem.category == category)
+        elif query_type == "by_sku" and sku:
+            query = query.where(InventoryItem.sku == sku)
+        elif query_type == "stockout_risk":
+            # days_of_cover 在 velocity<=0 时为 NULL，范围扫描 ix_inventory_items_days_of_cover
+            threshold = 7 if max_days is None else max_days
+            query = query.where(InventoryItem.days_of_cover <= threshold)
+
+        if min_velocity is not None:
+            query = query.where(InventoryItem.daily_sales_velocity >= float(min_velocity))
+        if max_velocity is not None:
+            query = query.where(InventoryItem.daily_sales_velocity <= float(max_velocity))
+        return query
+
     def get_inventory_items(
         self,
         query_type: str = "all",
         category: str | None = None,
         sku: str | None = None,
         limit: int | None = None,
+        min_velocity: float | None = None,
+        max_velocity: float | None = None,
+        max_days: float | None = None,
     ) -> list[dict[str, Any]]:
         with self.session() as session:
-            query = select(InventoryItem)
-
-            # 按查询类型过滤
-            if query_type == "low_stock":
-                query = query.where(InventoryItem.current_stock < InventoryItem.reorder_point)
-            elif query_type == "by_category" and category:
-                query = query.where(InventoryItem.category == category)
-            elif query_type == "by_sku" and sku:
-                query = query.where(InventoryItem.sku == sku)
-            elif query_type == "stockout_risk":
-                # 只查询有销售速度且库存较低的商品
-                query = query.where(
-                    InventoryItem.daily_sales_velocity > 0,
-                    InventoryItem.current_stock / InventoryItem.daily_sales_velocity <= 7
-                )
+            query = self._inventory_query(
+                query_type, category, sku, min_velocity, max_velocity, max_days
+            )
+            if query_type == "stockout_risk":
+                query = query.order_by(InventoryItem.days_of_cover, InventoryItem.sku)
 
             # 限制返回数量
             if limit:
@@ -61,11 +92,169 @@ class MysqlRepository:
             items = session.execute(query).scalars().all()
             return [_item_to_dict(item) for item in items]
 
+    def iter_inventory_items(
+        self,
+        query_type: str = "all",
+        category: str | None = None,
+        sku: str | None = None,
+        limit: int | None = None,
+        min_velocity: float | None = None,
+        max_velocity: float | None = None,
+        max_days: float | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[list[dict[str, Any]]]:
+        query = self._inventory_query(
+            query_type, category, sku, min_velocity, max_velocity, max_days
+        )
+        if query_type == "stockout_risk":
+            query = query.order_by(InventoryItem.days_of_cover, InventoryItem.sku)
+        if limit:
+            query = query.limit(limit)
+        with self.session() as session:
+            result = session.execute(query.execution_options(yield_per=batch_size))
+            # identity map 为弱引用，每批转换成 dict 后 ORM 对象即可回收
+            for partition in result.scalars().partitions():
+                yield [_item_to_dict(item) for item in partition]
+
+    def get_inventory_page(
+        self,
+        query_type: str,
+        category: str | None,
+        sku: str | None,
+        limit: int,
+        cursor: Cursor | None,
+        order_by: str,
+        min_velocity: float | None = None,
+        max_velocity: float | None = None,
+        max_days: float | None = None,
+    ) -> tuple[list[dict[str, Any]], Cursor | None]:
+        base = self._inventory_query(
+            query_type, category, sku, min_velocity, max_velocity, max_days
+        )
+        fetch = limit + 1
+        with self.session() as session:
+            if order_by == ORDER_BY_SKU:
+                query = base if cursor is None else base.where(InventoryItem.sku > cursor.sku)
+                query = query.order_by(InventoryItem.sku).limit(fetch)
+                rows = list(session.execute(query).scalars())
+            else:
+                # 先按 (days_of_cover, sku) 走索引，NULL（无销量）的行排在最后再按 sku 续翻
+                rows = []
+                days = InventoryItem.days_of_cover
+                if cursor is None or not math.isinf(cursor.days_of_cover):
+                    query = base.where(days.is_not(None))
+                    if cursor is not None:
+                        query = query.where(
+                            days >= cursor.days_of_cover,
+                            or_(days > cursor.days_of_cover, InventoryItem.sku > cursor.sku),
+                        )
+                    query = query.order_by(days, InventoryItem.sku).limit(fetch)
+                    rows = list(session.execute(query).scalars())
+                if len(rows) < fetch and query_type != "stockout_risk":
+                    query = base.where(days.is_(None))
+                    if cursor is not None and math.isinf(cursor.days_of_cover):
+                        query = query.where(InventoryItem.sku > cursor.sku)
+                    query = query.order_by(InventoryItem.sku).limit(fetch - len(rows))
+                    rows.extend(session.execute(query).scalars())
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = Cursor(
+                    order_by=order_by,
+                    sku=last.sku,
+                    days_of_cover=math.inf if last.days_of_cover is None else last.days_of_cover,
+                )
+            return [_item_to_dict(item) for item in rows], next_cursor
+
+    def get_urgency_counts(self) -> dict[str, int]:
+        days = func.round(InventoryItem.days_of_cover, 2)
+        query = select(
+            func.count(),
+            func.sum(case((days < 3, 1), else_=0)),
+            func.sum(case((and_(days >= 3, days <= 5), 1), else_=0)),
+            func.sum(case((and_(days > 5, days <= 7), 1), else_=0)),
+        )
+        with self.session() as session:
+            total, critical, high, medium = session.execute(query).one()
+        critical, high, medium = int(critical or 0), int(high or 0), int(medium or 0)
+        return {
+            "CRITICAL": critical,
+            "HIGH": high,
+            "MEDIUM": medium,
+            "LOW": int(total or 0) - critical - high - medium,
+        }
+
+    def get_inventory_stats(self) -> InventoryAggregates:
+        # 单次 GROUP BY 得到全部统计口径，不加载行
+        days = func.round(InventoryItem.days_of_cover, 2)
+        query = select(
+            InventoryItem.category,
+            func.count(),
+            func.sum(case((days <= STOCKOUT_DAYS, 1), else_=0)),
+            func.sum(case((days < CRITICAL_DAYS, 1), else_=0)),
+            func.sum(case((InventoryItem.stock_gap > 0, 1), else_=0)),
+        ).group_by(InventoryItem.category)
+        with self.session() as session:
+            rows = session.execute(query).all()
+        return InventoryAggregates(
+            total_skus=sum(int(row[1]) for row in rows),
+            stockout_risks=sum(int(row[2] or 0) for row in rows),
+            critical_risks=sum(int(row[3] or 0) for row in rows),
+            low_stock_items=sum(int(row[4] or 0) for row in rows),
+            category_counts={row[0]: int(row[1]) for row in rows},
+        )
+
+    def update_inventory_levels(
+        self,
+        sku: str,
+        current_stock: float | None = None,
+        daily_sales_velocity: float | None = None,
+    ) -> bool:
+        return self.update_inventory_levels_batch([(sku, current_stock, daily_sales_velocity)]) > 0
+
+    def update_inventory_levels_batch(
+        self, updates: Sequence[tuple[str, float | None, float | None]]
+    ) -> int:
+        """同一事务内更新多行库存水位，返回命中的行数。"""
+        found = 0
+        with self.session() as session:
+            for sku, current_stock, daily_sales_velocity in updates:
+                values: dict[str, Any] = {}
+                if current_stock is not None:
+                    values["current_stock"] = current_stock
+                if daily_sales_velocity is not None:
+                    values["daily_sales_velocity"] = daily_sales_velocity
+                if not values:
+                    exists = session.get(InventoryItem, sku) is not None
+                else:
+                    result = session.execute(
+                        update(InventoryItem).where(InventoryItem.sku == sku).values(**values)
+                    )
+                    exists = result.rowcount > 0
+                found += exists
+        return found
+
     def get_vendors(self) -> list[dict[str, Any]]:
         with self.session() as session:
             vendors = session.execute(select(Vendor)).scalars().all()
             return [_vendor_to_dict(vendor) for vendor in vendors]
 
+    def get_vendor_version(self) -> tuple[Any, ...]:
+        with self.session() as session:
+            count, last_updated, db_now = session.execute(
+                select(
+                    func.count(), func.max(Vendor.updated_at), func.now(type_=DateTime)
+                ).select_from(Vendor)
+            ).one()
+        version = (int(count), last_updated.isoformat() if last_updated else "")
+        # DATETIME 只精确到秒：与 NOW() 同一秒内之后的修改不会改变 MAX(updated_at)。
+        # 最近一秒内有修改时返回一次性的版本，下一次检查必然重新加载
+        if last_updated and db_now - last_updated <= timedelta(seconds=1):
+            return (*version, time.monotonic_ns())
+        return version
+
     def get_vendor_call_logs(self) -> list[dict[str, Any]]:
         with self.session() as session:
             logs = session.execute(select(VendorCallLog)).scalars().all()
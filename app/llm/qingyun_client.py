@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
+from collections.abc import AsyncIterator
+from threading import Lock
 from typing import Any
 
 import httpx
@@ -10,14 +14,125 @@ from app.core.metrics import metrics
 
 logger = logging.getLogger("app.llm")
 
+# 正在关闭的旧 AsyncClient，持有引用以免任务被回收
+_closing: set[asyncio.Task] = set()
+
+
+def _http2_enabled() -> bool:
+    if not settings.llm_http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:  # pragma: no cover - optional dependency
+        logger.warning("qingyun_http2_unavailable", extra={"error_code": "H2_NOT_INSTALLED"})
+        return False
+    return True
+
+
+def _client_options() -> dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(
+            connect=settings.llm_connect_timeout,
+            read=settings.llm_read_timeout,
+            write=settings.llm_write_timeout,
+            pool=settings.llm_pool_timeout,
+        ),
+        "limits": httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        ),
+        "http2": _http2_enabled(),
+    }
+
+
+def _discard_async_client(
+    client: httpx.AsyncClient, owner: asyncio.AbstractEventLoop | None
+) -> None:
+    # 连接绑定在创建它的循环上：旧循环仍在运行时交回旧循环关闭；
+    # 已关闭时传输层无法再调度，只能尽力释放，剩余 socket 由 GC 回收
+    if owner is not None and owner.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), owner)
+        return
+    task = asyncio.get_running_loop().create_task(_aclose_quietly(client))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+async def _aclose_quietly(client: httpx.AsyncClient) -> None:
+    try:
+        await client.aclose()
+    except RuntimeError as exc:
+        logger.warning(
+            "qingyun_stale_client_close_failed", extra={"error_code": type(exc).__name__}
+        )
+
+
+class _ConnectionTrace:
+    """通过 httpcore trace 扩展判断本次请求是否新建了 TCP 连接。"""
+
+    def __init__(self) -> None:
+        self.new_connection = False
+
+    def __call__(self, event_name: str, info: dict[str, Any]) -> None:
+        if event_name.startswith("connection.connect_tcp"):
+            self.new_connection = True
+
+    async def atrace(self, event_name: str, info: dict[str, Any]) -> None:
+        self(event_name, info)
+
+    def record(self) -> None:
+        metrics.observe_llm_connection(reused=not self.new_connection)
+
 
 class QingyunChatClient:
     def __init__(self) -> None:
         self.api_url = settings.qingyun_api_url.rstrip("/")
         self.api_key = settings.qingyun_api_key
         self.model = settings.qingyun_model
+        # 长连接池：同步/异步各一个，进程内复用，避免每次请求重新握手
+        self._client: httpx.Client | None = None
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+        self._lock = Lock()
 
-    def chat(self, messages: list[dict[str, str]], temperature: float = 0.2) -> str:
+    def _sync_client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(**_client_options())
+        return self._client
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # AsyncClient 的连接池绑定事件循环，循环变化时（如测试）重建
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            stale, owner = self._async_client, self._async_loop
+            self._async_client = httpx.AsyncClient(**_client_options())
+            self._async_loop = loop
+            if stale is not None:
+                _discard_async_client(stale, owner)
+        return self._async_client
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose_async_client(self) -> None:
+        """关闭当前循环上的 AsyncClient；在循环结束前调用（如 asyncio.run 的同步入口）。"""
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def aclose(self) -> None:
+        await self.aclose_async_client()
+        self.close()
+
+    def _prepare(
+        self, messages: list[dict[str, str]], temperature: float
+    ) -> tuple[str, dict[str, Any], dict[str, str]]:
         if not self.api_key:
             metrics.observe_llm(success=False)
             raise RuntimeError("Qingyun API key missing")
@@ -29,28 +144,104 @@ class QingyunChatClient:
         }
         headers = {"Authorization": f"Bearer {self.api_key}"}
         url = f"{self.api_url}/v1/chat/completions"
+        return url, payload, headers
 
+    def chat(self, messages: list[dict[str, str]], temperature: float = 0.2) -> str:
+        url, payload, headers = self._prepare(messages, temperature)
+        trace = _ConnectionTrace()
         try:
-            with httpx.Client(timeout=60) as client:  # 增加到 60 秒
-                response = client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                data: dict[str, Any] = response.json()
-        except httpx.TimeoutException as exc:
-            logger.error("qingyun_timeout", extra={"timeout": 60})
-            metrics.observe_llm(success=False)
-            raise RuntimeError(f"Qingyun request timeout after 60s") from exc
-        except httpx.HTTPStatusError as exc:
-            logger.error("qingyun_http_error", extra={"status": exc.response.status_code})
-            metrics.observe_llm(success=False)
-            raise RuntimeError(f"Qingyun HTTP error: {exc.response.status_code}") from exc
-        except Exception as exc:  # pragma: no cover - network dependent
-            logger.error("qingyun_request_failed", extra={"error_code": type(exc).__name__})
-            metrics.observe_llm(success=False)
-            raise RuntimeError(f"Qingyun request failed: {exc}") from exc
+            response = self._sync_client().post(
+                url, json=payload, headers=headers, extensions={"trace": trace}
+            )
+            trace.record()
+            response.raise_for_status()
+            data: dict[str, Any] = response.json()
+        except Exception as exc:
+            _raise_request_error(exc)
+        return _parse_content(data)
 
+    async def achat(self, messages: list[dict[str, str]], temperature: float = 0.2) -> str:
+        url, payload, headers = self._prepare(messages, temperature)
+        trace = _ConnectionTrace()
         try:
-            metrics.observe_llm(success=True)
-            return data["choices"][0]["message"]["content"].strip()
+            response = await self._get_async_client().post(
+                url, json=payload, headers=headers, extensions={"trace": trace.atrace}
+            )
+            trace.record()
+            response.raise_for_status()
+            data: dict[str, Any] = response.json()
         except Exception as exc:
-            metrics.observe_llm(success=False)
-            raise RuntimeError("Qingyun response parsing failed") from exc
+            _raise_request_error(exc)
+        return _parse_content(data)
+
+    def ping(self) -> dict[str, Any]:
+        """可达性检查：GET /v1/models，不产生补全费用。"""
+        if not self.api_key:
+            return {"status": "disabled", "message": "Qingyun API key missing"}
+        response = self._sync_client().get(
+            f"{self.api_url}/v1/models", headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+        response.raise_for_status()
+        return {"status": "ok"}
+
+    async def astream(
+        self, messages: list[dict[str, str]], temperature: float = 0.2
+    ) -> AsyncIterator[str]:
+        """stream=true 模式，逐段产出增量文本（SSE 的 delta.content）。"""
+        url, payload, headers = self._prepare(messages, temperature)
+        trace = _ConnectionTrace()
+        try:
+            async with self._get_async_client().stream(
+                "POST",
+                url,
+                json={**payload, "stream": True},
+                headers=headers,
+                extensions={"trace": trace.atrace},
+            ) as response:
+                trace.record()
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    delta = _parse_stream_line(line)
+                    if delta:
+                        yield delta
+        except Exception as exc:
+            _raise_request_error(exc)
+        metrics.observe_llm(success=True)
+
+
+def _parse_stream_line(line: str) -> str | None:
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:") :].strip()
+    if not data or data == "[DONE]":
+        return None
+    try:
+        choice = json.loads(data)["choices"][0]
+    except (ValueError, KeyError, IndexError, TypeError) as exc:
+        raise RuntimeError("Qingyun stream parsing failed") from exc
+    return (choice.get("delta") or {}).get("content")
+
+
+def _raise_request_error(exc: Exception) -> None:
+    metrics.observe_llm(success=False)
+    if isinstance(exc, RuntimeError):
+        raise exc
+    if isinstance(exc, httpx.TimeoutException):
+        logger.error("qingyun_timeout", extra={"error_code": type(exc).__name__})
+        raise RuntimeError(f"Qingyun request timeout ({type(exc).__name__})") from exc
+    if isinstance(exc, httpx.HTTPStatusError):
+        logger.error("qingyun_http_error", extra={"status": exc.response.status_code})
+        raise RuntimeError(f"Qingyun HTTP error: {exc.response.status_code}") from exc
+    logger.error(
+        "qingyun_request_failed", extra={"error_code": type(exc).__name__}
+    )  # pragma: no cover
+    raise RuntimeError(f"Qingyun request failed: {exc}") from exc
+
+
+def _parse_content(data: dict[str, Any]) -> str:
+    try:
+        metrics.observe_llm(success=True)
+        return data["choices"][0]["message"]["content"].strip()
+    except Exception as exc:
+        metrics.observe_llm(success=False)
+        raise RuntimeError("Qingyun response parsing failed") from exc
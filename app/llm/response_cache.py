@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from app.core.metrics import metrics
+from app.core.settings import settings
+
+
+def normalize_input(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def response_cache_key(
+    agent_id: str, messages: list[dict[str, str]], tool_summary: str, tool_json: str
+) -> str:
+    # 回复只取决于输入与工具结果：以完整（未截断的）工具输出 JSON 的摘要作为数据指纹，
+    # 不用进程内的快照版本号，磁盘层跨重启、多 worker 以及其他写入者修改 MySQL 后
+    # 都不会命中过期回复。发给 LLM 的是整段会话历史，键也覆盖全部消息：
+    # 相同的追问不会命中其他会话的回复
+    fingerprint = hashlib.sha256(tool_json.encode("utf-8")).hexdigest()
+    history = [[m.get("role", ""), normalize_input(m.get("content", ""))] for m in messages]
+    raw = json.dumps([agent_id, history, tool_summary, fingerprint], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LLM 回复缓存：内存 LRU + TTL，可选 SQLite 磁盘层（进程重启后仍可命中）。"""
+
+    def __init__(
+        self, max_entries: int, ttl_seconds: float, path: str = "", enabled: bool = True
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled and max_entries > 0 and ttl_seconds > 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = Lock()
+        self._disk: sqlite3.Connection | None = None
+        if self.enabled and path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                entry = self._disk_get(key, now)
+                if entry is not None:
+                    self._store(key, entry)
+            else:
+                self._entries.move_to_end(key)
+        metrics.observe_llm_cache(hit=entry is not None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: str, response: str) -> None:
+        if not self.enabled:
+            return
+        entry = (time.time() + self.ttl_seconds, response)
+        with self._lock:
+            self._store(key, entry)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, response, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, entry[1], entry[0]),
+                )
+                self._disk.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_responses")
+                self._disk.commit()
+
+    def _store(self, key: str, entry: tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> tuple[float, str] | None:
+        if self._disk is None:
+            return None
+        row = self._disk.execute(
+            "SELECT expires_at, response FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] <= now:
+            self._disk.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._disk.commit()
+            return None
+        return float(row[0]), row[1]
+
+
+response_cache = ResponseCache(
+    max_entries=settings.llm_cache_max_entries,
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+    path=settings.llm_cache_path,
+    enabled=settings.llm_cache_enabled,
+)
@@ -14,6 +14,7 @@ from app.core.middleware import (
     LoggingMiddleware,
     RateLimitMiddleware,
     RequestIdMiddleware,
+    TracingMiddleware,
 )
 from app.core.settings import settings
 
@@ -21,6 +22,7 @@ configure_logging()
 app = FastAPI(title="Multi-Agent AI Inventory Management System", version="0.1.0")
 app.logger = logging.getLogger("app")
 
+app.add_middleware(TracingMiddleware)
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(RateLimitMiddleware)
 app.add_middleware(ApiKeyMiddleware)
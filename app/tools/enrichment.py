@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+
+from app.core.tracing import tracer
+from app.data.columnar import InventoryColumns
+from app.data.vendor_cache import VendorMap, join_vendor_fields
+
+_URGENCY_CHOICES = np.array(["CRITICAL", "HIGH", "MEDIUM", "LOW"], dtype=object)
+_VENDOR_FIELDS = (
+    ("vendor_name", "Name", ""),
+    ("vendor_phone", "PhoneNumber", ""),
+    ("vendor_email", "Email", ""),
+    ("vendor_lead_time_days", "LeadTimeDays", 0),
+)
+
+
+def _raw_days_until_stockout(columns: InventoryColumns) -> np.ndarray:
+    velocity = columns.daily_sales_velocity
+    days = np.full(len(columns), np.inf)
+    np.divide(columns.current_stock, velocity, out=days, where=velocity > 0)
+    return days
+
+
+def _rounded(values: np.ndarray) -> list[float]:
+    # 物化时用内置 round，保证与逐行实现的输出逐位一致
+    return [round(value, 2) for value in values.tolist()]
+
+
+def urgency_levels(days: np.ndarray) -> np.ndarray:
+    # 与 _urgency_level 的分档边界保持一致：<3 / <=5 / <=7 / 其他
+    return np.select(
+        [days < 3, days <= 5, days <= 7],
+        _URGENCY_CHOICES[:3],
+        default=_URGENCY_CHOICES[3],
+    )
+
+
+@tracer.traced("vendor.join")
+def _vendor_columns(columns: InventoryColumns, vendors: VendorMap) -> dict[str, np.ndarray]:
+    # 供应商维度按字典编码 join：每个 VendorID 只查一次，再按 code 广播到行
+    per_label = join_vendor_fields(vendors, columns.vendor_labels, _VENDOR_FIELDS)
+    return {
+        field: np.array(values, dtype=object)[columns.vendor_codes]
+        for field, values in per_label.items()
+    }
+
+
+class EnrichedInventory:
+    """批量计算后的库存结果，行 dict 只在序列化时构建。"""
+
+    def __init__(self, columns: InventoryColumns, vendors: VendorMap) -> None:
+        self.columns = columns
+        self._raw_days = _raw_days_until_stockout(columns)
+        self.days_until_stockout = np.round(self._raw_days, 2)
+        self.urgency_level = urgency_levels(self.days_until_stockout)
+        self.shortage_amount = np.maximum(columns.reorder_point - columns.current_stock, 0)
+        self._raw_revenue = self.shortage_amount * columns.selling_price * columns.gross_margin_pct
+        self.revenue_at_risk = np.round(self._raw_revenue, 2)
+        self.vendor_columns = _vendor_columns(columns, vendors)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        fields = {
+            "days_until_stockout": _rounded(self._raw_days),
+            "urgency_level": self.urgency_level.tolist(),
+            "shortage_amount": self.shortage_amount.tolist(),
+            **{name: values.tolist() for name, values in self.vendor_columns.items()},
+            "revenue_at_risk": _rounded(self._raw_revenue),
+        }
+        names = tuple(fields)
+        rows = zip(*fields.values(), strict=True)
+        for record, values in zip(self.columns.iter_records(), rows, strict=True):
+            record.update(zip(names, values, strict=True))
+            yield record
+
+    def records(self) -> list[dict[str, Any]]:
+        return list(self.iter_records())
+
+
+def enrich_inventory(columns: InventoryColumns, vendors: VendorMap) -> EnrichedInventory:
+    return EnrichedInventory(columns, vendors)
@@ -9,24 +9,32 @@ if __name__ == "__main__" and __package__ is None:
 import logging
 import time
 import math
+from collections.abc import Iterator
 from datetime import datetime, timezone, timedelta
 from typing import Any
 
 from app.core.context import tool_ctx
+from app.core.memo import request_memoized
 from app.core.metrics import metrics
+from app.core.tracing import tracer
 from app.data.repository import (
-    get_inventory_items,
+    get_inventory_columns,
+    get_inventory_page,
+    get_vendor_map,
     get_vendors,
+    iter_inventory_columns,
     load_data,
     save_replenishment_plans,
 )
 from app.core.settings import settings
+from app.data.vendor_cache import VendorMap
+from app.tools.enrichment import EnrichedInventory, enrich_inventory
 
 logger = logging.getLogger("app.tools")
 
 
-def _vendor_map() -> dict[str, dict[str, Any]]:
-    return {vendor["VendorID"]: vendor for vendor in get_vendors()}
+def _vendor_map() -> VendorMap:
+    return get_vendor_map()
 
 
 def _days_until_stockout(item: dict[str, Any]) -> float:
@@ -46,6 +54,40 @@ def _urgency_level(days_until_stockout: float) -> str:
     return "LOW"
 
 
+def inventory_query_batch(
+    query_type: str = "all",
+    category: str | None = None,
+    sku: str | None = None,
+    limit: int | None = None,
+    min_velocity: float | None = None,
+    max_velocity: float | None = None,
+    max_days: float | None = None,
+) -> EnrichedInventory:
+    columns = get_inventory_columns(
+        query_type, category, sku, limit, min_velocity, max_velocity, max_days
+    )
+    return enrich_inventory(columns, _vendor_map())
+
+
+def iter_inventory_query(
+    query_type: str = "all",
+    category: str | None = None,
+    sku: str | None = None,
+    limit: int | None = None,
+    min_velocity: float | None = None,
+    max_velocity: float | None = None,
+    max_days: float | None = None,
+) -> Iterator[EnrichedInventory]:
+    # 流式导出：逐批读取、逐批向量化计算，供应商维度只加载一次
+    vendors = _vendor_map()
+    for columns in iter_inventory_columns(
+        query_type, category, sku, limit, min_velocity, max_velocity, max_days
+    ):
+        yield enrich_inventory(columns, vendors)
+
+
+@tracer.traced("tool.inventory_query")
+@request_memoized
 def inventory_query_tool(
     query_type: str = "all",
     category: str | None = None,
@@ -53,40 +95,25 @@ def inventory_query_tool(
     limit: int | None = None,
     min_velocity: float | None = None,
     max_velocity: float | None = None,
+    max_days: float | None = None,
+    cursor: str | None = None,
+    order_by: str | None = None,
 ) -> dict[str, Any]:
     token = tool_ctx.set("inventory_query_tool")
     start = time.perf_counter()
-    vendors = _vendor_map()
-
-    # 直接从数据库层获取过滤后的数据
-    items = get_inventory_items(query_type, category, sku, limit)
 
-    if min_velocity is not None:
-        items = [i for i in items if float(i.get("DailySalesVelocity", 0) or 0) >= float(min_velocity)]
-    if max_velocity is not None:
-        items = [i for i in items if float(i.get("DailySalesVelocity", 0) or 0) <= float(max_velocity)]
-
-    enriched: list[dict[str, Any]] = []
-    for item in items:
-        days_until = _days_until_stockout(item)
-        vendor = vendors.get(item["VendorID"], {})
-        shortage = max(0, item["ReorderPoint"] - item["CurrentStock"])
-        selling_price = float(item.get("SellingPrice", item.get("UnitCost", 0)))
-        margin_pct = float(item.get("GrossMarginPct", 0.35))
-        revenue_at_risk = round(shortage * selling_price * margin_pct, 2)
-        enriched.append(
-            {
-                **item,
-                "days_until_stockout": days_until,
-                "urgency_level": _urgency_level(days_until),
-                "shortage_amount": shortage,
-                "vendor_name": vendor.get("Name", ""),
-                "vendor_phone": vendor.get("PhoneNumber", ""),
-                "vendor_email": vendor.get("Email", ""),
-                "vendor_lead_time_days": vendor.get("LeadTimeDays", 0),
-                "revenue_at_risk": revenue_at_risk,
-            }
+    # 直接从数据库层获取过滤后的数据，整批向量化计算风险字段
+    next_cursor = None
+    if cursor is None and order_by is None:
+        batch = inventory_query_batch(
+            query_type, category, sku, limit, min_velocity, max_velocity, max_days
+        )
+    else:
+        columns, next_cursor = get_inventory_page(
+            query_type, category, sku, limit, cursor, order_by, min_velocity, max_velocity, max_days
         )
+        batch = enrich_inventory(columns, _vendor_map())
+    enriched = batch.records()
 
     duration = (time.perf_counter() - start) * 1000
     logger.info(
@@ -95,9 +122,17 @@ def inventory_query_tool(
     )
     metrics.observe_tool("inventory_query_tool", round(duration, 2))
     tool_ctx.reset(token)
-    return {"count": len(enriched), "items": enriched}
+    result: dict[str, Any] = {
+        "count": len(enriched),
+        "items": enriched,
+        "snapshot_version": batch.columns.snapshot_version,
+    }
+    if cursor is not None or order_by is not None:
+        result["next_cursor"] = next_cursor
+    return result
 
 
+@tracer.traced("tool.inventory_replenishment")
 def inventory_replenishment_tool(
     safety_days: int = 14,
     target_days: int | None = None,
@@ -108,7 +143,8 @@ def inventory_replenishment_tool(
     vendors = _vendor_map()
     if target_days is not None:
         safety_days = target_days
-    base_items = inventory_query_tool(query_type="low_stock")["items"]
+    low_stock = inventory_query_tool(query_type="low_stock")
+    base_items = low_stock["items"]
     items = base_items
     if skus:
         sku_set = {s.lower() for s in skus}
@@ -165,6 +201,7 @@ def inventory_replenishment_tool(
 
     replenishment_plan = {
         "created_at": datetime.now(timezone.utc).isoformat(),
+        "snapshot_version": low_stock["snapshot_version"],
         "total_cost": round(total_cost, 2),
         "target_safety_days": safety_days,
         "vendor_groups": list(vendor_groups.values()),
@@ -185,6 +222,8 @@ def inventory_replenishment_tool(
     return replenishment_plan
 
 
+@tracer.traced("tool.inventory_vendor_info")
+@request_memoized
 def inventory_vendor_info_tool(vendor_id: str | None = None) -> dict[str, Any]:
     token = tool_ctx.set("inventory_vendor_info_tool")
     start = time.perf_counter()
@@ -204,6 +243,8 @@ def inventory_vendor_info_tool(vendor_id: str | None = None) -> dict[str, Any]:
     return result
 
 
+@tracer.traced("tool.inventory_markdown")
+@request_memoized
 def inventory_markdown_calculator(
     sku: str | None = None,
     min_age_days: float | None = None,
@@ -211,11 +252,10 @@ def inventory_markdown_calculator(
 ) -> dict[str, Any]:
     token = tool_ctx.set("inventory_markdown_calculator")
     start = time.perf_counter()
-    items = get_inventory_items()
-    if sku:
-        items = [item for item in items if item["SKU"].lower() == sku.lower()]
-    if max_velocity is not None:
-        items = [item for item in items if float(item.get("DailySalesVelocity", 0) or 0) <= max_velocity]
+    columns = get_inventory_columns(
+        query_type="by_sku" if sku else "all", sku=sku, max_velocity=max_velocity
+    )
+    items = columns.records()
 
     results: list[dict[str, Any]] = []
     for item in items:
@@ -284,7 +324,7 @@ def inventory_markdown_calculator(
     )
     metrics.observe_tool("inventory_markdown_calculator", round(duration, 2))
     tool_ctx.reset(token)
-    return {"count": len(results), "items": results}
+    return {"count": len(results), "items": results, "snapshot_version": columns.snapshot_version}
 
 
 def main() -> None:
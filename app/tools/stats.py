@@ -8,24 +8,25 @@ if __name__ == "__main__" and __package__ is None:
 
 from typing import Any
 
-from app.data.repository import load_data
-from app.tools.inventory_tools import inventory_query_tool
+from app.data.repository import get_inventory_stats, load_data
 
 
 def stats_calculator() -> dict[str, Any]:
-    all_items = inventory_query_tool(query_type="all")["items"]
-    stockout_risks = [item for item in all_items if item["days_until_stockout"] <= 7]
-    critical_risks = [item for item in stockout_risks if item["days_until_stockout"] < 3]
-    low_stock_items = [item for item in all_items if item["CurrentStock"] < item["ReorderPoint"]]
-    categories = sorted({item["Category"] for item in all_items})
+    # 汇总值随快照增量维护（MySQL 为一次 GROUP BY），不再逐行富化
+    aggregates, snapshot_version = get_inventory_stats()
+    categories = sorted(aggregates.category_counts)
 
     return {
-        "total_skus": len(all_items),
-        "stockout_risks": len(stockout_risks),
-        "critical_risks": len(critical_risks),
-        "low_stock_items": len(low_stock_items),
+        "total_skus": aggregates.total_skus,
+        "stockout_risks": aggregates.stockout_risks,
+        "critical_risks": aggregates.critical_risks,
+        "low_stock_items": aggregates.low_stock_items,
         "total_categories": len(categories),
         "categories": categories,
+        "category_counts": {
+            category: aggregates.category_counts[category] for category in categories
+        },
+        "snapshot_version": snapshot_version,
     }
 
 
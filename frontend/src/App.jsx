@@ -1,5 +1,11 @@
 import { useEffect, useMemo, useState } from "react";
-import { fetchAgents, fetchStats, fetchRisks, fetchInventory, invokeAgent } from "./api/client.js";
+import {
+  fetchAgents,
+  fetchStats,
+  fetchRisks,
+  fetchInventoryPage,
+  invokeAgentStream
+} from "./api/client.js";
 import StatCard from "./components/StatCard.jsx";
 import RiskTable from "./components/RiskTable.jsx";
 import InventoryTable from "./components/InventoryTable.jsx";
@@ -22,6 +28,7 @@ export default function App() {
   const [activeAgent, setActiveAgent] = useState("stockout_sentinel");
   const [risks, setRisks] = useState([]);
   const [inventoryItems, setInventoryItems] = useState([]);
+  const [inventoryCursor, setInventoryCursor] = useState(null);
   const [messages, setMessages] = useState([]);
   const [loading, setLoading] = useState(false);
   const [sessionId] = useState(crypto.randomUUID());
@@ -63,11 +70,24 @@ export default function App() {
 
   const loadInventory = async () => {
     try {
-      const items = await fetchInventory("all", 100);
+      const { items, nextCursor } = await fetchInventoryPage("all", 100);
       setInventoryItems(items);
+      setInventoryCursor(nextCursor);
     } catch (error) {
       console.error("加载库存数据失败:", error);
       setInventoryItems([]);
+      setInventoryCursor(null);
+    }
+  };
+
+  const loadMoreInventory = async () => {
+    if (!inventoryCursor) return;
+    try {
+      const { items, nextCursor } = await fetchInventoryPage("all", 100, inventoryCursor);
+      setInventoryItems((prev) => [...prev, ...items]);
+      setInventoryCursor(nextCursor);
+    } catch (error) {
+      console.error("加载更多库存数据失败:", error);
     }
   };
 
@@ -85,18 +105,38 @@ export default function App() {
     setMessages((prev) => [...prev, { role: "user", content: text }]);
     setLoading(true);
     try {
-      const response = await invokeAgent({
-        agent: targetAgent,
-        input: text,
-        session_id: sessionId,
-        parameters: options.parameters
-      });
+      let streamed = "";
+      const response = await invokeAgentStream(
+        {
+          agent: targetAgent,
+          input: text,
+          session_id: sessionId,
+          parameters: options.parameters
+        },
+        (event, data) => {
+          if (event === "tool" && targetAgent === "stockout_sentinel") {
+            const riskList = data?.structured_output?.risks || [];
+            if (riskList.length) setRisks(riskList);
+          }
+          if (event === "token") {
+            // 首个 token 到达即展示回复，后续增量追加
+            const first = !streamed;
+            streamed += data.text;
+            setLoading(false);
+            setMessages((prev) =>
+              first
+                ? [...prev, { role: "assistant", content: streamed }]
+                : [...prev.slice(0, -1), { role: "assistant", content: streamed }]
+            );
+          }
+        }
+      );
       const reply = response?.response?.text || "没有返回内容";
-      setMessages((prev) => [...prev, { role: "assistant", content: reply }]);
-      if (targetAgent === "stockout_sentinel") {
-        const riskList = response?.response?.structured_output?.risks || [];
-        if (riskList.length) setRisks(riskList);
-      }
+      setMessages((prev) =>
+        streamed
+          ? [...prev.slice(0, -1), { role: "assistant", content: reply }]
+          : [...prev, { role: "assistant", content: reply }]
+      );
     } catch (error) {
       setMessages((prev) => [
         ...prev,
@@ -178,7 +218,12 @@ export default function App() {
       </section>
 
       <section className="main-grid full">
-        <InventoryTable items={inventoryItems} categories={stats.categories} />
+        <InventoryTable
+          items={inventoryItems}
+          categories={stats.categories}
+          hasMore={Boolean(inventoryCursor)}
+          onLoadMore={loadMoreInventory}
+        />
       </section>
     </div>
   );
@@ -33,7 +33,52 @@ export async function fetchInventory(queryType = "all", limit = 100) {
   return data.items || [];
 }
 
+export async function fetchInventoryPage(queryType = "all", limit = 100, cursor = null) {
+  const { data } = await api.get("/data/inventory", {
+    params: { query_type: queryType, limit, ...(cursor ? { cursor } : {}) }
+  });
+  return { items: data.items || [], nextCursor: data.next_cursor || null };
+}
+
 export async function invokeAgent(payload) {
   const { data } = await api.post("/agents/invoke", payload);
   return data;
 }
+
+// SSE 流式调用：依次回调 tool / token / done / error 事件
+export async function invokeAgentStream(payload, onEvent) {
+  const response = await fetch(`${baseURL}/agents/invoke/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+      ...(apiKey ? { "x-api-key": apiKey } : {})
+    },
+    body: JSON.stringify(payload)
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`stream request failed: ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = block.match(/^event: (.*)$/m)?.[1];
+      const data = block.match(/^data: (.*)$/m)?.[1];
+      if (!event || data === undefined) continue;
+      const parsed = JSON.parse(data);
+      if (event === "error") throw new Error(parsed.detail);
+      if (event === "done") result = parsed;
+      onEvent(event, parsed);
+    }
+  }
+  return result;
+}
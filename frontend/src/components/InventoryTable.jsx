@@ -1,6 +1,6 @@
 import { useMemo, useState } from "react";
 
-export default function InventoryTable({ items, categories }) {
+export default function InventoryTable({ items, categories, hasMore = false, onLoadMore }) {
   const [search, setSearch] = useState("");
   const [category, setCategory] = useState("全部");
   const [vendor, setVendor] = useState("全部");
@@ -158,6 +158,11 @@ export default function InventoryTable({ items, categories }) {
           >
             下一页
           </button>
+          {hasMore && onLoadMore && (
+            <button className="ghost" onClick={onLoadMore}>
+              加载更多
+            </button>
+          )}
         </div>
       </div>
       <div className="table table-wide">
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.core import middleware  # noqa: E402
+from app.core.logging import configure_logging  # noqa: E402
+from app.core.settings import settings  # noqa: E402
+
+_devnull = open(os.devnull, "w")  # noqa: SIM115 - 进程内一直使用
+
+
+def _silence_logs() -> None:
+    # 按当前 LOG_* 配置完整格式化，只是写到 /dev/null，保证测到的是真实开销
+    configure_logging(_devnull)
+
+
+def _load_middleware(ref: str) -> types.ModuleType:
+    """从 git 引用加载 app/core/middleware.py，用于在同一进程内复现改动前的基线。"""
+    source = subprocess.run(
+        ["git", "show", f"{ref}:app/core/middleware.py"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    module = types.ModuleType(f"bench_middleware_{ref}")
+    module.__file__ = f"{ref}:app/core/middleware.py"
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def _ping_app(stack: types.ModuleType | None) -> FastAPI:
+    app = FastAPI()
+    app.logger = logging.getLogger("app")
+
+    @app.get("/ping")
+    async def ping() -> dict[str, str]:
+        return {"status": "ok"}
+
+    if stack is not None:
+        # 与 app/main.py 相同的挂载顺序
+        app.add_middleware(stack.LoggingMiddleware)
+        app.add_middleware(stack.RateLimitMiddleware)
+        app.add_middleware(stack.ApiKeyMiddleware)
+        app.add_middleware(stack.RequestIdMiddleware)
+    return app
+
+
+async def _measure(app, path: str, requests: int, warmup: int) -> list[float]:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"x-api-key": settings.api_key} if settings.api_key else {}
+    samples: list[float] = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for index in range(warmup + requests):
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise SystemExit(f"{path} returned {response.status_code}")
+            if index >= warmup:
+                samples.append(elapsed * 1_000_000)
+    return samples
+
+
+def _report(label: str, samples: list[float]) -> float:
+    samples.sort()
+    median = statistics.median(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<24} median={median:8.1f}us  p95={p95:8.1f}us")
+    return median
+
+
+async def run(requests: int, warmup: int, path: str | None, baseline_ref: str | None) -> None:
+    _silence_logs()
+    # 限流保持开启（走完整计数路径）但不会触发 429
+    settings.rate_limit_per_minute = 10**9
+
+    bare = _report(
+        "ping (no middleware)", await _measure(_ping_app(None), "/ping", requests, warmup)
+    )
+    stack = _report(
+        "ping (middleware stack)", await _measure(_ping_app(middleware), "/ping", requests, warmup)
+    )
+    print(f"{'middleware overhead':<24} {stack - bare:8.1f}us/request")
+
+    if baseline_ref:
+        baseline_app = _ping_app(_load_middleware(baseline_ref))
+        baseline = _report(
+            f"ping ({baseline_ref})", await _measure(baseline_app, "/ping", requests, warmup)
+        )
+        print(f"{'baseline overhead':<24} {baseline - bare:8.1f}us/request")
+
+    if path:
+        from app.data.repository import load_data
+        from app.main import app
+
+        _silence_logs()
+        load_data()
+        _report(f"app {path}", await _measure(app, path, requests, warmup))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Per-request overhead of the HTTP middleware stack"
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument(
+        "--path", default="/data/risks", help="also time this path on the full app ('' to skip)"
+    )
+    parser.add_argument(
+        "--baseline-ref",
+        help="also time app/core/middleware.py as of this git ref (e.g. the BaseHTTPMiddleware "
+        "stack before the pure ASGI rewrite)",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.warmup, args.path or None, args.baseline_ref))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_mock_data import _make_inventory, _make_vendors  # noqa: E402
+
+from app.agents.graph import _render_exceptions  # noqa: E402
+from app.core.logging import configure_logging  # noqa: E402
+from app.core.settings import settings  # noqa: E402
+from app.data import repository  # noqa: E402
+from app.tools.inventory_tools import (  # noqa: E402
+    inventory_markdown_calculator,
+    inventory_query_tool,
+    inventory_replenishment_tool,
+)
+from app.tools.stats import stats_calculator  # noqa: E402
+
+DEFAULT_SIZES = "1000,100000,1000000"
+# 对比基线时参与判定的指标：耗时看 p50（p99 在笔记本上噪声太大），内存看峰值
+GATED_METRICS = ("p50_ms", "peak_kb")
+
+
+def _build_catalog(size: int, seed: int) -> list[dict[str, Any]]:
+    # 固定种子，同一规模每次生成完全相同的目录
+    random.seed(seed)
+    vendors = _make_vendors(max(8, size // 5000))
+    repository.publish_catalog(_make_inventory(size, vendors), vendors)
+    return inventory_query_tool(query_type="all")["items"]
+
+
+def _cases(items: list[dict[str, Any]]) -> dict[str, Callable[[], Any]]:
+    return {
+        "inventory_query_tool[all,limit=100]": lambda: inventory_query_tool(
+            query_type="all", limit=100
+        ),
+        "inventory_query_tool[stockout_risk]": lambda: inventory_query_tool(
+            query_type="stockout_risk"
+        ),
+        "inventory_replenishment_tool": lambda: inventory_replenishment_tool(),
+        "inventory_markdown_calculator": lambda: inventory_markdown_calculator(),
+        "_render_exceptions": lambda: _render_exceptions(items),
+        "stats_calculator": stats_calculator,
+    }
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    # nearest-rank
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _time_case(
+    func: Callable[[], Any], min_time: float, min_iterations: int, max_iterations: int
+) -> dict[str, Any]:
+    func()  # 预热：首次调用会构建供应商维度等惰性缓存
+    samples: list[float] = []
+    started = time.perf_counter()
+    while len(samples) < max_iterations and (
+        len(samples) < min_iterations or time.perf_counter() - started < min_time
+    ):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    total = sum(samples)
+    return {
+        "iterations": len(samples),
+        "ops_per_sec": round(len(samples) / total, 2) if total else None,
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+    }
+
+
+def _peak_memory_kb(func: Callable[[], Any]) -> float:
+    # tracemalloc 会拖慢执行，单独跑一次，只统计本次调用期间新增的峰值
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    selected = set(args.cases.split(",")) if args.cases else None
+    results: dict[str, dict[str, Any]] = {}
+    for size in (int(value) for value in args.sizes.split(",")):
+        start = time.perf_counter()
+        items = _build_catalog(size, args.seed)
+        print(f"catalog {size} SKUs built in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        for name, func in _cases(items).items():
+            if selected and name not in selected:
+                continue
+            result = _time_case(func, args.min_time, args.min_iterations, args.max_iterations)
+            if not args.no_memory:
+                result["peak_kb"] = _peak_memory_kb(func)
+            key = f"{name}@{size}"
+            results[key] = result
+            _print_row(key, result)
+        del items
+        gc.collect()
+    return {
+        "created": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def _print_row(key: str, result: dict[str, Any]) -> None:
+    peak = f"{result['peak_kb'] / 1024:9.1f}MiB" if "peak_kb" in result else ""
+    print(
+        f"{key:<52} {result['ops_per_sec']:>10.2f} ops/s  "
+        f"p50={result['p50_ms']:>10.3f}ms  p99={result['p99_ms']:>10.3f}ms  {peak}"
+    )
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """返回超过阈值的回归描述；基线中没有的用例不参与判定。"""
+    regressions = []
+    for key, result in current["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            continue
+        for metric in GATED_METRICS:
+            before, after = previous.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            if change > threshold:
+                regressions.append(f"{key} {metric}: {before} -> {after} (+{change:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-process benchmark of the inventory tools")
+    parser.add_argument(
+        "--sizes", default=DEFAULT_SIZES, help="comma separated catalog sizes (SKUs)"
+    )
+    parser.add_argument("--cases", default="", help="comma separated case names (default: all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per case")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=1000)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc peak memory pass"
+    )
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file and fail on regression")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown ratio (0.2 = +20%%)"
+    )
+    args = parser.parse_args()
+
+    # 日志后台线程在进程退出前一直使用这个句柄
+    configure_logging(open(os.devnull, "w"))  # noqa: SIM115
+    with tempfile.TemporaryDirectory() as data_dir:
+        # 补货工具会写回补货计划文件，指向临时目录以免改动仓库里的 data/
+        settings.mock_data_dir = data_dir
+        current = run(args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            raise SystemExit(1)
+        print(f"no regressions above {args.threshold:.0%} against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,21 @@ from __future__ import annotations
 
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 # 将项目根目录添加到 Python 路径
 project_root = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(project_root))
 
 from app.core.settings import settings
+from app.db.models import (  # noqa: E402
+    DAYS_OF_COVER_SQL,
+    STOCK_GAP_SQL,
+    VENDOR_UPDATED_AT_SQL,
+)
+
+if TYPE_CHECKING:
+    from app.db.mysql_repository import MysqlRepository
 
 
 def main() -> None:
@@ -18,6 +27,7 @@ def main() -> None:
     repo = MysqlRepository(settings.database_url)
     repo.create_tables()
     _migrate_columns(repo)
+    _migrate_indexes(repo)
     print("mysql tables created")
 
 
@@ -38,12 +48,44 @@ def _migrate_columns(repo: MysqlRepository) -> None:
         alters.append("ADD COLUMN holding_cost_pct DOUBLE NULL")
     if "substitute_skus" not in columns:
         alters.append("ADD COLUMN substitute_skus JSON NULL")
+    if "days_of_cover" not in columns:
+        alters.append(
+            f"ADD COLUMN days_of_cover DOUBLE GENERATED ALWAYS AS ({DAYS_OF_COVER_SQL}) STORED"
+        )
+    if "stock_gap" not in columns:
+        alters.append(
+            f"ADD COLUMN stock_gap INT GENERATED ALWAYS AS ({STOCK_GAP_SQL}) STORED NOT NULL"
+        )
+
+    if alters:
+        alter_sql = "ALTER TABLE inventory_items " + ", ".join(alters)
+        with engine.begin() as conn:
+            conn.execute(text(alter_sql))
+
+    vendor_columns = {col["name"] for col in inspector.get_columns("vendors")}
+    if "updated_at" not in vendor_columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE vendors ADD COLUMN updated_at {VENDOR_UPDATED_AT_SQL}"))
+
 
-    if not alters:
+def _migrate_indexes(repo: MysqlRepository) -> None:
+    from sqlalchemy import inspect
+
+    from app.db.models import InventoryItem
+
+    engine = repo.engine
+    inspector = inspect(engine)
+    if "inventory_items" not in inspector.get_table_names():
         return
-    alter_sql = "ALTER TABLE inventory_items " + ", ".join(alters)
+    # 按列判断而不是按名字：外键自动建的 vendor_id 索引同样可用
+    existing = {tuple(index["column_names"]) for index in inspector.get_indexes("inventory_items")}
+    existing_names = {index["name"] for index in inspector.get_indexes("inventory_items")}
     with engine.begin() as conn:
-        conn.execute(text(alter_sql))
+        for index in InventoryItem.__table__.indexes:
+            columns = tuple(column.name for column in index.columns)
+            if columns in existing or index.name in existing_names:
+                continue
+            index.create(conn)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+# 对 /agents/invoke（每个 Agent）、/data/risks、/data/inventory、/agents/stats 的加权混合压测。
+#   开环：--rate 固定到达率，延迟从“计划发送时刻”算起，服务变慢时不会少发请求（无协调遗漏）
+#   闭环：--concurrency 个 worker 串行发送；给出 --rate 时按 wrk2 方式节拍发送，
+#         否则可用 --expected-interval-ms 按 HdrHistogram 的方式补录被遗漏的样本
+AGENT_INPUTS = {
+    "stockout_sentinel": "未来 7 天有哪些 SKU 会断货？",
+    "replenishment_planner": "生成本周补货计划",
+    "exception_investigator": "检查库存数据异常",
+    "markdown_clearance_coach": "哪些滞销商品需要清仓？",
+    "inventory_copilot": "给我一份库存概况",
+}
+DEFAULT_MIX = "invoke=4,risks=3,inventory=2,stats=1"
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图（毫秒，相对误差约 1%），可按次数记录以补录协调遗漏的样本。"""
+
+    RATIO = 1.01
+    FLOOR_MS = 0.001
+
+    def __init__(self) -> None:
+        self.counts: Counter[int] = Counter()
+        self.total = 0
+        self.max_ms = 0.0
+
+    def record(self, value_ms: float, count: int = 1) -> None:
+        index = math.floor(math.log(max(value_ms, self.FLOOR_MS) / self.FLOOR_MS, self.RATIO))
+        self.counts[index] += count
+        self.total += count
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def record_corrected(self, value_ms: float, expected_interval_ms: float) -> None:
+        # 一个耗时 L 的请求期间本应再发出 L/E 个请求，它们的延迟依次为 L-E、L-2E ...
+        self.record(value_ms)
+        if expected_interval_ms <= 0:
+            return
+        missing = value_ms - expected_interval_ms
+        while missing >= expected_interval_ms:
+            self.record(missing)
+            missing -= expected_interval_ms
+
+    def _upper(self, index: int) -> float:
+        return self.FLOOR_MS * self.RATIO ** (index + 1)
+
+    def percentile(self, pct: float) -> float:
+        if not self.total:
+            return 0.0
+        target = max(1, math.ceil(pct / 100 * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper(index), self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict[str, float]:
+        values = {f"p{pct:g}": round(self.percentile(pct), 2) for pct in PERCENTILES}
+        values["max"] = round(self.max_ms, 2)
+        return values
+
+    def buckets(self) -> list[list[float]]:
+        return [[round(self._upper(index), 3), self.counts[index]] for index in sorted(self.counts)]
+
+
+@dataclass
+class EndpointStats:
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    corrected: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: Counter[str] = field(default_factory=Counter)
+    count: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+
+    def record(
+        self, status: str, service_ms: float, corrected_ms: float, expected_interval_ms: float
+    ) -> None:
+        self.count += 1
+        self.statuses[status] += 1
+        if status == "429":
+            self.rate_limited += 1
+        elif not status.startswith("2"):
+            self.errors += 1
+        self.latency.record(service_ms)
+        self.corrected.record_corrected(corrected_ms, expected_interval_ms)
+
+    def as_dict(self, elapsed: float) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "rps": round(self.count / elapsed, 2) if elapsed else 0.0,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "statuses": dict(self.statuses),
+            "latency_ms": self.latency.summary(),
+            "corrected_ms": self.corrected.summary(),
+            "histogram_ms": self.corrected.buckets(),
+        }
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for part in filter(None, (item.strip() for item in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in {"invoke", "risks", "inventory", "stats"}:
+            raise SystemExit(f"unknown endpoint in --mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def build_targets(mix: dict[str, float], agents: list[str]) -> dict[str, float]:
+    """endpoint 标签 -> 权重；invoke 的权重平均分给每个 Agent，各自单独统计。"""
+    targets: dict[str, float] = {}
+    for name, weight in mix.items():
+        if name == "invoke":
+            for agent in agents:
+                targets[f"POST /agents/invoke[{agent}]"] = weight / len(agents)
+        elif name == "risks":
+            targets["GET /data/risks"] = weight
+        elif name == "inventory":
+            targets["GET /data/inventory"] = weight
+        elif name == "stats":
+            targets["GET /agents/stats"] = weight
+    return {label: weight for label, weight in targets.items() if weight > 0}
+
+
+class LoadTest:
+    def __init__(
+        self, client: httpx.AsyncClient, targets: dict[str, float], args: argparse.Namespace
+    ) -> None:
+        self.client = client
+        self.labels = list(targets)
+        self.weights = list(targets.values())
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.stats: dict[str, EndpointStats] = {label: EndpointStats() for label in self.labels}
+        self.seq = 0
+        self.max_lag_ms = 0.0
+
+    def _request(self, label: str, seq: int) -> tuple[str, str, dict[str, Any] | None]:
+        method, _, path = label.partition(" ")
+        if not path.startswith("/agents/invoke"):
+            query = {"GET /data/risks": "?limit=50", "GET /data/inventory": "?limit=100"}.get(
+                label, ""
+            )
+            return method, path + query, None
+        agent = path[path.index("[") + 1 : -1]
+        text = AGENT_INPUTS[agent]
+        if self.args.vary_input:
+            # 每次输入不同，绕过 LLM 响应缓存，测的是完整的 LLM 路径
+            text = f"{text} #{seq}"
+        body = {"agent": agent, "input": text, "session_id": f"load-{seq % self.args.sessions}"}
+        return method, "/agents/invoke", body
+
+    async def fire(self, intended: float, expected_interval_ms: float = 0.0) -> None:
+        seq = self.seq
+        self.seq += 1
+        label = self.rng.choices(self.labels, self.weights)[0]
+        method, path, body = self._request(label, seq)
+        sent = time.perf_counter()
+        self.max_lag_ms = max(self.max_lag_ms, (sent - intended) * 1000)
+        try:
+            response = await self.client.request(method, path, json=body)
+            status = str(response.status_code)
+        except httpx.HTTPError as exc:
+            status = type(exc).__name__
+        done = time.perf_counter()
+        self.stats[label].record(
+            status, (done - sent) * 1000, (done - intended) * 1000, expected_interval_ms
+        )
+
+    async def run_open(self, rate: float, duration: float) -> None:
+        in_flight = asyncio.Semaphore(self.args.max_in_flight)
+        tasks: set[asyncio.Task] = set()
+
+        def _done(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            in_flight.release()
+
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # 在途请求已满时调度会落后；延迟仍从 next_at 起算，落后的时间计入结果
+            await in_flight.acquire()
+            task = asyncio.create_task(self.fire(next_at))
+            tasks.add(task)
+            task.add_done_callback(_done)
+            next_at += self.rng.expovariate(rate) if self.args.poisson else 1 / rate
+        await asyncio.gather(*tasks)
+
+    async def run_closed(self, concurrency: int, duration: float, rate: float | None) -> None:
+        start = time.perf_counter()
+        deadline = start + duration
+        interval = concurrency / rate if rate else 0.0
+        expected_ms = 0.0 if rate else self.args.expected_interval_ms
+
+        async def worker(offset: float) -> None:
+            next_at = start + offset
+            while time.perf_counter() < deadline and (
+                not self.args.requests or self.seq < self.args.requests
+            ):
+                if interval:
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    intended, next_at = next_at, next_at + interval
+                else:
+                    intended = time.perf_counter()
+                await self.fire(intended, expected_ms)
+                if self.args.think_ms:
+                    await asyncio.sleep(self.args.think_ms / 1000)
+
+        await asyncio.gather(
+            *(worker(index * interval / concurrency) for index in range(concurrency))
+        )
+
+
+def _print_report(test: LoadTest, elapsed: float, corrected: bool) -> None:
+    kind = "corrected" if corrected else "service"
+    print(
+        f"\nelapsed={elapsed:.1f}s requests={test.seq} rps={test.seq / elapsed:.1f} "
+        f"max_send_lag={test.max_lag_ms:.1f}ms"
+    )
+    header = f"{'endpoint':<48} {'count':>7} {'err':>5} {'429':>5}"
+    header += "".join(f" {'p' + format(pct, 'g'):>9}" for pct in PERCENTILES) + f" {'max':>9}"
+    print(f"latency ms ({kind}; service time in parentheses for p99)")
+    print(header)
+    for label, stats in test.stats.items():
+        if not stats.count:
+            continue
+        histogram = stats.corrected if corrected else stats.latency
+        row = f"{label:<48} {stats.count:>7} {stats.errors:>5} {stats.rate_limited:>5}"
+        row += "".join(f" {histogram.percentile(pct):>9.1f}" for pct in PERCENTILES)
+        row += f" {histogram.max_ms:>9.1f}  ({stats.latency.percentile(99):.1f})"
+        print(row)
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    agents = args.agents.split(",") if args.agents else list(AGENT_INPUTS)
+    targets = build_targets(parse_mix(args.mix), agents)
+    headers = {"accept": "application/json"}
+    if args.api_key:
+        headers["x-api-key"] = args.api_key
+    connections = args.max_in_flight if args.mode == "open" else args.concurrency
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, headers=headers, timeout=args.timeout, limits=limits
+    ) as client:
+        test = LoadTest(client, targets, args)
+        start = time.perf_counter()
+        if args.mode == "open":
+            await test.run_open(args.rate, args.duration)
+        else:
+            await test.run_closed(args.concurrency, args.duration, args.rate)
+        elapsed = time.perf_counter() - start
+
+    corrected = args.mode == "open" or bool(args.rate) or args.expected_interval_ms > 0
+    _print_report(test, elapsed, corrected)
+    if not corrected:
+        print(
+            "closed loop without --rate/--expected-interval-ms: "
+            "percentiles are not corrected for coordinated omission"
+        )
+    return {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in {"api_key", "output"}
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": test.seq,
+        "max_send_lag_ms": round(test.max_lag_ms, 2),
+        "co_corrected": corrected,
+        "endpoints": {
+            label: stats.as_dict(elapsed) for label, stats in test.stats.items() if stats.count
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP load generator for the inventory agent API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    parser.add_argument("--mode", choices=("open", "closed"), default="open")
+    parser.add_argument(
+        "--rate", type=float, help="requests/sec (required for open loop; paces closed loop)"
+    )
+    parser.add_argument(
+        "--poisson", action="store_true", help="exponential inter-arrival times in open loop"
+    )
+    parser.add_argument("--concurrency", type=int, default=25, help="closed-loop workers")
+    parser.add_argument(
+        "--max-in-flight", type=int, default=1000, help="open-loop cap on outstanding requests"
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument(
+        "--requests", type=int, default=0, help="closed loop: stop after this many requests"
+    )
+    parser.add_argument(
+        "--think-ms", type=float, default=0.0, help="closed loop: pause between requests"
+    )
+    parser.add_argument(
+        "--expected-interval-ms",
+        type=float,
+        default=0.0,
+        help="closed loop without --rate: back-fill samples for coordinated omission",
+    )
+    parser.add_argument(
+        "--mix", default=DEFAULT_MIX, help="weights, e.g. invoke=4,risks=3,inventory=2,stats=1"
+    )
+    parser.add_argument(
+        "--agents", default="", help="comma separated agents for invoke (default: all)"
+    )
+    parser.add_argument(
+        "--vary-input",
+        action="store_true",
+        help="unique agent input per request (no LLM cache hits)",
+    )
+    parser.add_argument("--sessions", type=int, default=50, help="number of distinct session ids")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report (with histograms) to this file")
+    args = parser.parse_args()
+    if args.mode == "open" and not args.rate:
+        parser.error("--rate is required in open-loop mode")
+
+    report = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 本地 OpenAI Chat Completions 兼容桩服务，用于离线压测整条链路：
+#   python scripts/stub_llm_server.py --port 9100 --latency-ms 400
+#   QINGYUN_API_URL=http://127.0.0.1:9100 QINGYUN_API_KEY=stub uvicorn app.main:app
+REPLY = "库存整体可控：优先处理紧急断货风险 SKU，按供应商合并补货订单，并对滞销商品安排阶梯折扣。"
+
+
+def _delay(args: argparse.Namespace) -> float:
+    jitter = random.uniform(-args.jitter_ms, args.jitter_ms) if args.jitter_ms else 0.0
+    return max(args.latency_ms + jitter, 0.0) / 1000
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    return [text[index : index + size] for index in range(0, len(text), size)]
+
+
+def build_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="stub-llm")
+    stats = {"requests": 0, "errors": 0}
+
+    @app.get("/v1/models")
+    async def models() -> dict[str, Any]:
+        return {
+            "object": "list",
+            "data": [{"id": args.model, "object": "model", "owned_by": "stub"}],
+        }
+
+    @app.get("/stats")
+    async def get_stats() -> dict[str, int]:
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if args.error_rate and random.random() < args.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(_delay(args) / 2)
+            return JSONResponse({"error": {"message": "stub injected error"}}, status_code=500)
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model") or args.model
+        if not body.get("stream"):
+            await asyncio.sleep(_delay(args))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": REPLY},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": len(REPLY),
+                    "total_tokens": len(REPLY),
+                },
+            }
+
+        async def events() -> AsyncIterator[str]:
+            # 首 token 前等待 latency，之后按 token_delay 逐段输出
+            await asyncio.sleep(_delay(args))
+            for piece in _chunks(REPLY, args.chunk_chars):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                if args.token_delay_ms:
+                    await asyncio.sleep(args.token_delay_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible chat completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="time to first byte")
+    parser.add_argument(
+        "--jitter-ms", type=float, default=100.0, help="uniform +/- jitter on latency"
+    )
+    parser.add_argument(
+        "--token-delay-ms", type=float, default=20.0, help="delay between stream chunks"
+    )
+    parser.add_argument("--chunk-chars", type=int, default=8)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of requests answered with 500"
+    )
+    args = parser.parse_args()
+
+    uvicorn.run(build_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
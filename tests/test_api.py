@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.data.repository import load_data, update_inventory_levels
+from app.llm.response_cache import response_cache
+from app.main import app
+
+client = TestClient(app)
+
+
+def setup_module() -> None:
+    load_data()
+
+
+def setup_function() -> None:
+    response_cache.clear()
+
+
+def test_inventory_pages_follow_next_cursor() -> None:
+    first = client.get("/data/inventory", params={"limit": 20}).json()
+    assert first["count"] == 20
+    second = client.get(
+        "/data/inventory", params={"limit": 20, "cursor": first["next_cursor"]}
+    ).json()
+    assert second["next_cursor"] is None
+    skus = [item["SKU"] for item in first["items"] + second["items"]]
+    assert skus == sorted(set(skus))
+    assert len(skus) == 30
+
+
+def test_inventory_rejects_malformed_cursor() -> None:
+    response = client.get("/data/inventory", params={"cursor": "bogus"})
+    assert response.status_code == 400
+
+
+def test_inventory_streams_ndjson() -> None:
+    response = client.get("/data/inventory", headers={"accept": "application/x-ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 30
+    assert "urgency_level" in rows[0]
+
+
+def test_risks_stream_matches_json() -> None:
+    payload = client.get("/data/risks").json()
+    streamed = client.get("/data/risks", params={"stream": "true"}).text.splitlines()
+    assert [json.loads(line) for line in streamed] == payload["risks"]
+
+
+def test_forced_tool_invocation_skips_llm() -> None:
+    response = client.post(
+        "/agents/invoke",
+        json={
+            "agent": "inventory_copilot",
+            "input": "low stock",
+            "parameters": {"tool": "inventory_query", "args": {"query_type": "low_stock"}},
+        },
+    )
+    body = response.json()
+    assert response.status_code == 200
+    assert body["response"]["structured_output"]["tool"] == "inventory_query"
+
+
+async def test_concurrent_invocations_do_not_block_event_loop(monkeypatch) -> None:
+    from app.agents import graph as agent_graph
+
+    async def slow_chat(messages, temperature=0.2):
+        await asyncio.sleep(0.2)
+        return "ok"
+
+    monkeypatch.setattr(agent_graph._llm, "achat", slow_chat)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+        payload = {"agent": "stockout_sentinel", "input": "risks"}
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(async_client.post("/agents/invoke", json=payload) for _ in range(10))
+        )
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    assert responses[0].json()["response"]["text"] == "ok"
+    assert elapsed < 1.5
+
+
+def _sse_events(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_invoke_stream_emits_tool_then_tokens(monkeypatch) -> None:
+    from app.agents import graph as agent_graph
+    from app.agents.memory import get_session_messages
+
+    async def fake_stream(messages, temperature=0.2):
+        for delta in ("库存", "风险", "正常"):
+            yield delta
+
+    monkeypatch.setattr(agent_graph._llm, "astream", fake_stream)
+    response = client.post(
+        "/agents/invoke",
+        json={
+            "agent": "stockout_sentinel",
+            "input": "risks",
+            "session_id": "sse-test",
+            "stream": True,
+        },
+    )
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+    names = [name for name, _ in events]
+    assert names == ["tool", "token", "token", "token", "done"]
+    assert "risks" in events[0][1]["structured_output"]
+    assert events[-1][1]["response"]["text"] == "库存风险正常"
+    assert get_session_messages("sse-test")[-1]["content"] == "库存风险正常"
+
+
+def test_invoke_stream_reports_llm_failure(monkeypatch) -> None:
+    from app.agents import graph as agent_graph
+
+    async def failing_stream(messages, temperature=0.2):
+        raise RuntimeError("Qingyun API key missing")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(agent_graph._llm, "astream", failing_stream)
+    response = client.post(
+        "/agents/invoke/stream", json={"agent": "markdown_clearance_coach", "input": "hi"}
+    )
+    events = _sse_events(response.text)
+    assert [name for name, _ in events] == ["tool", "error"]
+    assert events[-1][1]["status"] == 502
+
+
+def test_repeat_invocation_served_from_response_cache(monkeypatch) -> None:
+    from app.agents import graph as agent_graph
+
+    calls = []
+
+    async def counting_chat(messages, temperature=0.2):
+        calls.append(messages)
+        return f"reply {len(calls)}"
+
+    monkeypatch.setattr(agent_graph._llm, "achat", counting_chat)
+    payload = {"agent": "stockout_sentinel", "input": "Any  risks?"}
+    first = client.post("/agents/invoke", json=payload).json()
+    second = client.post("/agents/invoke", json={**payload, "input": "any risks?"}).json()
+    assert first["response"]["text"] == second["response"]["text"] == "reply 1"
+
+    # 重新加载相同数据只改变进程内版本号，缓存键取决于工具输出内容，仍然命中
+    load_data()
+    assert client.post("/agents/invoke", json=payload).json()["response"]["text"] == "reply 1"
+
+    try:
+        sku = first["response"]["structured_output"]["risks"][0]["sku"]
+        update_inventory_levels(sku, current_stock=100000)
+        third = client.post("/agents/invoke", json=payload).json()
+    finally:
+        load_data()
+    assert third["response"]["text"] == "reply 2"
+
+
+def test_follow_up_with_different_history_misses_response_cache(monkeypatch) -> None:
+    from app.agents import graph as agent_graph
+
+    calls = []
+
+    async def counting_chat(messages, temperature=0.2):
+        calls.append(messages)
+        return f"reply {len(calls)}"
+
+    monkeypatch.setattr(agent_graph._llm, "achat", counting_chat)
+    for session_id, opening in (("history-a", "Any risks?"), ("history-b", "Stockout list")):
+        payload = {"agent": "stockout_sentinel", "session_id": session_id}
+        client.post("/agents/invoke", json={**payload, "input": opening})
+        client.post("/agents/invoke", json={**payload, "input": "那第二个呢?"})
+    # 两个会话的最后一条消息相同，但历史不同：四次调用都不命中缓存
+    assert len(calls) == 4
+
+
+def test_forced_multi_tool_invocation_runs_concurrently(monkeypatch) -> None:
+    from app.agents import graph as agent_graph
+
+    run_tool = agent_graph._run_tool
+
+    def slow_tool(tool_name, tool_args):
+        time.sleep(0.2)
+        return run_tool(tool_name, tool_args)
+
+    monkeypatch.setattr(agent_graph, "_run_tool", slow_tool)
+    start = time.perf_counter()
+    response = client.post(
+        "/agents/invoke",
+        json={
+            "agent": "inventory_copilot",
+            "input": "overview",
+            "parameters": {
+                "tools": [
+                    {"tool": "inventory_query", "args": {"query_type": "low_stock"}},
+                    {"tool": "inventory_query", "args": {"query_type": "stockout_risk"}},
+                    {"tool": "inventory_vendor_info"},
+                ]
+            },
+        },
+    )
+    elapsed = time.perf_counter() - start
+    structured = response.json()["response"]["structured_output"]
+    assert structured["tools"] == ["inventory_query", "inventory_query", "inventory_vendor_info"]
+    assert structured["results"][1]["args"] == {"query_type": "stockout_risk"}
+    assert "vendors" in structured["results"][2]["result"]
+    assert elapsed < 0.5
+
+
+def test_forced_multi_tool_rejects_malformed_entries() -> None:
+    for tools in (
+        [{"args": {}}],
+        [{"tool": "inventory_query"}, {"tool": "drop_tables"}],
+        [{"tool": ["inventory_query"]}],
+        [{"tool": "inventory_query", "args": [1]}],
+        "inventory_query",
+    ):
+        payload = {"agent": "inventory_copilot", "input": "x", "parameters": {"tools": tools}}
+        response = client.post("/agents/invoke", json=payload)
+        assert response.status_code == 400, tools
+        stream = client.post("/agents/invoke", json={**payload, "stream": True})
+        assert stream.status_code == 400, tools
+
+
+def test_health_live_and_ready_use_cached_checks(monkeypatch) -> None:
+    import app.api.routes as routes
+    from app.core.health import health_monitor
+
+    def fail_reload() -> None:
+        raise AssertionError("health probes must not reload data")
+
+    monkeypatch.setattr(routes, "load_data", fail_reload)
+    assert client.get("/health/live").json()["status"] == "ok"
+
+    asyncio.run(health_monitor.refresh(force=True))
+    ready = client.get("/health/ready")
+    assert ready.status_code == 200
+    body = ready.json()
+    assert body["status"] == "ready"
+    assert body["dependencies"]["mysql"]["status"] == "disabled"
+    assert body["dependencies"]["llm"]["status"] == "disabled"
+
+    calls = []
+    monkeypatch.setattr(
+        health_monitor.checks["mysql"], "check", lambda: calls.append(1) or {"status": "ok"}
+    )
+    client.get("/health")
+    client.get("/health/ready")
+    assert calls == []  # 缓存未过期时探针不触发检查
+
+    monkeypatch.setattr(
+        health_monitor.checks["mysql"], "check", lambda: {"status": "error", "message": "down"}
+    )
+    asyncio.run(health_monitor.refresh(force=True))
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health").json()["status"] == "degraded"
+    assert 'inventory_dependency_up{dependency="mysql"} 0' in client.get("/metrics").text
+    monkeypatch.undo()
+    asyncio.run(health_monitor.refresh(force=True))
+
+
+def test_health_probes_never_connect(monkeypatch) -> None:
+    from app.core.health import health_monitor
+    from app.data import repository
+
+    def unreachable():
+        raise AssertionError("health probes must not connect to the database")
+
+    # 数据库不可达时探针只反映缓存状态，不能阻塞事件循环或返回 500
+    monkeypatch.setattr(repository, "_get_mysql_repo", unreachable)
+    mysql = health_monitor.checks["mysql"]
+    monkeypatch.setattr(mysql, "check", unreachable)
+    monkeypatch.setattr(mysql, "status", "unknown")
+    monkeypatch.setattr(mysql, "checked_at", 0.0)
+
+    ready = client.get("/health/ready")
+    assert ready.status_code == 503
+    assert ready.json()["data_loaded"] is True
+    assert ready.json()["dependencies"]["mysql"]["status"] == "unknown"
+    assert client.get("/health").status_code == 200
+
+
+def test_middleware_headers_and_error_bodies(monkeypatch) -> None:
+    from fastapi import FastAPI
+
+    from app.core.middleware import (
+        ApiKeyMiddleware,
+        LoggingMiddleware,
+        RateLimitMiddleware,
+        RequestIdMiddleware,
+    )
+    from app.core.settings import settings
+
+    mini = FastAPI()
+
+    @mini.get("/ping")
+    async def ping() -> dict[str, str]:
+        return {"status": "ok"}
+
+    mini.add_middleware(LoggingMiddleware)
+    mini.add_middleware(RateLimitMiddleware)
+    mini.add_middleware(ApiKeyMiddleware)
+    mini.add_middleware(RequestIdMiddleware)
+    mini_client = TestClient(mini)
+
+    monkeypatch.setattr(settings, "rate_limit_per_minute", 2)
+    monkeypatch.setattr(settings, "api_key", "secret")
+    denied = mini_client.get("/ping", headers={"x-request-id": "rid-1", "x-trace-id": "tr-1"})
+    assert denied.status_code == 401
+    assert denied.headers["x-request-id"] == "rid-1"
+    assert denied.headers["x-trace-id"] == "tr-1"
+    assert denied.json() == {
+        "success": False,
+        "error": {"code": "UNAUTHORIZED", "message": "Invalid API key", "request_id": "rid-1"},
+    }
+
+    ok = mini_client.get("/ping", headers={"authorization": "Bearer secret"})
+    assert ok.status_code == 200
+    assert ok.headers["x-trace-id"] == ok.headers["x-request-id"]
+    mini_client.get("/ping", headers={"x-api-key": "secret"})
+    limited = mini_client.get("/ping", headers={"x-api-key": "secret", "x-request-id": "rid-2"})
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) > 0
+    assert limited.json()["error"] == {
+        "code": "RATE_LIMITED",
+        "message": "Too many requests",
+        "request_id": "rid-2",
+    }
+
+
+def test_debug_profile_requires_api_key_and_returns_collapsed_stacks(monkeypatch) -> None:
+    from app.core.settings import settings
+
+    assert client.get("/debug/profile", params={"seconds": 0.05}).status_code == 403
+
+    monkeypatch.setattr(settings, "api_key", "secret")
+    headers = {"x-api-key": "secret"}
+    assert client.get("/debug/profile", params={"seconds": 0.05}).status_code == 401
+    response = client.get(
+        "/debug/profile", params={"seconds": 0.2, "interval_ms": 5, "idle": True}, headers=headers
+    )
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1 and ";" in stack
+
+    profile = client.get(
+        "/debug/profile", params={"seconds": 0.1, "format": "json", "idle": True}, headers=headers
+    ).json()
+    assert profile["samples"] >= 1 and profile["top_functions"]
+
+    alloc = client.get("/debug/alloc", params={"seconds": 0.1, "limit": 5}, headers=headers).json()
+    assert alloc["group_by"] == "lineno"
+    assert len(alloc["top"]) <= 5
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.metrics import metrics
+from app.llm.qingyun_client import QingyunChatClient
+from app.llm.response_cache import ResponseCache, response_cache_key
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:  # noqa: N802
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if request.get("stream"):
+            chunks = [{"choices": [{"delta": {"content": text}}]} for text in ("o", "k")]
+            lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"]
+            body = "".join(lines).encode("utf-8")
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({"choices": [{"message": {"content": " ok "}}]}).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture()
+def llm_client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = QingyunChatClient()
+    client.api_url = f"http://127.0.0.1:{server.server_port}"
+    client.api_key = "test-key"
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def _connection_counts() -> tuple[int, int]:
+    return metrics._llm_connections_new, metrics._llm_connections_reused
+
+
+def test_sync_chat_reuses_keepalive_connection(llm_client) -> None:
+    new_before, reused_before = _connection_counts()
+    assert [llm_client.chat([{"role": "user", "content": "hi"}]) for _ in range(3)] == ["ok"] * 3
+    new_after, reused_after = _connection_counts()
+    assert new_after - new_before == 1
+    assert reused_after - reused_before == 2
+
+
+async def test_async_chat_reuses_keepalive_connection(llm_client) -> None:
+    new_before, reused_before = _connection_counts()
+    for _ in range(3):
+        assert await llm_client.achat([{"role": "user", "content": "hi"}]) == "ok"
+    await llm_client.aclose()
+    new_after, reused_after = _connection_counts()
+    assert new_after - new_before == 1
+    assert reused_after - reused_before == 2
+
+
+async def test_astream_yields_deltas(llm_client) -> None:
+    deltas = [delta async for delta in llm_client.astream([{"role": "user", "content": "hi"}])]
+    await llm_client.aclose()
+    assert deltas == ["o", "k"]
+
+
+def test_async_client_closed_when_loop_changes() -> None:
+    client = QingyunChatClient()
+
+    async def current() -> object:
+        async_client = client._get_async_client()
+        await asyncio.sleep(0)
+        return async_client
+
+    first = asyncio.run(current())
+    second = asyncio.run(current())
+    assert second is not first
+    assert first.is_closed
+    asyncio.run(client.aclose())
+    assert second.is_closed
+
+
+def test_response_cache_lru_and_ttl(monkeypatch) -> None:
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get("a") is None
+
+
+def test_response_cache_disk_tier(tmp_path) -> None:
+    path = str(tmp_path / "llm_cache.sqlite")
+    ResponseCache(max_entries=4, ttl_seconds=60, path=path).set("k", "cached")
+    assert ResponseCache(max_entries=4, ttl_seconds=60, path=path).get("k") == "cached"
+
+
+def test_response_cache_key_covers_full_tool_payload() -> None:
+    head = "x" * 5000
+    key = response_cache_key(
+        "agent", [{"role": "user", "content": "Any  Risks?"}], "summary", head + "a"
+    )
+    messages = [{"role": "user", "content": "any risks?"}]
+    assert key == response_cache_key("agent", messages, "summary", head + "a")
+    # 只有截断部分之后不同的工具输出也不能共用缓存
+    assert key != response_cache_key("agent", messages, "summary", head + "b")
+
+
+def test_response_cache_key_covers_history() -> None:
+    follow_up = {"role": "user", "content": "那第二个呢?"}
+    first = response_cache_key(
+        "agent", [{"role": "user", "content": "risks"}, follow_up], "summary", "{}"
+    )
+    second = response_cache_key(
+        "agent", [{"role": "user", "content": "vendors"}, follow_up], "summary", "{}"
+    )
+    assert first != second
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import queue
+
+from app.core.context import request_id_ctx
+from app.core.logging import ContextQueueHandler, SamplingFilter, configure_logging, stop_logging
+from app.core.metrics import metrics
+
+
+def test_async_pipeline_keeps_request_context() -> None:
+    stream = io.StringIO()
+    configure_logging(stream)
+    try:
+        token = request_id_ctx.set("rid-async")
+        logging.getLogger("app").info("request_complete", extra={"status": 200, "latency_ms": 1.5})
+        request_id_ctx.reset(token)
+        logging.getLogger("app.tools").info("tool_%s", "complete")
+    finally:
+        stop_logging()
+        configure_logging()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert lines[0]["request_id"] == "rid-async"
+    assert lines[0]["status"] == 200
+    assert lines[1]["message"] == "tool_complete"
+    assert "request_id" not in lines[1]
+
+
+def test_full_queue_drops_and_counts() -> None:
+    handler = ContextQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "request_complete", None, None)
+    before = metrics.collect()[("c", "inventory_log_dropped_total", (), "")]
+    handler.handle(record)
+    handler.handle(record)
+    after = metrics.collect()[("c", "inventory_log_dropped_total", (), "")]
+    assert after == before + 1
+
+
+def test_sampling_keeps_errors_and_other_messages() -> None:
+    sampler = SamplingFilter(0.0)
+
+    def record(msg: str, level: int = logging.INFO, status: int = 200) -> logging.LogRecord:
+        item = logging.LogRecord("app", level, __file__, 1, msg, None, None)
+        item.status = status
+        return item
+
+    assert not sampler.filter(record("request_complete"))
+    assert sampler.filter(record("request_complete", status=503))
+    assert sampler.filter(record("tool_complete", level=logging.ERROR))
+    assert sampler.filter(record("request_memo"))
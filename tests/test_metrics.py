@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.core.metrics import Metrics, _bucket_percentile
+from app.core.settings import Settings
+from app.main import app
+
+
+def test_histogram_exposition_is_cumulative() -> None:
+    metrics = Metrics(buckets=(10, 100))
+    for latency in (5, 50, 50, 500):
+        metrics.observe_request(200, latency, route="/data/risks", method="GET")
+    metrics.observe_tool("inventory_query_tool", 7)
+    text = metrics.export_prometheus()
+
+    bucket = 'inventory_request_duration_ms_bucket{route="/data/risks",method="GET",le='
+    assert bucket + '"10"} 1' in text
+    assert bucket + '"100"} 3' in text
+    assert bucket + '"+Inf"} 4' in text
+    assert 'inventory_request_duration_ms_sum{route="/data/risks",method="GET"} 605.00' in text
+    assert 'inventory_request_duration_ms_count{route="/data/risks",method="GET"} 4' in text
+    assert 'inventory_tool_duration_ms_count{tool="inventory_query_tool"} 1' in text
+    assert "inventory_requests_total 4" in text
+
+
+def test_latency_buckets_setting_is_validated() -> None:
+    assert Settings(metrics_latency_buckets_ms="250, 5,inf,5").metrics_latency_buckets_ms == (
+        "5.0,250.0"
+    )
+    for bad in ("fast", "5,-1", "nan", "inf"):
+        with pytest.raises(ValidationError, match="metrics_latency_buckets_ms"):
+            Settings(metrics_latency_buckets_ms=bad)
+
+
+def test_bucket_percentile_interpolates() -> None:
+    buckets = (10, 20, 40)
+    assert _bucket_percentile(buckets, [0, 0, 0, 0], 95) == 0.0
+    assert _bucket_percentile(buckets, [5, 5, 0, 0], 50) == 10.0
+    assert _bucket_percentile(buckets, [0, 10, 0, 0], 50) == 15.0
+    assert _bucket_percentile(buckets, [0, 0, 0, 3], 99) == 40.0
+
+
+def test_error_window_tracks_evictions() -> None:
+    metrics = Metrics(buckets=(10,))
+    for _ in range(200):
+        metrics.observe_request(500, 1)
+    assert metrics.error_rate_exceeded(threshold=0.9, min_requests=10)
+    for _ in range(200):
+        metrics.observe_request(200, 1)
+    assert not metrics.error_rate_exceeded(threshold=0.0, min_requests=10)
+
+
+def test_requests_are_labelled_by_route_template() -> None:
+    client = TestClient(app)
+    client.get("/agents/list")
+    text = client.get("/metrics").text
+    assert 'inventory_request_duration_ms_count{route="/agents/list",method="GET"}' in text
+
+
+def _worker(directory: str) -> None:
+    worker_metrics = Metrics(buckets=(10, 100), multiproc_dir=directory)
+    for _ in range(3):
+        worker_metrics.observe_request(200, 50, route="/data/risks", method="GET")
+    worker_metrics.observe_tool("inventory_query_tool", 5)
+    worker_metrics.set_snapshot_version(7)
+    worker_metrics.flush()
+
+
+def test_multiprocess_mode_merges_worker_files(tmp_path) -> None:
+    import multiprocessing
+
+    process = multiprocessing.get_context("fork").Process(target=_worker, args=(str(tmp_path),))
+    process.start()
+    process.join()
+
+    local = Metrics(buckets=(10, 100), multiproc_dir=str(tmp_path))
+    local.observe_request(500, 5, route="/data/risks", method="GET")
+    local.observe_tool("inventory_query_tool", 500)
+    local.set_snapshot_version(3)
+    text = local.export_prometheus()
+
+    assert len(list(tmp_path.glob("metrics_*.db"))) == 2
+    # 已退出 worker 的计数器与直方图仍计入合计
+    assert "inventory_requests_total 4" in text
+    assert "inventory_requests_errors_total 1" in text
+    assert 'inventory_tool_calls_total{tool="inventory_query_tool"} 2' in text
+    assert (
+        'inventory_request_duration_ms_bucket{route="/data/risks",method="GET",le="10"} 1' in text
+    )
+    assert 'inventory_request_duration_ms_count{route="/data/risks",method="GET"} 4' in text
+    # 仪表只取存活进程
+    assert "inventory_snapshot_version 3" in text
+
+
+def test_mmap_values_grow_and_update_in_place(tmp_path) -> None:
+    from app.core.metrics_store import MmapValues, read_values
+
+    values = MmapValues(tmp_path / "metrics_1.db")
+    samples = {("c", "counter", (f"label-{index}",), ""): float(index) for index in range(3000)}
+    values.write(samples)
+    values.write({("c", "counter", ("label-1",), ""): 42.0})
+    stored = read_values(tmp_path / "metrics_1.db")
+    assert len(stored) == 3000
+    assert stored[("c", "counter", ("label-1",), "")] == 42.0
+    assert stored[("c", "counter", ("label-2999",), "")] == 2999.0
+    values.close()
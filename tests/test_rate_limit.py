@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+
+from app.core.rate_limit import MemoryRateLimitBackend, RateLimiter, SqliteRateLimitBackend
+
+
+def test_gcra_allows_burst_then_refills() -> None:
+    limiter = RateLimiter(MemoryRateLimitBackend(max_keys=10))
+    now = 1000.0
+    assert [limiter.hit("a", 3, now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.hit("a", 3, now) == 20.0  # 每 20 秒恢复一个配额
+    assert limiter.hit("a", 3, now + 20) == 0.0
+    assert limiter.hit("a", 3, now + 20) > 0
+    assert limiter.hit("b", 3, now) == 0.0
+
+
+def test_gcra_burst_is_exact_at_epoch_timestamps() -> None:
+    now = time.time()
+    for limit in range(1, 301):
+        limiter = RateLimiter(MemoryRateLimitBackend(max_keys=10))
+        allowed = 0
+        while limiter.hit("a", limit, now) == 0.0:
+            allowed += 1
+        assert allowed == limit, limit
+
+
+def test_memory_backend_evicts_idle_and_caps_keys() -> None:
+    backend = MemoryRateLimitBackend(max_keys=3)
+    limiter = RateLimiter(backend)
+    for index in range(10):
+        limiter.hit(f"client-{index}", 60, 0.0)
+    assert len(backend) == 3
+    # 之前的 key 均已空闲（TAT 已过），新请求到达时被无损清理
+    limiter.hit("late", 60, 100.0)
+    assert len(backend) == 1
+
+
+def test_sqlite_backend_shares_limits_between_workers(tmp_path) -> None:
+    path = str(tmp_path / "rate_limit.sqlite3")
+    worker_a = RateLimiter(SqliteRateLimitBackend(path, max_keys=100))
+    worker_b = RateLimiter(SqliteRateLimitBackend(path, max_keys=100))
+    assert worker_a.hit("ip", 2, 50.0) == 0.0
+    assert worker_b.hit("ip", 2, 50.0) == 0.0
+    assert worker_a.hit("ip", 2, 50.0) > 0
+    assert worker_b.hit("ip", 2, 80.0) == 0.0
+
+
+def test_sqlite_backend_caps_rows(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(SqliteRateLimitBackend, "PRUNE_EVERY", 10)
+    backend = SqliteRateLimitBackend(str(tmp_path / "rate_limit.sqlite3"), max_keys=5)
+    limiter = RateLimiter(backend)
+    for index in range(100):
+        limiter.hit(f"client-{index}", 60, 1000.0)
+    assert len(backend) <= 5 + SqliteRateLimitBackend.PRUNE_EVERY
+
+
+def test_sqlite_backend_fails_open_when_locked(tmp_path) -> None:
+    path = str(tmp_path / "rate_limit.sqlite3")
+    backend = SqliteRateLimitBackend(path, max_keys=100)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert backend.hit("ip", 1, 50.0) == 0.0
+        assert time.perf_counter() - start < 1.0
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert backend.hit("ip", 1, 50.0) == 0.0
+    assert backend.hit("ip", 1, 50.0) > 0
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.data.columnar import InventoryColumns
+from app.data.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from app.data.repository import (
+    current_snapshot,
+    get_inventory_columns,
+    get_inventory_items,
+    get_inventory_page,
+    get_replenishment_plans,
+    get_snapshot_version,
+    get_urgency_counts,
+    get_vendors,
+    load_data,
+    publish_catalog,
+    save_replenishment_plans,
+    update_inventory_levels,
+    update_inventory_levels_batch,
+)
+from app.data.risk_index import StockoutRiskIndex
+from app.db.models import InventoryItem, Vendor
+from app.db.mysql_repository import MysqlRepository
+
+_RECORDS = [
+    {
+        "SKU": "A-1",
+        "Category": "Toys",
+        "CurrentStock": 5,
+        "ReorderPoint": 10,
+        "DailySalesVelocity": 2.0,
+        "UnitCost": 3.0,
+        "VendorID": "V1",
+        "LeadTimeDays": 4,
+    },
+    {
+        "SKU": "B-2",
+        "Category": "toys",
+        "CurrentStock": 50,
+        "ReorderPoint": 10,
+        "DailySalesVelocity": 0,
+        "UnitCost": 8.0,
+        "VendorID": "V2",
+        "LeadTimeDays": 6,
+    },
+    {
+        "SKU": "C-3",
+        "Category": "Garden",
+        "CurrentStock": 20,
+        "ReorderPoint": 30,
+        "DailySalesVelocity": 5.0,
+        "UnitCost": 1.5,
+        "SellingPrice": 2.0,
+        "VendorID": "V1",
+        "LeadTimeDays": 9,
+    },
+]
+
+
+def setup_module() -> None:
+    load_data()
+
+
+def test_columns_dictionary_encoding() -> None:
+    columns = InventoryColumns(_RECORDS)
+    assert columns.category_labels == ("Toys", "toys", "Garden")
+    assert columns.vendor_labels == ("V1", "V2")
+    assert columns.vendor_codes.tolist() == [0, 1, 0]
+    assert columns.selling_price.tolist() == [3.0, 8.0, 2.0]
+
+
+def test_columns_select_matches_row_filters() -> None:
+    columns = InventoryColumns(_RECORDS)
+    assert columns.select("low_stock").tolist() == [0, 2]
+    assert columns.select("by_category", category="TOYS").tolist() == [0, 1]
+    assert columns.select("by_sku", sku="c-3").tolist() == [2]
+    assert columns.select("stockout_risk").tolist() == [0, 2]
+    assert columns.select("all", min_velocity=1, max_velocity=3).tolist() == [0]
+
+
+def test_columns_records_are_copies() -> None:
+    columns = InventoryColumns(_RECORDS)
+    rows = columns.records(columns.select("by_sku", sku="A-1"))
+    rows[0]["CurrentStock"] = 0
+    assert _RECORDS[0]["CurrentStock"] == 5
+
+
+def test_get_inventory_items_filters_mock_data() -> None:
+    everything = get_inventory_items()
+    low_stock = get_inventory_items("low_stock")
+    assert [i["SKU"] for i in low_stock] == [
+        i["SKU"] for i in everything if i["CurrentStock"] < i["ReorderPoint"]
+    ]
+    assert len(get_inventory_items(limit=5)) == 5
+    assert get_inventory_items("by_sku", sku="hol-ctree-6ft")[0]["SKU"] == "HOL-CTREE-6FT"
+
+
+def test_risk_index_orders_and_buckets() -> None:
+    index = StockoutRiskIndex([(8.0, 0), (2.994, 1), (2.996, 2), (5.0, 3), (7.0, 4)])
+    assert index.top(2) == [1, 2]
+    assert index.under(7.0) == [1, 2, 3, 4]
+    assert index.count_under(5.0) == 3
+    # 2.996 四舍五入为 3.00，按 _urgency_level 属于 HIGH
+    assert index.urgency_counts() == {"CRITICAL": 1, "HIGH": 2, "MEDIUM": 1, "LOW": 1}
+
+
+def test_risk_index_incremental_update() -> None:
+    index = StockoutRiskIndex([(1.0, 0), (4.0, 1)])
+    index.update(0, current_stock=90, daily_sales_velocity=10)
+    index.update(2, current_stock=5, daily_sales_velocity=5)
+    index.update(1, current_stock=10, daily_sales_velocity=0)
+    assert index.top() == [2, 0]
+    assert 1 not in index
+
+
+def test_stockout_risk_query_uses_index_order() -> None:
+    risks = get_inventory_items("stockout_risk")
+    days = [item["CurrentStock"] / item["DailySalesVelocity"] for item in risks]
+    assert days == sorted(days)
+    assert len(get_inventory_items("stockout_risk", limit=3)) == 3
+    assert all(
+        d <= 2
+        for d in [
+            item["CurrentStock"] / item["DailySalesVelocity"]
+            for item in get_inventory_items("stockout_risk", max_days=2)
+        ]
+    )
+
+
+def test_update_inventory_levels_maintains_risk_index() -> None:
+    try:
+        before = get_urgency_counts()
+        sku = get_inventory_items("stockout_risk")[0]["SKU"]
+        assert update_inventory_levels(sku, current_stock=100000)
+        assert sku not in {item["SKU"] for item in get_inventory_items("stockout_risk")}
+        after = get_urgency_counts()
+        assert sum(after.values()) == sum(before.values())
+        assert after["LOW"] == before["LOW"] + 1
+        assert not update_inventory_levels("NO-SUCH-SKU", current_stock=1)
+    finally:
+        load_data()
+
+
+def _walk_pages(fetch_page, order_by: str, limit: int) -> list[str]:
+    skus: list[str] = []
+    cursor = None
+    while True:
+        items, cursor = fetch_page(order_by, cursor, limit)
+        skus.extend(item["SKU"] for item in items)
+        if cursor is None:
+            return skus
+
+
+def _mock_page(order_by, cursor, limit):
+    columns, next_cursor = get_inventory_page(limit=limit, cursor=cursor, order_by=order_by)
+    return columns.records(), next_cursor
+
+
+def _days(item: dict) -> float:
+    velocity = item["DailySalesVelocity"]
+    return item["CurrentStock"] / velocity if velocity > 0 else math.inf
+
+
+def test_keyset_pagination_walks_catalog_once() -> None:
+    everything = get_inventory_items()
+    by_sku = _walk_pages(_mock_page, "sku", 7)
+    assert by_sku == sorted(item["SKU"] for item in everything)
+
+    by_cover = _walk_pages(_mock_page, "days_of_cover", 4)
+    expected = [item["SKU"] for item in sorted(everything, key=lambda i: (_days(i), i["SKU"]))]
+    assert by_cover == expected
+
+
+def test_keyset_pagination_rejects_bad_cursor() -> None:
+    _, cursor = get_inventory_page(limit=5, order_by="sku")
+    with pytest.raises(InvalidCursorError):
+        get_inventory_page(cursor="not-a-cursor")
+    with pytest.raises(InvalidCursorError):
+        get_inventory_page(cursor=cursor, order_by="days_of_cover")
+
+
+def test_sql_keyset_pagination_matches_mock_order() -> None:
+    repo = _sqlite_repo()
+
+    def sql_page(order_by, cursor, limit):
+        decoded = decode_cursor(cursor) if cursor else None
+        items, next_cursor = repo.get_inventory_page("all", None, None, limit, decoded, order_by)
+        return items, encode_cursor(next_cursor) if next_cursor else None
+
+    for order_by in ("sku", "days_of_cover"):
+        assert _walk_pages(sql_page, order_by, 4) == _walk_pages(_mock_page, order_by, 4)
+
+
+def _sqlite_repo() -> MysqlRepository:
+    repo = MysqlRepository("sqlite://")
+    repo.create_tables()
+    with repo.session() as session:
+        for vendor in get_vendors():
+            session.add(
+                Vendor(
+                    vendor_id=vendor["VendorID"],
+                    name=vendor["Name"],
+                    lead_time_days=vendor["LeadTimeDays"],
+                    minimum_order=vendor["MinimumOrder"],
+                    rating=vendor["Rating"],
+                )
+            )
+        for item in get_inventory_items():
+            session.add(
+                InventoryItem(
+                    sku=item["SKU"],
+                    name=item["Name"],
+                    category=item["Category"],
+                    current_stock=item["CurrentStock"],
+                    reorder_point=item["ReorderPoint"],
+                    daily_sales_velocity=item["DailySalesVelocity"],
+                    unit_cost=item["UnitCost"],
+                    vendor_id=item["VendorID"],
+                    lead_time_days=item["LeadTimeDays"],
+                )
+            )
+    return repo
+
+
+def test_vendor_dimension_reloads_only_on_version_change() -> None:
+    from app.data.vendor_cache import VendorDimension
+
+    rows = [{"VendorID": "V1", "Name": "One"}]
+    version = [1]
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return list(rows)
+
+    dimension = VendorDimension(loader, lambda: version[0], check_interval=0)
+    assert dimension.get("V1")["Name"] == "One"
+    assert dimension.join(["V1", "V9", "V1"], [("vendor_name", "Name", "")]) == {
+        "vendor_name": ["One", "", "One"]
+    }
+    assert len(loads) == 1
+
+    rows.append({"VendorID": "V2", "Name": "Two"})
+    version[0] = 2
+    assert dimension.get("V2")["Name"] == "Two"
+    assert len(loads) == 2
+
+
+def test_vendor_dimension_version_check_does_not_block_readers() -> None:
+    import threading
+
+    from app.data.vendor_cache import VendorDimension
+
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def version_loader():
+        calls.append(1)
+        if len(calls) > 1:
+            entered.set()
+            release.wait(5)
+        return 1
+
+    dimension = VendorDimension(lambda: [{"VendorID": "V1", "Name": "One"}], version_loader, 0)
+    assert dimension.get("V1")["Name"] == "One"
+    checker = threading.Thread(target=dimension.mapping)
+    checker.start()
+    try:
+        assert entered.wait(5)
+        # 慢的版本查询进行中，其他读者不等待，直接拿到旧快照
+        names = []
+        reader = threading.Thread(target=lambda: names.append(dimension.get("V1")["Name"]))
+        reader.start()
+        reader.join(1)
+        assert names == ["One"]
+    finally:
+        release.set()
+        checker.join()
+
+
+def test_sql_vendor_version_tracks_changes() -> None:
+    repo = _sqlite_repo()
+    count, last_updated, *_ = repo.get_vendor_version()
+    assert count == len(get_vendors()) and last_updated
+    # 刚写入的一秒内无法用 MAX(updated_at) 区分后续修改，版本每次都不同
+    assert repo.get_vendor_version() != repo.get_vendor_version()
+    with repo.session() as session:
+        session.delete(session.get(Vendor, get_vendors()[0]["VendorID"]))
+    assert repo.get_vendor_version()[0] == count - 1
+
+
+def test_snapshot_copy_on_write_keeps_readers_consistent() -> None:
+    try:
+        before = current_snapshot()
+        columns = get_inventory_columns()
+        sku = str(columns.sku[0])
+        stock = int(columns.current_stock[0])
+        assert columns.snapshot_version == before.version
+
+        assert update_inventory_levels(sku, current_stock=stock + 5)
+        after = current_snapshot()
+        assert after.version > before.version
+        assert get_snapshot_version() == after.version
+        # 旧快照与已取出的列不受写入影响
+        assert int(columns.current_stock[0]) == stock
+        assert before.inventory.records()[0]["CurrentStock"] == stock
+        assert get_inventory_items("by_sku", sku=sku)[0]["CurrentStock"] == stock + 5
+        assert after.vendors is before.vendors
+    finally:
+        load_data()
+
+
+def test_stats_aggregates_maintained_incrementally() -> None:
+    from app.data.aggregates import InventoryAggregates
+
+    try:
+        items = get_inventory_items()
+        update_inventory_levels(items[0]["SKU"], current_stock=0, daily_sales_velocity=3.0)
+        update_inventory_levels(items[1]["SKU"], current_stock=100000)
+        snapshot = current_snapshot()
+        assert snapshot.aggregates == InventoryAggregates.from_columns(snapshot.inventory)
+    finally:
+        load_data()
+
+
+def test_batch_update_publishes_one_snapshot() -> None:
+    from app.data.aggregates import InventoryAggregates
+
+    try:
+        before = current_snapshot()
+        skus = [str(sku) for sku in before.inventory.sku[:3]]
+        updates = {skus[0]: (0, 3.0), skus[1]: (100000, None), skus[2]: (None, 0.0)}
+        assert update_inventory_levels_batch({**updates, "NO-SUCH-SKU": (1, None)}) == 3
+        after = current_snapshot()
+        assert after.version == before.version + 1
+        assert after.aggregates == InventoryAggregates.from_columns(after.inventory)
+        levels = {item["SKU"]: item for item in get_inventory_items()}
+        assert levels[skus[0]]["CurrentStock"] == 0
+        assert levels[skus[1]]["CurrentStock"] == 100000
+        assert levels[skus[2]]["DailySalesVelocity"] == 0.0
+        assert skus[2] not in {item["SKU"] for item in get_inventory_items("stockout_risk")}
+        assert update_inventory_levels_batch({"NO-SUCH-SKU": (1, None)}) == 0
+        assert current_snapshot() is after
+    finally:
+        load_data()
+
+
+def test_concurrent_publishers_notify_listeners_in_version_order() -> None:
+    from app.data.snapshot import SnapshotStore
+
+    store = SnapshotStore()
+    seen: list[int] = []
+
+    def listener(snapshot) -> None:
+        time.sleep(0)
+        seen.append(snapshot.version)
+
+    store.subscribe(listener)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: store.bump(), range(200)))
+    assert len(seen) == 200
+    assert seen == sorted(seen)
+
+
+def test_saving_plans_keeps_snapshot_version(tmp_path, monkeypatch) -> None:
+    from app.core.settings import settings
+
+    monkeypatch.setattr(settings, "mock_data_dir", str(tmp_path))
+    try:
+        version = get_snapshot_version()
+        save_replenishment_plans([{"created_at": "2026-01-01T00:00:00", "total_cost": 1.0}])
+        assert get_snapshot_version() == version
+        assert get_replenishment_plans()[0]["total_cost"] == 1.0
+        assert (tmp_path / "mock_replenishment_plans.json").exists()
+    finally:
+        load_data()
+
+
+def test_sql_stats_match_mock_aggregates() -> None:
+    repo = _sqlite_repo()
+    assert repo.get_inventory_stats() == current_snapshot().aggregates
+
+
+def test_publish_catalog_installs_synthetic_snapshot() -> None:
+    before = get_snapshot_version()
+    try:
+        publish_catalog(_RECORDS, [{"VendorID": "V1", "Name": "Acme"}])
+        assert get_snapshot_version() > before
+        assert [item["SKU"] for item in get_inventory_items()] == ["A-1", "B-2", "C-3"]
+        assert [vendor["VendorID"] for vendor in get_vendors()] == ["V1"]
+        assert current_snapshot().aggregates.total_skus == 3
+    finally:
+        load_data()
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
-from app.data.repository import load_data
+import timeit
+
+import numpy as np
+
+from app.core.memo import request_memo
+from app.data.repository import get_inventory_items, load_data, update_inventory_levels
+from app.tools.enrichment import urgency_levels
 from app.tools.inventory_tools import (
+    _urgency_level,
     inventory_markdown_calculator,
     inventory_query_tool,
     inventory_replenishment_tool,
@@ -22,6 +29,20 @@ def test_inventory_query_stockout_risk() -> None:
         assert "revenue_at_risk" in item
 
 
+def test_urgency_levels_match_scalar_rule() -> None:
+    days = np.array([0.0, 2.99, 3.0, 5.0, 5.01, 7.0, 7.01, np.inf])
+    assert urgency_levels(days).tolist() == [_urgency_level(d) for d in days.tolist()]
+
+
+def test_inventory_query_enrichment_fields() -> None:
+    result = inventory_query_tool(query_type="by_sku", sku="HOL-CTREE-6FT")
+    item = result["items"][0]
+    assert item["days_until_stockout"] == round(15 / 8.2, 2)
+    assert item["urgency_level"] == "CRITICAL"
+    assert item["shortage_amount"] == 25
+    assert item["vendor_name"]
+
+
 def test_inventory_replenishment_plan() -> None:
     plan = inventory_replenishment_tool()
     assert "vendor_groups" in plan
@@ -47,3 +68,43 @@ def test_stats_calculator() -> None:
     stats = stats_calculator()
     assert stats["total_skus"] == 30
     assert stats["total_categories"] == 9
+
+
+def test_request_memo_dedupes_repository_reads() -> None:
+    with request_memo() as memo:
+        inventory_replenishment_tool()
+        first = inventory_vendor_info_tool()
+        # 命中直接返回同一对象，不做拷贝
+        assert inventory_vendor_info_tool() is first
+        assert inventory_vendor_info_tool() is first
+        assert len(first["vendors"]) == first["count"] > 0
+    assert memo.saved >= 2
+    assert inventory_vendor_info_tool() is not first
+
+
+def test_request_memo_not_slower_than_raw_calls() -> None:
+    def raw() -> None:
+        for _ in range(3):
+            get_inventory_items()
+            inventory_query_tool(query_type="all")
+
+    def memoized() -> None:
+        with request_memo():
+            raw()
+
+    raw()
+    memoized()
+    raw_best = min(timeit.repeat(raw, number=5, repeat=5))
+    memo_best = min(timeit.repeat(memoized, number=5, repeat=5))
+    assert memo_best <= raw_best
+
+
+def test_request_memo_invalidated_by_writes() -> None:
+    try:
+        with request_memo():
+            before = inventory_query_tool(query_type="by_sku", sku="HOL-CTREE-6FT")["items"][0]
+            update_inventory_levels("HOL-CTREE-6FT", current_stock=before["CurrentStock"] + 1)
+            after = inventory_query_tool(query_type="by_sku", sku="HOL-CTREE-6FT")["items"][0]
+        assert after["CurrentStock"] == before["CurrentStock"] + 1
+    finally:
+        load_data()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.core.executor import run_in_executor
+from app.core.tracing import Tracer, tracer
+from app.data.repository import load_data
+from app.main import app
+
+
+async def test_spans_nest_across_executor_threads(tmp_path) -> None:
+    local = Tracer(enabled=True, buffer_size=5, export_path=str(tmp_path / "traces.jsonl"))
+
+    @local.traced("work")
+    def work() -> int:
+        with local.span("inner", rows=3):
+            return 1
+
+    @local.traced()
+    async def handler() -> int:
+        return await run_in_executor(work)
+
+    with local.span("root"):
+        assert await handler() == 1
+
+    trace = local.recent()[0]
+    names = {span["span_id"]: span["name"] for span in trace["spans"]}
+    parents = {span["name"]: names.get(span["parent_id"]) for span in trace["spans"]}
+    assert parents == {
+        "root": None,
+        "test_spans_nest_across_executor_threads.<locals>.handler": "root",
+        "work": "test_spans_nest_across_executor_threads.<locals>.handler",
+        "inner": "work",
+    }
+
+    local.flush()
+    exported = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[0])
+    spans = exported["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {span["traceId"] for span in spans} == {trace["trace_id"]}
+    inner = next(span for span in spans if span["name"] == "inner")
+    assert inner["attributes"] == [{"key": "rows", "value": {"intValue": "3"}}]
+
+
+def test_span_records_errors_and_upstream_traceparent() -> None:
+    from app.core.context import trace_id_ctx
+
+    local = Tracer(enabled=True, buffer_size=5)
+    token = trace_id_ctx.set("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    try:
+        with local.span("failing"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    finally:
+        trace_id_ctx.reset(token)
+
+    trace = local.recent()[0]
+    assert trace["trace_id"] == "a" * 32
+    assert trace["spans"][0]["parent_id"] == "b" * 16
+    assert trace["spans"][0]["error"] == "ValueError"
+
+
+async def test_concurrent_requests_sharing_traceparent_stay_separate(tmp_path) -> None:
+    from app.core.context import trace_id_ctx
+
+    local = Tracer(enabled=True, buffer_size=5, export_path=str(tmp_path / "traces.jsonl"))
+
+    async def request(index: int) -> None:
+        with local.span(f"request-{index}"):
+            await asyncio.sleep(0.01)
+            with local.span(f"child-{index}"):
+                await asyncio.sleep(0.01)
+
+    token = trace_id_ctx.set("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    try:
+        await asyncio.gather(request(1), request(2))
+    finally:
+        trace_id_ctx.reset(token)
+
+    traces = {trace["name"]: trace for trace in local.recent()}
+    assert set(traces) == {"request-1", "request-2"}
+    for index in (1, 2):
+        names = [span["name"] for span in traces[f"request-{index}"]["spans"]]
+        assert names == [f"request-{index}", f"child-{index}"]
+
+    local.close()
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == 2
+    assert all(
+        len(json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]) == 2 for line in lines
+    )
+
+
+def test_debug_traces_show_agent_stages() -> None:
+    load_data()
+    tracer.clear()
+    client = TestClient(app)
+    client.post(
+        "/agents/invoke",
+        json={
+            "agent": "inventory_copilot",
+            "input": "x",
+            "parameters": {"tool": "inventory_query"},
+        },
+        headers={"x-request-id": "trace-me"},
+    )
+    body = client.get("/debug/traces", params={"request_id": "trace-me"}).json()
+    assert body["count"] == 1
+    trace = body["traces"][0]
+    assert trace["name"] == "POST /agents/invoke"
+    names = [span["name"] for span in trace["spans"]]
+    for expected in (
+        "agent",
+        "node.load_session",
+        "node.forced_tool_node",
+        "tool.inventory_query",
+        "node.finalize",
+    ):
+        assert expected in names
+    assert "repository.get_inventory_columns" in names